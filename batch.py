@@ -0,0 +1,183 @@
+"""
+Solve many .bff boards at once.
+
+    python batch.py bff_files --workers 4 --timeout 120 --output results.json --render solutions
+
+Boards are solved concurrently on a process pool, each one with its own time
+budget. The results are written as JSON or CSV (picked from the extension of
+--output), and solution images (--render-format png, svg or txt) are only
+drawn after all boards are solved, on a process pool as well.
+With --checkpoints DIR the guided search saves its progress every
+--checkpoint-interval seconds and when its budget runs out, and running the
+batch again continues every unfinished board where it stopped.
+"""
+from classes import *
+from functions import SOLVERS
+from solution_cache import DEFAULT_CACHE_PATH, SolutionCache
+from checkpoint import SearchCheckpoint
+from bff_parser import find_boards
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+RESULT_FIELDS = ['file', 'status', 'time', 'nodes', 'propagations', 'pruned', 'cache_hits', 'placement', 'error']
+
+
+def solve_file(file_path: str, timeout: float = 120, cache: SolutionCache = None, solver: str = 'guided',
+               checkpoint_dir: str = None, checkpoint_interval: float = 10) -> Dict:
+    """
+    Solve one board, giving up after timeout seconds. Runs in a worker process.
+
+    Args:
+        file_path : Path to the .bff file
+        timeout : Time budget in seconds
+        cache : Optional solution cache, checked before solving
+        solver : Name of the solver in functions.SOLVERS
+        checkpoint_dir : Directory of the search checkpoints, None to start
+            from scratch (only the guided solver can be checkpointed)
+        checkpoint_interval : Seconds between two checkpoints
+
+    Returns:
+        dict: file, status ('solved', 'no_solution', 'timeout' or 'error'),
+        time in seconds, the nodes, propagations, pruned and cache_hits
+        counters of the solver (see SolverStats), placement as
+        [x, y, block_type] lists and error
+    """
+    result = {'file': file_path, 'status': 'error', 'time': 0.0, 'nodes': 0, 'propagations': 0,
+              'pruned': 0, 'cache_hits': 0, 'placement': [], 'error': ''}
+    stats = SolverStats()
+    start_time = time.perf_counter()
+    deadline = start_time + timeout
+    timed_out = False
+    checkpoint = None
+    next_checkpoint = start_time + checkpoint_interval
+
+    def should_stop():
+        nonlocal timed_out, next_checkpoint
+        now = time.perf_counter()
+        if checkpoint is not None and now > next_checkpoint:
+            checkpoint.save(state)
+            next_checkpoint = now + checkpoint_interval
+        timed_out = now > deadline
+        return timed_out
+
+    try:
+        game = LazorGame(file_path)
+        if checkpoint_dir is not None and solver == 'guided':
+            checkpoint = SearchCheckpoint(os.path.join(checkpoint_dir, game.template.content_hash() + '.json'),
+                                          game.template)
+            state = checkpoint.load()
+            solved = SOLVERS[solver](game, should_stop, cache, stats=stats, state=state)
+            if timed_out:
+                checkpoint.save(state)
+            else:
+                checkpoint.clear()
+        else:
+            solved = SOLVERS[solver](game, should_stop, cache, stats=stats)
+    except Exception as error:
+        result['error'] = str(error)
+        result['time'] = time.perf_counter() - start_time
+        return result
+
+    result['time'] = time.perf_counter() - start_time
+    for name in ('nodes', 'propagations', 'pruned', 'cache_hits'):
+        result[name] = getattr(stats, name)
+    if solved:
+        result['status'] = 'solved'
+        result['placement'] = [[x, y, block_type] for (x, y), block_type in game.placed_blocks()]
+    else:
+        result['status'] = 'timeout' if timed_out else 'no_solution'
+    return result
+
+
+def run_batch(paths, workers: int = None, timeout: float = 120, render_dir: str = None,
+              cache: SolutionCache = None, solver: str = 'guided', checkpoint_dir: str = None,
+              checkpoint_interval: float = 10, render_format: str = 'png') -> List[Dict]:
+    """
+    Solve every board on a process pool, then optionally draw the solutions.
+
+    Args:
+        paths : .bff files and directories holding them
+        workers : Number of worker processes, defaults to the number of cores
+        timeout : Time budget per board in seconds
+        render_dir : Directory to save the solution images to, None to skip drawing
+        cache : Optional solution cache shared by the workers
+        solver : Name of the solver in functions.SOLVERS
+        checkpoint_dir : Directory of the search checkpoints, see solve_file
+        checkpoint_interval : Seconds between two checkpoints
+        render_format : 'png', 'svg' or 'txt', see render.py
+
+    Returns:
+        list: One result dict per board (see solve_file), in the order of the boards
+    """
+    boards = find_boards(paths)
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(solve_file, board, timeout, cache, solver,
+                                   checkpoint_dir, checkpoint_interval): board for board in boards}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            print(f"{os.path.basename(result['file'])}: {result['status']} in {result['time']:.3f} s")
+
+    ordered = [results[board] for board in boards]
+    if render_dir is not None:
+        # Imported here, the solver processes do not need it
+        from render import render_batch
+        render_batch([(result['file'], [((x, y), block_type) for x, y, block_type in result['placement']])
+                      for result in ordered if result['status'] == 'solved'],
+                     render_dir, render_format, workers)
+    return ordered
+
+
+def write_results(results: List[Dict], output: str) -> None:
+    """
+    Save the results as CSV if output ends with .csv, as JSON otherwise.
+
+    Args:
+        results : Result dicts from run_batch
+        output : Path of the file to write
+    """
+    if output.endswith('.csv'):
+        with open(output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            for result in results:
+                writer.writerow(dict(result, placement=json.dumps(result['placement'])))
+    else:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Solve a batch of Lazor .bff boards in parallel.")
+    parser.add_argument('paths', nargs='+', help=".bff files or directories holding them")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--timeout', type=float, default=120, help="time budget per board in seconds")
+    parser.add_argument('--output', default='results.json', help="results file, .json or .csv")
+    parser.add_argument('--render', metavar='DIR', default=None, help="save solution images to DIR")
+    parser.add_argument('--render-format', choices=('png', 'svg', 'txt'), default='png',
+                        help="format of the solution images (default: png)")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="solution cache file")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the solution cache")
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='guided', help="solver to use (default: guided)")
+    parser.add_argument('--checkpoints', metavar='DIR', default=None,
+                        help="save the progress of unfinished searches to DIR and continue them from there")
+    parser.add_argument('--checkpoint-interval', type=float, default=10, help="seconds between checkpoints")
+    args = parser.parse_args(argv)
+
+    cache = None if args.no_cache else SolutionCache(args.cache)
+    results = run_batch(args.paths, args.workers, args.timeout, args.render, cache, args.solver,
+                        args.checkpoints, args.checkpoint_interval, args.render_format)
+    write_results(results, args.output)
+    solved = sum(result['status'] == 'solved' for result in results)
+    print(f"Solved {solved} of {len(results)} boards, results saved to {args.output}")
+    return 0 if solved == len(results) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
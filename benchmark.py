@@ -0,0 +1,630 @@
+"""
+Benchmarks of the propagation engines and the solvers.
+
+    python benchmark.py --save baseline.json
+    python benchmark.py --baseline baseline.json
+
+The default run is the suite: every bundled board and a few seeded stress
+boards, with the median and p95 time and memory peak of LazorGame.propagate
+and of each solver. A saved baseline can be compared against later, and the
+comparison exits with 1 on a regression, see find_regressions. --micro runs
+the older single-purpose timings and --orderings compares the candidate
+orderings of the guided search.
+"""
+from classes import *
+from functions import (HAVE_SAT, ORDERINGS, SOLVERS, guided_search, iter_placements, iter_solutions,
+                       solve_board_guided, solve_board_parallel)
+from vectorized import BatchPropagator
+from generator import generate_boards, random_board, random_placement
+from bff_parser import load_boards
+import argparse
+import gc
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+BFF_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bff_files')
+DEFAULT_SOLVERS = ('guided', 'sat') if HAVE_SAT else ('guided',)
+MIN_TRIALS = 5  # fewer timed runs per case are too noisy to compare
+
+
+def benchmark_propagate(directory_path: str = BFF_DIRECTORY, repeats: int = 500,
+                        rounds: int = 5, seed: int = 0) -> Dict[str, float]:
+    """
+    Time LazorGame.propagate on random placements of every board in a directory.
+    Building the games is not part of the measured time, and like timeit the
+    best round is kept with the garbage collector switched off.
+
+    Args:
+        directory_path : Directory holding the .bff files
+        repeats : Number of random placements per board
+        rounds : Number of times the placements are timed
+        seed : Seed for the placements, so runs are comparable
+
+    Returns:
+        dict: Mean microseconds per propagation for each file
+    """
+    results = {}
+    for file_name in sorted(os.listdir(directory_path)):
+        if not file_name.endswith('.bff'):
+            continue
+        template = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+        best_time = float('inf')
+        for _ in range(rounds):
+            rng = random.Random(seed)
+            games = [template.new_game(random_placement(template, rng)) for _ in range(repeats)]
+
+            gc.disable()
+            start_time = time.perf_counter()
+            for test_game in games:
+                test_game.propagate()
+            elapsed_time = time.perf_counter() - start_time
+            gc.enable()
+            best_time = min(best_time, elapsed_time)
+
+        results[file_name] = best_time / repeats * 1e6
+        print(f"{file_name:20s} {results[file_name]:10.1f} us per propagate")
+    return results
+
+
+def benchmark_parallel(directory_path: str = BFF_DIRECTORY, file_names=('mad_7.bff', 'yarn_5.bff'),
+                       worker_counts=(1, 2, 4, 8), rounds: int = 3) -> Dict[str, Dict[int, float]]:
+    """
+    Time solve_board_parallel for different numbers of workers. The pool start-up
+    is part of the measured time, as it is for a real solve.
+
+    Args:
+        directory_path : Directory holding the .bff files
+        file_names : Boards to solve
+        worker_counts : Numbers of worker processes to try
+        rounds : Number of solves per setting, the best one is kept
+
+    Returns:
+        dict: Seconds per solve for each file and number of workers
+    """
+    results = {}
+    for file_name in file_names:
+        template = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+        results[file_name] = {}
+        for workers in worker_counts:
+            best_time = float('inf')
+            for _ in range(rounds):
+                start_time = time.perf_counter()
+                solve_board_parallel(template.new_game(), workers)
+                best_time = min(best_time, time.perf_counter() - start_time)
+            results[file_name][workers] = best_time
+            print(f"{file_name:20s} {workers:3d} workers {best_time:10.3f} s "
+                  f"(speedup {results[file_name][worker_counts[0]] / best_time:.2f}x)")
+    return results
+
+
+def benchmark_memory(directory_path: str = BFF_DIRECTORY, repeats: int = 200, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Measure with tracemalloc how much memory the propagation state takes: the
+    bytes kept by one incrementally propagated game (what every search node
+    holds on to), and the peak during a full guided search of the board.
+
+    Args:
+        directory_path : Directory holding the .bff files
+        repeats : Number of random placements the game size is averaged over
+        seed : Seed for the placements
+
+    Returns:
+        dict: 'game_bytes' and 'search_peak_bytes' for each file
+    """
+    results = {}
+    for file_name in sorted(os.listdir(directory_path)):
+        if not file_name.endswith('.bff'):
+            continue
+        template = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+        rng = random.Random(seed)
+        placements = [random_placement(template, rng) for _ in range(repeats)]
+
+        tracemalloc.start()
+        games = []
+        for placement in placements:
+            test_game = template.new_game(placement)
+            test_game.propagate_incremental()
+            games.append(test_game)
+        game_bytes = tracemalloc.get_traced_memory()[0] / repeats
+        tracemalloc.stop()
+        del games
+
+        tracemalloc.start()
+        guided_search(template)
+        search_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[file_name] = {'game_bytes': game_bytes, 'search_peak_bytes': search_peak}
+        print(f"{file_name:20s} {game_bytes / 1024:8.1f} KiB per propagated game, "
+              f"search peak {search_peak / 1024:8.1f} KiB")
+    return results
+
+
+def benchmark_vectorized(directory_path: str = BFF_DIRECTORY, count: int = 20000) -> Dict[str, float]:
+    """
+    Compare the placements scored per second by the NumPy engine and by
+    LazorGame.propagate/validate, on the first placements solve_board tries.
+    Building the NumPy grids is part of the measured time.
+
+    Args:
+        directory_path : Directory holding the .bff files
+        count : Number of placements per board
+
+    Returns:
+        dict: Speedup of the NumPy engine for each file
+    """
+    results = {}
+    for file_name in sorted(os.listdir(directory_path)):
+        if not file_name.endswith('.bff'):
+            continue
+        template = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+        placements = list(itertools.islice(iter_placements(template.available_positions(), template.blocks), count))
+        propagator = BatchPropagator(template)
+
+        start_time = time.perf_counter()
+        propagator.validate(propagator.grids_for(placements))
+        vectorized_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for placement in placements:
+            test_game = template.new_game(placement)
+            test_game.propagate()
+            test_game.validate()
+        serial_time = time.perf_counter() - start_time
+
+        results[file_name] = serial_time / vectorized_time
+        print(f"{file_name:20s} {len(placements) / vectorized_time:10.0f} placements/s NumPy, "
+              f"{len(placements) / serial_time:10.0f} placements/s LazorGame ({results[file_name]:.1f}x)")
+    return results
+
+
+def benchmark_engines(directory_path: str = BFF_DIRECTORY, repeats: int = 500,
+                      rounds: int = 5, seed: int = 0) -> Dict[str, float]:
+    """
+    Compare LazorGame.propagate/validate with the 'python' and the 'bitboard'
+    engine, on random placements of every board in a directory. Like in
+    benchmark_propagate, building the games is not measured.
+
+    Args:
+        directory_path : Directory holding the .bff files
+        repeats : Number of random placements per board
+        rounds : Number of times the placements are timed
+        seed : Seed for the placements, so runs are comparable
+
+    Returns:
+        dict: Speedup of the bitboard engine for each file
+    """
+    results = {}
+    for file_name in sorted(os.listdir(directory_path)):
+        if not file_name.endswith('.bff'):
+            continue
+        template = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+        times = {}
+        for engine in PROPAGATION_ENGINES:
+            best_time = float('inf')
+            for _ in range(rounds):
+                rng = random.Random(seed)
+                games = [template.new_game(random_placement(template, rng)) for _ in range(repeats)]
+                for test_game in games:
+                    test_game.engine = engine
+
+                gc.disable()
+                start_time = time.perf_counter()
+                for test_game in games:
+                    test_game.propagate()
+                    test_game.validate()
+                elapsed_time = time.perf_counter() - start_time
+                gc.enable()
+                best_time = min(best_time, elapsed_time)
+            times[engine] = best_time / repeats * 1e6
+
+        results[file_name] = times['python'] / times['bitboard']
+        print(f"{file_name:20s} {times['python']:8.1f} us python, {times['bitboard']:8.1f} us bitboard "
+              f"({results[file_name]:.1f}x)")
+    return results
+
+
+def benchmark_iter_solutions(directory_path: str = BFF_DIRECTORY, file_name: str = 'mad_7.bff',
+                             limits=(1, 10, 100, 1000, None)) -> Dict[str, Dict[str, float]]:
+    """
+    Show that the memory iter_solutions needs does not grow with the number of
+    solutions. The board is reduced to its first target, so it has many solutions,
+    and the tracemalloc peak is measured for different limits.
+
+    Args:
+        directory_path : Directory holding the .bff files
+        file_name : Board to enumerate
+        limits : Numbers of solutions to take, None for all
+
+    Returns:
+        dict: 'solutions', 'seconds' and 'peak_bytes' for each limit
+    """
+    board = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+    template = BoardTemplate(board.grid, board.blocks, board.lazors, board.points[:1], board.filename)
+    results = {}
+    for limit in limits:
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        count = sum(1 for _ in iter_solutions(template, limit))
+        elapsed_time = time.perf_counter() - start_time
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[str(limit)] = {'solutions': count, 'seconds': elapsed_time, 'peak_bytes': peak}
+        print(f"limit {str(limit):>6s} {count:8d} solutions in {elapsed_time:8.3f} s, peak {peak / 1024:8.1f} KiB")
+    return results
+
+
+def benchmark_parser(count: int = 2000, seed: int = 0) -> Dict[str, float]:
+    """
+    Boards parsed per second: one LazorGame per file (what read_board does),
+    load_boards on the directory, and load_boards on the same boards joined
+    into one stream. The boards are generated 8x8 boards.
+
+    Args:
+        count : Number of boards
+        seed : Seed of the generated boards
+
+    Returns:
+        dict: Boards per second of each way of loading
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_boards(directory, count, 8, 8, (('A', 4), ('B', 2), ('C', 3)), 3, 12, seed)
+        stream_path = os.path.join(directory, 'stream.txt')
+        with open(stream_path, 'w') as stream:
+            for path in paths:
+                with open(path) as f:
+                    stream.write(f.read())
+        cases = [('LazorGame per file', lambda: [LazorGame(path) for path in paths]),
+                 ('load_boards files', lambda: load_boards([directory])),
+                 ('load_boards stream', lambda: load_boards([stream_path]))]
+        results = {}
+        for name, run in cases:
+            start_time = time.perf_counter()
+            run()
+            results[name] = count / (time.perf_counter() - start_time)
+            print(f"{name:20s} {results[name]:10.0f} boards/s")
+    return results
+
+
+def benchmark_solvers(directory_path: str = BFF_DIRECTORY, solvers=DEFAULT_SOLVERS,
+                      sizes=((6, 6, 6, 10), (8, 8, 8, 12), (12, 12, 12, 20)), timeout: float = 30,
+                      seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Time the solvers of functions.SOLVERS on the bundled boards and on larger
+    random boards, each solve with a time budget.
+
+    Args:
+        directory_path : Directory holding the .bff files
+        solvers : Names of the solvers to compare
+        sizes : (width, height, blocks, targets) of the generated boards
+        timeout : Seconds before a solve is given up
+        seed : Seed for the generated boards
+
+    Returns:
+        dict: Seconds per solve (None after a timeout) of each solver for each board
+    """
+    boards = [(file_name, BoardTemplate.from_file(os.path.join(directory_path, file_name)))
+              for file_name in sorted(os.listdir(directory_path)) if file_name.endswith('.bff')]
+    rng = random.Random(seed)
+    for width, height, count, num_points in sizes:
+        inventory = [('A', count - count // 2 - count // 4), ('B', count // 4), ('C', count // 2)]
+        boards.append((f"random_{width}x{height}_{count}",
+                       random_board(width, height, inventory, 2, num_points, rng)[0]))
+
+    results = {}
+    for name, template in boards:
+        results[name] = {}
+        for solver in solvers:
+            deadline = time.perf_counter() + timeout
+            start_time = time.perf_counter()
+            SOLVERS[solver](template.new_game(), lambda: time.perf_counter() > deadline)
+            elapsed_time = time.perf_counter() - start_time
+            results[name][solver] = elapsed_time if elapsed_time < timeout else None
+        print(f"{name:20s} " + " ".join(
+            f"{solver} {'timeout' if seconds is None else f'{seconds:.3f} s':>10s}"
+            for solver, seconds in results[name].items()))
+    return results
+
+
+def benchmark_orderings(directory_path: str = BFF_DIRECTORY, orderings=tuple(ORDERINGS), generated: int = 20,
+                       timeout: float = 10, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Time to first solution of the guided search with each candidate ordering,
+    on the bundled boards and on generated 6x6 boards.
+
+    Args:
+        directory_path : Directory holding the .bff files
+        orderings : Names of the orderings in functions.ORDERINGS to compare
+        generated : Number of generated boards
+        timeout : Seconds before a search is given up
+        seed : Seed for the generated boards
+
+    Returns:
+        dict: Seconds to the first solution (None after a timeout) of each
+        ordering for each board
+    """
+    boards = suite_boards(directory_path, seed)[:-len(STRESS_BOARDS)]
+    inventory = (('A', 3), ('B', 1), ('C', 1))
+    boards.extend((f"generated_{index}", random_board(6, 6, inventory, 2, 6, random.Random(f"{seed}-{index}"))[0])
+                  for index in range(generated))
+
+    results = {}
+    for name, template in boards:
+        results[name] = {}
+        for ordering in orderings:
+            deadline = time.perf_counter() + timeout
+            stats = SolverStats()
+            solve_board_guided(template.new_game(), lambda: time.perf_counter() > deadline, stats=stats,
+                               ordering=ordering)
+            results[name][ordering] = stats.total_time if stats.solved else None
+        print(f"{name:20s} " + " ".join(
+            f"{ordering} {'timeout' if seconds is None else f'{seconds * 1e3:.1f} ms':>10s}"
+            for ordering, seconds in results[name].items()))
+
+    for ordering in orderings:
+        times = [timeout if result[ordering] is None else result[ordering] for result in results.values()]
+        timeouts = sum(result[ordering] is None for result in results.values())
+        print(f"{ordering:16s} median {statistics.median(times) * 1e3:8.1f} ms  total {sum(times):7.2f} s"
+              + (f"  ({timeouts} timeouts)" if timeouts else ""))
+    return results
+
+
+# Generated boards of the suite: name, width, height, block inventory, lazors, targets
+STRESS_BOARDS = [
+    ('stress_6x6', 6, 6, (('A', 3), ('B', 1), ('C', 2)), 2, 8),
+    ('stress_8x8', 8, 8, (('A', 4), ('B', 2), ('C', 3)), 3, 12),
+    ('stress_10x10', 10, 10, (('A', 5), ('B', 2), ('C', 4)), 4, 16),
+]
+
+
+def suite_boards(directory_path: str = BFF_DIRECTORY, seed: int = 0) -> List:
+    """
+    The boards of the benchmark suite: every bundled board, then the
+    STRESS_BOARDS generated from the seed. Each generated board has its own
+    random generator, so adding a board to the list does not change the others.
+
+    Returns:
+        list: (name, BoardTemplate) pairs
+    """
+    boards = [(file_name, BoardTemplate.from_file(os.path.join(directory_path, file_name)))
+              for file_name in sorted(os.listdir(directory_path)) if file_name.endswith('.bff')]
+    for name, width, height, inventory, num_lazors, num_points in STRESS_BOARDS:
+        rng = random.Random(f"{seed}-{name}")
+        boards.append((name, random_board(width, height, inventory, num_lazors, num_points, rng)[0]))
+    return boards
+
+
+def percentile(values, fraction: float) -> float:
+    """
+    Nearest-rank percentile, e.g. fraction=0.95 for the p95.
+    """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def summarize(times, peaks, timeouts: int = 0) -> Dict[str, float]:
+    return {'median_s': statistics.median(times), 'p95_s': percentile(times, 0.95),
+            'median_peak_bytes': statistics.median(peaks), 'p95_peak_bytes': percentile(peaks, 0.95),
+            'trials': len(times), 'timeouts': timeouts}
+
+
+def measure(run, trials: int, memory_trials: int):
+    """
+    Run a benchmark case repeatedly. Times are taken with the garbage collector
+    off and without tracemalloc, which slows Python down a lot; the memory
+    peaks come from separate traced runs, done first so that they also warm
+    up the caches (and the first case of a run is not timed cold).
+
+    Args:
+        run : Callable doing one trial, returns True if it ran out of time
+        trials : Number of timed runs
+        memory_trials : Number of runs traced by tracemalloc
+
+    Returns:
+        dict: See summarize
+    """
+    peaks = []
+    for _ in range(memory_trials):
+        gc.collect()
+        tracemalloc.start()
+        run()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    times = []
+    timeouts = 0
+    for _ in range(trials):
+        gc.collect()
+        gc.disable()
+        start_time = time.perf_counter()
+        timed_out = run()
+        times.append(time.perf_counter() - start_time)
+        gc.enable()
+        timeouts += bool(timed_out)
+    return summarize(times, peaks, timeouts)
+
+
+def run_suite(directory_path: str = BFF_DIRECTORY, solvers=DEFAULT_SOLVERS, trials: int = 5,
+              memory_trials: int = 1, timeout: float = 10, seed: int = 0,
+              propagate_repeats: int = 200) -> Dict[str, Dict[str, float]]:
+    """
+    Benchmark LazorGame.propagate and the solvers on the suite boards.
+
+    For propagate, one trial propagates propagate_repeats random placements of
+    the board (the same ones in every trial). For a solver, one trial solves the
+    board from scratch; a solve that takes longer than timeout is stopped and
+    counted in 'timeouts' (when the solver was told to stop, not from its
+    own timing, which leaves out building the game).
+
+    Args:
+        directory_path : Directory holding the .bff files
+        solvers : Names of the solvers in functions.SOLVERS to run
+        trials : Timed runs per case
+        memory_trials : Runs per case traced for the memory peak
+        timeout : Seconds before a solve is stopped
+        seed : Seed of the generated boards and the random placements
+        propagate_repeats : Placements propagated per propagate trial
+
+    Returns:
+        dict: For every case ('propagate/<board>' or '<solver>/<board>'), the
+        median and p95 time and memory peak (see summarize)
+    """
+    results = {}
+    for name, template in suite_boards(directory_path, seed):
+        rng = random.Random(f"{seed}-{name}-placements")
+        placements = [random_placement(template, rng) for _ in range(propagate_repeats)]
+
+        def run_propagate():
+            for placement in placements:
+                template.new_game(placement).propagate()
+
+        cases = [('propagate', run_propagate)]
+        for solver in solvers:
+            def run_solver(solver=solver):
+                deadline = time.perf_counter() + timeout
+                stopped = False
+
+                def should_stop():
+                    nonlocal stopped
+                    stopped = stopped or time.perf_counter() > deadline
+                    return stopped
+
+                SOLVERS[solver](template.new_game(), should_stop)
+                return stopped
+            cases.append((solver, run_solver))
+
+        for case, run in cases:
+            key = f"{case}/{name}"
+            results[key] = measure(run, trials, memory_trials)
+            result = results[key]
+            print(f"{key:30s} median {result['median_s'] * 1e3:10.2f} ms  p95 {result['p95_s'] * 1e3:10.2f} ms  "
+                  f"peak {result['median_peak_bytes'] / 1024:9.1f} KiB"
+                  + (f"  ({result['timeouts']} timeouts)" if result['timeouts'] else ""))
+    return results
+
+
+def save_baseline(results: Dict, path: str, settings: Dict) -> None:
+    """
+    Save suite results as a JSON baseline, with the settings and the machine
+    they were measured with.
+    """
+    baseline = {'settings': settings,
+                'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'processor': platform.processor(), 'cpus': os.cpu_count()},
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': results}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def find_regressions(results: Dict, baseline: Dict, threshold: float = 1.25,
+                     min_seconds: float = 0.002, min_trials: int = MIN_TRIALS) -> List[str]:
+    """
+    Compare suite results with a saved baseline. A case regresses when its
+    median time grew past the threshold factor of the old p95 (so the spread
+    of the old trials counts as noise), when its median memory peak grew by
+    more than the threshold factor, or when it times out more often. Time
+    differences below min_seconds are treated as noise too. A case that timed
+    out in either run is only compared on its timeouts, as its time is the
+    deadline and its memory peak depends on how far it got.
+
+    Args:
+        results : Results of run_suite
+        baseline : Loaded JSON baseline (see save_baseline)
+        threshold : Allowed ratio of the new median to the old p95
+        min_seconds : Smallest time difference that counts
+        min_trials : Fewest timed runs per case, on both sides, to compare at all
+
+    Returns:
+        list: One message per regression, empty if there is none
+
+    Raises:
+        ValueError: If a case has fewer than min_trials trials
+    """
+    regressions = []
+    for key, result in results.items():
+        old = baseline['results'].get(key)
+        if old is None:
+            continue
+        if min(result['trials'], old['trials']) < min_trials:
+            raise ValueError(f"{key} has {min(result['trials'], old['trials'])} trials, "
+                             f"at least {min_trials} are needed to compare")
+        if result['timeouts'] / result['trials'] > old['timeouts'] / old['trials']:
+            regressions.append(f"{key}: timeouts {old['timeouts']}/{old['trials']} -> "
+                               f"{result['timeouts']}/{result['trials']}")
+        if result['timeouts'] or old['timeouts']:
+            continue
+        if (result['median_s'] > old['p95_s'] * threshold
+                and result['median_s'] - old['median_s'] > min_seconds):
+            regressions.append(f"{key}: median time {old['median_s'] * 1e3:.2f} ms "
+                               f"(p95 {old['p95_s'] * 1e3:.2f} ms) -> {result['median_s'] * 1e3:.2f} ms")
+        if result['median_peak_bytes'] > old['median_peak_bytes'] * threshold:
+            regressions.append(f"{key}: median memory peak {old['median_peak_bytes'] / 1024:.1f} KiB -> "
+                               f"{result['median_peak_bytes'] / 1024:.1f} KiB")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Lazor propagation and solvers.")
+    parser.add_argument('--trials', type=int, default=5, help="timed runs per case")
+    parser.add_argument('--memory-trials', type=int, default=1, help="runs per case traced for memory")
+    parser.add_argument('--timeout', type=float, default=10, help="seconds before a solve is stopped")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the generated boards")
+    parser.add_argument('--solvers', nargs='+', choices=sorted(SOLVERS), default=list(DEFAULT_SOLVERS))
+    parser.add_argument('--save', metavar='PATH', help="save the results as a JSON baseline")
+    parser.add_argument('--baseline', metavar='PATH', help="compare with a saved baseline, exit 1 on a regression")
+    parser.add_argument('--threshold', type=float, default=1.25, help="allowed slowdown factor against the baseline p95")
+    parser.add_argument('--micro', action='store_true', help="run the older single-purpose benchmarks instead")
+    parser.add_argument('--orderings', nargs='*', choices=sorted(ORDERINGS),
+                        help="compare the time to first solution of the guided search orderings instead (all if none given)")
+    args = parser.parse_args(argv)
+
+    if args.micro:
+        benchmark_propagate()
+        benchmark_engines()
+        benchmark_memory()
+        benchmark_iter_solutions()
+        benchmark_vectorized()
+        benchmark_parallel()
+        benchmark_solvers()
+        benchmark_parser()
+        return 0
+    if args.orderings is not None:
+        benchmark_orderings(orderings=args.orderings or tuple(ORDERINGS), timeout=args.timeout, seed=args.seed)
+        return 0
+
+    settings = {'trials': args.trials, 'memory_trials': args.memory_trials, 'timeout': args.timeout,
+                'seed': args.seed, 'solvers': args.solvers}
+    results = run_suite(solvers=args.solvers, trials=args.trials, memory_trials=args.memory_trials,
+                        timeout=args.timeout, seed=args.seed)
+    if args.save:
+        save_baseline(results, args.save, settings)
+        print(f"Baseline saved to {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['settings'] != settings:
+            print("Warning: the baseline was measured with different settings", baseline['settings'])
+        try:
+            regressions = find_regressions(results, baseline, args.threshold)
+        except ValueError as error:
+            print("Cannot compare:", error)
+            return 2
+        for regression in regressions:
+            print("REGRESSION", regression)
+        print(f"{len(regressions)} regressions against {args.baseline}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,222 @@
+"""
+Validating parser of .bff files.
+
+Besides single files, it reads streams of many boards, e.g. generated boards
+joined with `cat *.bff > boards.bff`: in a stream every board starts with its
+grid (comments may come before it), the next GRID START begins the next board.
+Every error is raised as a BffError naming the file and line.
+
+    boards = load_boards(["generated", "boards.bff"])
+"""
+from classes import *
+import os
+from typing import List
+
+GRID_CELLS = frozenset('xoABC')
+
+
+class BffError(ValueError):
+    def __init__(self, message: str, filename: str = None, line: int = None):
+        """
+        A .bff file that does not describe a valid board.
+
+        Args:
+            message : What is wrong
+            filename : The file, if the text came from one
+            line : Number of the offending line, counted from 1
+        """
+        self.message = message
+        self.filename = filename
+        self.line = line
+        super().__init__(f"{filename or '<bff>'}:{line}: {message}" if line else f"{filename or '<bff>'}: {message}")
+
+
+def _finish_board(grid, grid_line: int, blocks: dict, lazors: list, points: list,
+                  filename: str, name: str) -> BoardTemplate:
+    """
+    Check what needs the size of the grid and build the template. Lazors and
+    points come with the number of their line.
+    """
+    if not grid:
+        raise BffError("the grid is empty", filename, grid_line)
+    max_x, max_y = len(grid[0]) * 2, len(grid) * 2
+    for (x, y), (vx, vy), line in lazors:
+        if not (0 <= x <= max_x and 0 <= y <= max_y):
+            raise BffError(f"lazor at ({x}, {y}) is off the {len(grid[0])}x{len(grid)} board", filename, line)
+        if vx not in (-1, 1) or vy not in (-1, 1):
+            raise BffError(f"lazor direction ({vx}, {vy}) is not diagonal, use 1 or -1", filename, line)
+    for (x, y), line in points:
+        if not (0 <= x <= max_x and 0 <= y <= max_y):
+            raise BffError(f"point ({x}, {y}) is off the {len(grid[0])}x{len(grid)} board", filename, line)
+    return BoardTemplate(grid, blocks.items(), [(position, direction) for position, direction, _ in lazors],
+                         [point for point, _ in points], name)
+
+
+def iter_bff(text: str, filename: str = None):
+    """
+    Parse every board in a .bff text.
+
+    Args:
+        text : Contents of a .bff file or of a stream of boards
+        filename : Where the text comes from, for the error messages and the
+            names of the boards
+
+    Yields:
+        BoardTemplate: The boards in stream order. A file holding one board
+        names it filename, boards of a longer stream are named filename#index
+    """
+    grid = None  # rows of the current board, None before its GRID START
+    grid_line = first_line = None
+    blocks, lazors, points = {}, [], []
+    reading_grid = False
+    width = None
+    index = 0
+    line = 0
+    for line, text_line in enumerate(text.splitlines(), 1):
+        text_line = text_line.strip()
+        # Skip empty lines and comments
+        if not text_line or text_line[0] == '#':
+            continue
+        if first_line is None:
+            first_line = line
+
+        if reading_grid:
+            if text_line == 'GRID STOP':
+                reading_grid = False
+                continue
+            row = text_line.split()
+            if not GRID_CELLS.issuperset(row):
+                if text_line == 'GRID START':
+                    raise BffError("GRID START inside the grid", filename, line)
+                if row[0] in ('L', 'P') or row[-1].lstrip('-').isdigit():
+                    raise BffError(f"{text_line!r} inside the grid, GRID STOP is missing", filename, line)
+                cell = next(cell for cell in row if cell not in GRID_CELLS)
+                raise BffError(f"unknown grid cell {cell!r}, expected one of x o A B C", filename, line)
+            if width is None:
+                width = len(row)
+            elif len(row) != width:
+                raise BffError(f"grid row has {len(row)} cells, the rows above have {width}", filename, line)
+            grid.append(row)
+            continue
+
+        parts = text_line.split()
+        keyword = parts[0]
+        try:
+            numbers = tuple(map(int, parts[1:]))
+        except ValueError:
+            numbers = None
+        if keyword == 'P' or keyword == 'L' or keyword in BLOCK_TYPES:
+            expected = 2 if keyword == 'P' else 4 if keyword == 'L' else 1
+            if len(parts) != expected + 1:
+                raise BffError(f"{keyword} needs {expected} numbers, got {len(parts) - 1}", filename, line)
+            if numbers is None:
+                raise BffError(f"{keyword} needs whole numbers, got {' '.join(parts[1:])!r}", filename, line)
+            if keyword == 'P':
+                points.append((numbers, line))
+            elif keyword == 'L':
+                lazors.append((numbers[:2], numbers[2:], line))
+            elif numbers[0] < 0:
+                raise BffError(f"negative number of {keyword} blocks", filename, line)
+            elif keyword in blocks:
+                raise BffError(f"the number of {keyword} blocks is given twice", filename, line)
+            else:
+                blocks[keyword] = numbers[0]
+        elif text_line == 'GRID START':
+            if grid is not None:
+                # The next board of a stream
+                yield _finish_board(grid, grid_line, blocks, lazors, points, filename, f"{filename}#{index}")
+                index += 1
+                blocks, lazors, points = {}, [], []
+            grid = []
+            grid_line = line
+            reading_grid = True
+            width = None
+        elif text_line == 'GRID STOP':
+            raise BffError("GRID STOP without GRID START", filename, line)
+        else:
+            raise BffError(f"unknown line {text_line!r}, expected GRID START, A, B, C, L or P", filename, line)
+
+    if reading_grid:
+        raise BffError("GRID START without GRID STOP", filename, grid_line)
+    if first_line is None:
+        raise BffError("no board in the file", filename, line or None)
+    if grid is None:
+        raise BffError("no GRID START", filename, first_line)
+    yield _finish_board(grid, grid_line, blocks, lazors, points, filename,
+                        filename if index == 0 else f"{filename}#{index}")
+
+
+def parse_bff(text: str, filename: str = None) -> BoardTemplate:
+    """
+    Parse a .bff text holding exactly one board.
+    """
+    boards = iter_bff(text, filename)
+    template = next(boards)
+    for extra in boards:
+        raise BffError("the file holds more than one board, read it with load_boards", filename)
+    return template
+
+
+def read_bff(filename: str) -> BoardTemplate:
+    """
+    Read and parse a .bff file holding one board.
+
+    Args:
+        filename (str): Path to the .bff file
+
+    Returns:
+        BoardTemplate: The parsed board
+    """
+    try:
+        with open(filename, 'r') as f:
+            text = f.read()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Could not find file: {filename}")
+    return parse_bff(text, filename)
+
+
+def find_boards(paths) -> List[str]:
+    """
+    Collect the .bff files given directly or found in the given directories.
+
+    Args:
+        paths : Files and directories
+
+    Returns:
+        list: Paths of the .bff files, sorted within each directory
+    """
+    boards = []
+    for path in paths:
+        if os.path.isdir(path):
+            boards.extend(os.path.join(path, file_name) for file_name in sorted(os.listdir(path))
+                          if file_name.endswith('.bff'))
+        else:
+            boards.append(path)
+    return boards
+
+
+def load_boards(paths, errors: list = None) -> List[BoardTemplate]:
+    """
+    Load every board of many .bff files, directories of them, or streams.
+
+    Args:
+        paths : Files and directories
+        errors : Optional list, a file with an invalid board is then skipped
+            (with the boards before the error kept) and its BffError appended,
+            instead of raised
+
+    Returns:
+        list: The boards, in file and stream order
+    """
+    boards = []
+    for path in find_boards(paths):
+        with open(path, 'r') as f:
+            text = f.read()
+        try:
+            for template in iter_bff(text, path):
+                boards.append(template)
+        except BffError as error:
+            if errors is None:
+                raise
+            errors.append(error)
+    return boards
@@ -0,0 +1,263 @@
+"""
+Bitboard engine for LazorGame.propagate, used when LazorGame.engine is 'bitboard'.
+
+The blocks of a game are kept as Python integers used as bitsets, one bit
+per cell (y * W + x) and one integer per block type (LazorGame.block_bits). A
+lazor going straight only changes course at the first block on its diagonal,
+so instead of stepping half step by half step the engine looks up the cells
+of the whole straight run (precomputed per lazor state, as a bitset), finds
+the first block on it with an AND and a bit lookup, and adds the segments and
+points of the run up to there (also precomputed bitsets) in one go. Visited
+states, drawn segments and covered points are bitsets too.
+
+A run going down the board meets its cells row by row, and at most two of
+them in a row, so its first block is in the lowest blocked row: the lowest
+set bit when it goes right, the highest set bit of that row when it goes
+left. Runs going up take the highest row the same way.
+
+The drawn segments are the same as those of the Python engine, and so are
+validate and covered_points; the path lists them in segment order instead of
+the order the lazors drew them in, like propagate_incremental.
+"""
+from classes import *
+import weakref
+
+_propagators = weakref.WeakKeyDictionary()
+_last = (None, None)  # (template, propagator) of the last call, games of one board come in runs
+
+
+def propagator_for(template: BoardTemplate) -> "BitboardPropagator":
+    """
+    The BitboardPropagator of a board, made once per template.
+    """
+    global _last
+    if _last[0] is template:
+        return _last[1]
+    propagator = _propagators.get(template)
+    if propagator is None:
+        propagator = _propagators[template] = BitboardPropagator(template)
+    _last = (template, propagator)
+    return propagator
+
+
+def propagate(game: "LazorGame") -> tuple:
+    """
+    Propagate the lazors of a game, for LazorGame.propagate.
+
+    Returns:
+        tuple: (propagator, segments, points), see BitboardPropagator.propagate
+    """
+    propagator = propagator_for(game.template)
+    return (propagator,) + propagator.propagate(game)
+
+
+class BitboardPropagator:
+    def __init__(self, template: BoardTemplate):
+        """
+        Precompute the position, segment and cell tables of a board. The tables
+        of the straight runs are built the first time a run is taken.
+
+        Args:
+            template : The parsed board
+        """
+        self.template = template
+        self.width = width = len(template.grid[0])
+        self.height = height = len(template.grid)
+        self.max_x, self.max_y = width * 2, height * 2
+
+        # Half-step positions, with a margin of one for the points where lazors leave the board
+        self.stride = width * 2 + 3
+        self.num_points = self.stride * (height * 2 + 3)
+        # Segments: (position, direction) of the board's positions, then the
+        # zero-length ones of lazors stopped by a B block
+        self.num_positions = (width * 2 + 1) * (height * 2 + 1)
+        self.segments = [None] * (self.num_positions * 5)
+        self.row_masks = [((1 << width) - 1) << (y * width) for y in range(height)]
+        self.rays = {}
+        self.targets = {}
+        self.sources = [self.entry(x, y, DIRECTION_INDEX[direction], True)
+                        for (x, y), direction in template.lazors]
+
+    def entry(self, x: int, y: int, direction: int, check: bool) -> int:
+        """
+        Number of a lazor state: the lazor at (x, y) going in direction, which
+        first checks the block in front of it if check is set (a source or a
+        lazor split off by a C block), or moves right away (after a block).
+        """
+        return ((y * (self.width * 2 + 1) + x) * 4 + direction) * 2 + check
+
+    def point_bit(self, x: int, y: int) -> int:
+        return 1 << ((y + 1) * self.stride + x + 1)
+
+    def segment_bit(self, x: int, y: int, direction: int) -> int:
+        index = (y * (self.width * 2 + 1) + x) * 5 + direction
+        if self.segments[index] is None:
+            if direction == 4:
+                self.segments[index] = ((x, y), (x, y))
+            else:
+                vx, vy = DIRECTIONS[direction]
+                self.segments[index] = ((x, y), (x + vx, y + vy))
+        return 1 << index
+
+    def checked_cell(self, x: int, y: int, direction: int):
+        """
+        The cell (x, y) a lazor in this state checks, with the flipped
+        direction it leaves a block in, or None at the odd/odd points.
+        Same lookup as LazorGame.propagate, negative indices wrap.
+        """
+        vx, vy = DIRECTIONS[direction]
+        if x % 2 == 0:
+            check_x, check_y, flipped = (x + vx) // 2, y // 2, FLIP_X[direction]
+        elif y % 2 == 0:
+            check_x, check_y, flipped = x // 2, (y + vy) // 2, FLIP_Y[direction]
+        else:
+            return None
+        if check_x >= self.width or check_y >= self.height:
+            raise IndexError("list index out of range")
+        return (check_y % self.height) * self.width + check_x % self.width, flipped
+
+    def ray(self, entry: int) -> tuple:
+        """
+        Tables of the straight run from a lazor state, built on first use.
+
+        Returns:
+            tuple: (first, kind, mask, steps, segments, points, hits, all_segments, all_points)
+            first is the bit of the cell checked before the first step, or 0;
+            mask has the bits of the cells checked before the later steps,
+            steps maps such a cell to the step; kind tells how to find the
+            first of them, see propagate; segments[k] and points[k] are the bitsets drawn before
+            step k, all_segments and all_points those of the whole run up to
+            where it leaves the board; hits[k] tells what a block at step k
+            does: (cell bit, point bit, B segment bit, entry after an A block,
+            entry split off by a C block, entry going on through it)
+        """
+        state, check = divmod(entry, 2)
+        position, direction = divmod(state, 4)
+        y, x = divmod(position, self.width * 2 + 1)
+        vx, vy = DIRECTIONS[direction]
+        kind = (0 if vx > 0 else 2) if vy > 0 else (1 if vx < 0 else 3)
+
+        first = mask = 0
+        steps = [None] * (self.width * self.height)
+        segments, points, hits = [], [], []
+        drawn_segments = drawn_points = 0
+        step = 0
+        while True:
+            checked = self.checked_cell(x, y, direction) if check or step else None
+            if checked is None:
+                hits.append(None)
+            else:
+                cell, flipped = checked
+                if step == 0:
+                    first = 1 << cell
+                else:
+                    mask |= 1 << cell
+                    steps[cell] = step
+                hits.append((1 << cell, self.point_bit(x, y), self.segment_bit(x, y, 4),
+                             self.entry(x, y, flipped, False), self.entry(x, y, flipped, True),
+                             self.entry(x, y, direction, False)))
+            segments.append(drawn_segments)
+            points.append(drawn_points)
+            drawn_segments |= self.segment_bit(x, y, direction)
+            drawn_points |= self.point_bit(x, y) | self.point_bit(x + vx, y + vy)
+            x, y = x + vx, y + vy
+            step += 1
+            if not (0 < x < self.max_x and 0 < y < self.max_y):
+                break
+        ray = (first, kind, mask, steps, segments, points, hits, drawn_segments, drawn_points)
+        self.rays[entry] = ray
+        return ray
+
+    def propagate(self, game: "LazorGame") -> tuple:
+        """
+        Propagate the lazors of a game.
+
+        Args:
+            game : A game of this board, with its blocks in game.block_bits
+
+        Returns:
+            tuple: (segments, points), bitsets of the drawn segments and the
+            points they cover
+        """
+        block_bits = game.block_bits
+        reflect = block_bits['A']
+        opaque = block_bits['B']
+        occupied = reflect | opaque | block_bits['C']
+        width = self.width
+        row_masks = self.row_masks
+
+        rays = self.rays
+        pending = list(self.sources)
+        visited = segments = points = 0
+        while pending:
+            entry = pending.pop()
+            if visited >> entry & 1:
+                continue
+            visited |= 1 << entry
+            ray = rays.get(entry) or self.ray(entry)
+            first, kind, mask, steps, ray_segments, ray_points, hits, all_segments, all_points = ray
+
+            # First block on the run, if any
+            if first & occupied:
+                step = 0
+            else:
+                blocked = mask & occupied
+                if not blocked:
+                    segments |= all_segments
+                    points |= all_points
+                    continue
+                if kind == 0:  # down and right: lowest cell
+                    cell = (blocked & -blocked).bit_length() - 1
+                elif kind == 1:  # up and left: highest cell
+                    cell = blocked.bit_length() - 1
+                elif kind == 2:  # down and left: highest cell of the lowest row
+                    row = ((blocked & -blocked).bit_length() - 1) // width
+                    cell = (blocked & row_masks[row]).bit_length() - 1
+                else:  # up and right: lowest cell of the highest row
+                    blocked &= row_masks[(blocked.bit_length() - 1) // width]
+                    cell = (blocked & -blocked).bit_length() - 1
+                step = steps[cell]
+            segments |= ray_segments[step]
+            points |= ray_points[step]
+
+            cell, point, stopped, reflected, split, straight = hits[step]
+            if cell & reflect:
+                pending.append(reflected)
+            elif cell & opaque:
+                segments |= stopped
+                points |= point
+            else:
+                pending.append(split)
+                pending.append(straight)
+        return segments, points
+
+    def path(self, segments: int) -> list:
+        """
+        The segments of a segment bitset, in segment order.
+        """
+        table = self.segments
+        return [table[index] for index, bit in enumerate(reversed(bin(segments)[2:])) if bit == '1']
+
+    def covered_points(self, points: int) -> set:
+        """
+        The points of a point bitset.
+        """
+        stride = self.stride
+        return {(index % stride - 1, index // stride - 1)
+                for index, bit in enumerate(reversed(bin(points)[2:])) if bit == '1'}
+
+    def covers(self, points: int, targets) -> bool:
+        """
+        Whether a point bitset holds all the targets.
+        """
+        key = tuple(targets)
+        mask = self.targets.get(key)
+        if mask is None:
+            mask = 0
+            for x, y in key:
+                if -1 <= x <= self.max_x + 1 and -1 <= y <= self.max_y + 1:
+                    mask |= self.point_bit(x, y)
+                else:
+                    mask |= 1 << self.num_points  # never covered
+            self.targets[key] = mask
+        return not mask & ~points
@@ -0,0 +1,117 @@
+"""
+Checkpoints of long searches.
+
+A search keeps its progress in a plain dict (see guided_search and
+iter_solutions). SearchCheckpoint writes that dict to a JSON file, tagged with
+the content hash of the board, so a search that was stopped or killed can be
+continued later, in another process, from where it was last saved.
+
+Only guided_search (solve_board_guided, the 'guided' solver of batch.py) and
+iter_solutions keep such a state. solve_board and solve_board_optimized cannot
+be resumed; iter_solutions is the resumable way to go through every placement.
+"""
+from classes import *
+import itertools
+import json
+import os
+
+
+class SearchCheckpoint:
+    def __init__(self, path: str, template: BoardTemplate):
+        """
+        Args:
+            path : JSON file the progress is saved to
+            template : The board being searched
+        """
+        self.path = path
+        self.board = template.content_hash()
+        self._logged = {}  # key -> (items, bytes) of each log known to be in the files
+
+    def log_path(self, key: str) -> str:
+        return f"{self.path}.{key}.log"
+
+    def load(self) -> dict:
+        """
+        Read the saved progress.
+
+        Returns:
+            dict: The search state, or an empty dict if there is no checkpoint
+            for this board (a checkpoint of another board is ignored)
+        """
+        self._logged = {}
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            saved = json.load(f)
+        if saved.get('board') != self.board:
+            return {}
+        state = saved['state']
+        for key in saved['sets']:
+            state[key] = set(state[key])
+        for key, (count, size) in saved.get('logs', {}).items():
+            # Items appended after the JSON file was last replaced are not part of this state
+            with open(self.log_path(key), 'rb') as f:
+                lines = f.read(size).split()
+            state[key] = dict.fromkeys(int(line, 16) for line in lines[:count])
+            self._logged[key] = (count, size)
+        return state
+
+    def save(self, state: dict) -> None:
+        """
+        Write the progress. The file is replaced in one step, so a process
+        killed while saving leaves the previous checkpoint intact.
+
+        Sets are stored as lists in the file. Ordered sets of ints, kept as
+        dicts like the 'explored' placements of guided_search, can grow large:
+        they go to a log file next to it, one hex number per line, and each
+        save only appends the items added since the last one.
+
+        Args:
+            state : The search state
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        sets = [key for key, value in state.items() if isinstance(value, set)]
+        logs = {key: self._append(key, value) for key, value in state.items() if isinstance(value, dict)}
+        saved = {'board': self.board, 'sets': sets, 'logs': logs,
+                 'state': {key: sorted(value) if key in sets else value
+                           for key, value in state.items() if key not in logs}}
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(saved, f)
+        os.replace(temporary_path, self.path)
+        self._logged.update(logs)
+
+    def _append(self, key: str, items: dict) -> tuple:
+        """
+        Append the items of an ordered set that are not in its log yet.
+
+        Returns:
+            tuple: (items, bytes) of the log, for the JSON file
+        """
+        count, size = self._logged.get(key, (0, 0))
+        path = self.log_path(key)
+        if count > len(items) or not os.path.exists(path):
+            count = size = 0  # not the set that was logged, write it again
+        with open(path, 'r+b' if size else 'wb') as f:
+            # Drop what a killed save may have appended past the last checkpoint
+            f.truncate(size)
+            f.seek(size)
+            new_items = itertools.islice(items, count, None)
+            size += f.write(''.join(f"{item:x}\n" for item in new_items).encode())
+        return len(items), size
+
+    def clear(self) -> None:
+        """
+        Remove the checkpoint once the search is finished.
+        """
+        keys = set(self._logged)
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                keys.update(json.load(f).get('logs', {}))
+            os.remove(self.path)
+        for key in keys:
+            if os.path.exists(self.log_path(key)):
+                os.remove(self.log_path(key))
+        self._logged = {}
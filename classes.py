@@ -1,9 +1,16 @@
+import hashlib
+import json
 import os
+import sys
+import time
+from collections import OrderedDict, namedtuple
 from typing import Tuple
-import matplotlib.pyplot as plt
-import numpy as np
+
+BLOCK_TYPES = frozenset('ABC')
 
 class Lazor:
+    __slots__ = ('position', 'direction', 'end')
+
     def __init__(self, position: Tuple[int, int], direction: Tuple[int, int]):
         """
         Initialize a Lazor for the game. During the propagation, each lazor will propogate
@@ -22,6 +29,8 @@ class Lazor:
 
 
 class Block:
+    __slots__ = ('block_type', 'position')
+
     def __init__(self, block_type: str, position: Tuple[int, int]):
         """
         Initialize a block for the Lazor game.
@@ -36,84 +45,621 @@ class Block:
     def __str__(self) -> str:
         return f"Block Type: {self.block_type}, Position: {self.position}"
 
+class BoardTemplate:
+    def __init__(self, grid, blocks, lazors, points, filename: str = None):
+        """
+        Parsed, immutable description of a Lazor board. A template is read once
+        and then used to create as many mutable LazorGame states as needed,
+        so the solvers never go back to the .bff file.
+
+        Args:
+            grid : Rows of cell characters ('x', 'o', 'A', 'B', 'C').
+            blocks : (block_type, count) pairs of the available blocks, in file order.
+            lazors : ((x, y), (vx, vy)) pairs of the lazor sources.
+            points : (x, y) target points.
+            filename : The .bff file the board was read from, if any.
+        """
+        self.grid = tuple(tuple(row) for row in grid)
+        self.blocks = tuple((block_type, int(count)) for block_type, count in blocks)
+        self.lazors = tuple((tuple(position), tuple(direction)) for position, direction in lazors)
+        self.points = tuple(tuple(point) for point in points)
+        self.filename = filename
+
+    @classmethod
+    def from_file(cls, filename: str) -> "BoardTemplate":
+        """
+        Read and parse a .bff file, see bff_parser.
+
+        Args:
+            filename (str): Path to the .bff file
+
+        Returns:
+            BoardTemplate: The parsed board
+
+        Raises:
+            BffError: A ValueError naming the line of the file that is wrong
+        """
+        # Imported here, bff_parser builds on this module
+        from bff_parser import read_bff
+        return read_bff(filename)
+
+    def available_positions(self) -> list:
+        """
+        Positions where a block may be placed, in row-major order.
+        """
+        return [(x, y) for y, row in enumerate(self.grid) for x, cell in enumerate(row) if cell == 'o']
+
+    def blocks_needed(self) -> list:
+        """
+        Flat list of the blocks to place, e.g. ['A', 'A', 'C'].
+        """
+        needed = []
+        for block_type, count in self.blocks:
+            needed.extend([block_type] * count)
+        return needed
+
+    def content_hash(self) -> str:
+        """
+        Hash of what the board is made of: grid, block inventory, lazors and
+        targets. Comments, whitespace, the order of the lines and the file name
+        of the .bff do not change it.
+        """
+        content = {
+            'grid': [list(row) for row in self.grid],
+            'blocks': sorted([block_type, count] for block_type, count in self.blocks if count > 0),
+            'lazors': sorted([list(position), list(direction)] for position, direction in self.lazors),
+            'points': sorted(list(point) for point in self.points),
+        }
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+    def to_bff(self, comments=()) -> str:
+        """
+        Write the board in the .bff format read by from_file.
+
+        Args:
+            comments : Lines written as comments at the top of the file
+
+        Returns:
+            str: The contents of the .bff file
+        """
+        lines = [f"# {comment}" for comment in comments]
+        lines.append("GRID START")
+        lines.extend("   ".join(row) for row in self.grid)
+        lines.append("GRID STOP")
+        lines.extend(f"{block_type} {count}" for block_type, count in self.blocks if count > 0)
+        lines.extend(f"L {x} {y} {vx} {vy}" for (x, y), (vx, vy) in self.lazors)
+        lines.extend(f"P {x} {y}" for x, y in self.points)
+        return "\n".join(lines) + "\n"
+
+    def new_game(self, placements=()) -> "LazorGame":
+        """
+        Create a fresh mutable game from this template.
+
+        Args:
+            placements : Optional ((x, y), block_type) pairs to overlay on the grid.
+
+        Returns:
+            LazorGame: The new game state
+        """
+        game = LazorGame(self.filename, template=self)
+        for position, block_type in placements:
+            game.add_block(block_type, position)
+        return game
+
+
+# Lazor directions as small ints, and the direction after bouncing off a
+# block side in x (vx flips) or in y (vy flips)
+DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+DIRECTION_INDEX = {direction: index for index, direction in enumerate(DIRECTIONS)}
+FLIP_X = tuple(DIRECTION_INDEX[(-vx, vy)] for vx, vy in DIRECTIONS)
+FLIP_Y = tuple(DIRECTION_INDEX[(vx, -vy)] for vx, vy in DIRECTIONS)
+CELL_CODES = {'o': 0, 'x': 0, 'A': 1, 'B': 2, 'C': 3}
+EMPTY, REFLECT, OPAQUE, REFRACT = range(4)
+
+
+class BeamGraph:
+    def __init__(self, grid, sources):
+        """
+        Traced beam states of a board, used for incremental propagation.
+        A state is the (position, direction) of a lazor about to check the next
+        block. Every traced state remembers the cell it checked, the segment it
+        drew and the states it leads to, so when one cell changes only the states
+        that checked it and everything downstream of them are traced again.
+
+        Everything is stored as ints: a half-step position is
+        (y + 1) * stride + (x + 1), with a margin of one half step around the
+        board for the segments that leave it, a state is position * 4 + direction index, a segment is
+        start * positions + end and a cell is y * width + x. Block types are
+        read from a flat bytearray copy of the grid.
+
+        Args:
+            grid : The grid of the game, shared and not copied
+            sources : ((x, y), (vx, vy)) pairs of the lazors on the board
+        """
+        self.grid = grid
+        self.width = len(grid[0])
+        self.height = len(grid)
+        self.stride = self.width * 2 + 3
+        self.positions = self.stride * (self.height * 2 + 3)
+        self.cells = bytearray(CELL_CODES[cell] for row in grid for cell in row)
+        self.sources = [self.encode_state(position, direction) for position, direction in sources]
+        self.source_set = set(self.sources)
+        self.edges = {}  # state -> (checked cell or -1, segment, next states)
+        self.predecessors = {}  # state -> set of traced states leading to it
+        self.cell_states = {}  # cell -> set of states that checked it
+        self.segments = {}  # segment -> number of states drawing it
+        self.traced = 0  # number of states traced so far, including re-traces
+        self.trace(self.sources)
+
+    def encode_state(self, position, direction) -> int:
+        x, y = position
+        return ((y + 1) * self.stride + x + 1) * 4 + DIRECTION_INDEX[tuple(direction)]
+
+    def decode_position(self, position: int) -> Tuple[int, int]:
+        y, x = divmod(position, self.stride)
+        return (x - 1, y - 1)
+
+    def step(self, state: int):
+        """
+        Move a lazor state by one half step, following the same rules as
+        LazorGame.propagate and LazorGame.interact_with_block.
+
+        Args:
+            state : The encoded (position, direction) of the lazor
+
+        Returns:
+            The checked cell (or -1), the drawn segment and the next states
+        """
+        position, direction = divmod(state, 4)
+        x, y = self.decode_position(position)
+        vx, vy = DIRECTIONS[direction]
+        cell = -1
+        block = EMPTY
+        if x % 2 == 0:  # Check x direction
+            check_x, check_y = (x + vx) // 2, y // 2
+        elif y % 2 == 0:  # Check y direction
+            check_x, check_y = x // 2, (y + vy) // 2
+        else:
+            check_x = None
+        if check_x is not None:
+            # Same indexing as self.grid[check_y][check_x], negative indices wrap
+            if check_x >= self.width or check_y >= self.height:
+                raise IndexError("list index out of range")
+            cell = (check_y % self.height) * self.width + check_x % self.width
+            block = self.cells[cell]
+
+        if block == OPAQUE:
+            # Opaque block, the lazor stops where it is
+            return cell, position * self.positions + position, ()
+
+        successors = []
+        if block != EMPTY:
+            reflected = FLIP_X[direction] if x % 2 == 0 else FLIP_Y[direction]
+            if block == REFLECT:
+                direction = reflected
+                vx, vy = DIRECTIONS[direction]
+            else:
+                # Refract block, the reflected part becomes a new lazor
+                successors.append(position * 4 + reflected)
+
+        new_x, new_y = x + vx, y + vy
+        new_position = position + vy * self.stride + vx
+        if 0 < new_x < self.width * 2 and 0 < new_y < self.height * 2:
+            successors.append(new_position * 4 + direction)
+        return cell, position * self.positions + new_position, successors
+
+    def trace(self, seeds) -> set:
+        """
+        Trace every state reachable from the seeds that is not traced yet.
+
+        Args:
+            seeds : States to start from
+
+        Returns:
+            set: Segments that were not on the path before
+        """
+        added = set()
+        traced = len(self.edges)
+        stack = list(seeds)
+        while stack:
+            state = stack.pop()
+            if state in self.edges:
+                continue
+            cell, segment, successors = self.step(state)
+            self.edges[state] = (cell, segment, successors)
+            if cell >= 0:
+                self.cell_states.setdefault(cell, set()).add(state)
+            count = self.segments.get(segment, 0)
+            if count == 0:
+                added.add(segment)
+            self.segments[segment] = count + 1
+            for next_state in successors:
+                self.predecessors.setdefault(next_state, set()).add(state)
+                if next_state not in self.edges:
+                    stack.append(next_state)
+        self.traced += len(self.edges) - traced
+        return added
+
+    def path(self) -> list:
+        """
+        The drawn segments as ((x1, y1), (x2, y2)) pairs, like LazorGame.path.
+        """
+        return [(self.decode_position(start), self.decode_position(end))
+                for start, end in (divmod(segment, self.positions) for segment in self.segments)]
+
+    def checked_cells(self) -> set:
+        """
+        Cells that some lazor state checks, i.e. the only cells where a new
+        block can change the path.
+        """
+        return {(cell % self.width, cell // self.width)
+                for cell, states in self.cell_states.items() if states}
+
+    def update_cell(self, x: int, y: int) -> bool:
+        """
+        Re-trace the beam after the content of grid cell (x, y) changed.
+
+        Args:
+            x (int): The x-coordinate of the cell.
+            y (int): The y-coordinate of the cell.
+
+        Returns:
+            bool: True if the set of path segments changed
+        """
+        cell = y * self.width + x
+        self.cells[cell] = CELL_CODES[self.grid[y][x]]
+        affected = self.cell_states.get(cell)
+        if not affected:
+            return False
+
+        # 1 Everything downstream of the states that looked at the cell is stale
+        stale = set()
+        stack = list(affected)
+        while stack:
+            state = stack.pop()
+            if state not in stale:
+                stale.add(state)
+                stack.extend(self.edges[state][2])
+
+        # 2 Drop the stale states and the segments only they were drawing
+        dropped = set()
+        for state in stale:
+            cell, segment, successors = self.edges.pop(state)
+            if cell >= 0:
+                self.cell_states[cell].discard(state)
+            self.segments[segment] -= 1
+            if self.segments[segment] == 0:
+                del self.segments[segment]
+                dropped.add(segment)
+            for next_state in successors:
+                self.predecessors[next_state].discard(state)
+
+        # 3 Trace again from the stale states still reached by a lazor source
+        # or by a state that did not change
+        seeds = [state for state in stale
+                 if state in self.source_set or self.predecessors.get(state)]
+        added = self.trace(seeds)
+        return dropped != added
+
+
+class TargetIndex:
+    def __init__(self, template: BoardTemplate):
+        """
+        For every target point, the cells whose block could turn a lazor onto it.
+        A lazor only changes direction where it bounces off an A block or is
+        split by a C block, and then travels in a straight diagonal line. So a
+        target that no lazor covers yet can only be hit later through a turn at a
+        block side on one of the diagonals through it, and the block doing the
+        turn sits in a cell listed here.
+
+        Args:
+            template : The parsed board
+        """
+        self.points = template.points
+        width = len(template.grid[0])
+        height = len(template.grid)
+        self.turn_cells = []
+        for tx, ty in self.points:
+            cells = set()
+            for dx, dy in DIRECTIONS:
+                # Walk back from the target against the direction of travel
+                x, y = tx - dx, ty - dy
+                while 0 <= x <= width * 2 and 0 <= y <= height * 2:
+                    # The cell checked by a lazor that leaves (x, y) in direction (dx, dy)
+                    # after a bounce, same indexing as LazorGame.propagate
+                    if x % 2 == 0:
+                        cell_x, cell_y = (x - dx) // 2, y // 2
+                    elif y % 2 == 0:
+                        cell_x, cell_y = x // 2, (y - dy) // 2
+                    else:
+                        cell_x = None
+                    if cell_x is not None and cell_x < width and cell_y < height:
+                        cells.add((cell_x % width, cell_y % height))
+                    x, y = x - dx, y - dy
+            self.turn_cells.append(frozenset(cells))
+
+    def feasible(self, game: "LazorGame", blocks_left, covered: set = None) -> bool:
+        """
+        Check if the blocks left could still bring a lazor onto every target.
+        Blocks are only ever added, so this can only return False for a partial
+        placement that no completion solves. It is a quick necessary test,
+        True does not mean a solution exists.
+
+        Args:
+            game : The game with the blocks placed so far, propagated
+            blocks_left : Blocks still to be placed
+            covered : game.covered_points(), if the caller has it already
+
+        Returns:
+            bool: False if no completion of the placement can hit every target
+        """
+        if covered is None:
+            covered = game.covered_points()
+        missed = [cells for point, cells in zip(self.points, self.turn_cells) if point not in covered]
+        if not missed:
+            return True
+        turners_left = 0
+        for block_type in blocks_left:
+            if block_type != 'B':
+                turners_left += 1
+        if turners_left == 0:
+            return False
+        grid = game.grid
+        needs = []
+        for cells in missed:
+            # A block already in place may turn some lazor onto the target
+            free = set()
+            for x, y in cells:
+                cell = grid[y][x]
+                if cell == 'A' or cell == 'C':
+                    break
+                if cell == 'o':
+                    free.add((x, y))
+            else:
+                if not free:
+                    return False
+                needs.append(free)
+        if len(needs) <= 1:
+            return True
+
+        # Targets with disjoint cell sets each need their own new A or C block
+        used = set()
+        needed = 0
+        for free in sorted(needs, key=len):
+            if used.isdisjoint(free):
+                used |= free
+                needed += 1
+        return needed <= turners_left
+
+
+BeamResult = namedtuple('BeamResult', ['segments', 'solved'])
+
+
+class PropagationMemo:
+    def __init__(self, positions, block_types, max_bytes: int = 64 * 2**20):
+        """
+        Least recently used memo of propagation results, keyed by placement.
+        A placement is encoded as one bitmask of the free positions per block
+        type, so the same blocks placed in a different order share one entry.
+
+        Args:
+            positions : Free (x, y) positions of the board
+            block_types : Block types that can be placed
+            max_bytes : Approximate memory the stored results may use
+        """
+        self.position_bits = {tuple(pos): 1 << i for i, pos in enumerate(positions)}
+        self.type_index = {block_type: i for i, block_type in enumerate(block_types)}
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = OrderedDict()  # key -> (BeamResult, size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, placement) -> tuple:
+        """
+        Compact key of a placement.
+
+        Args:
+            placement : ((x, y), block_type) pairs
+
+        Returns:
+            tuple: One position bitmask per block type
+        """
+        masks = [0] * len(self.type_index)
+        for pos, block_type in placement:
+            masks[self.type_index[block_type]] |= self.position_bits[pos]
+        return tuple(masks)
+
+    def get(self, key):
+        """
+        Stored result for a key, or None. Counts hits and misses.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, game: "LazorGame") -> BeamResult:
+        """
+        Store the result of a propagated game and evict the least recently used
+        results beyond max_bytes.
+
+        Args:
+            key : Key of the game's placement
+            game : Game after propagate_incremental, its encoded segments are stored
+
+        Returns:
+            BeamResult: The stored result
+        """
+        result = BeamResult(frozenset(game.beams.segments), game.validate())
+        size = sys.getsizeof(result.segments) + 32 * len(result.segments) + sys.getsizeof(key)
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (result, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+        return result
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self.entries), 'bytes': self.bytes}
+
+
+class SolverStats:
+    def __init__(self, progress=None, progress_interval: float = 1.0):
+        """
+        Counters and timings of a solver run. Every solver in functions.py takes
+        one (stats=...) and fills it in, and leaves it on game.stats.
+
+        The time of a run is split into building boards, propagating the lazors
+        (including the incremental updates after placing or removing a block)
+        and checking the targets; what is left of total_time is spent in the
+        search itself.
+
+        Args:
+            progress : Optional callable, called with the stats about every
+                progress_interval seconds while the solver runs
+            progress_interval : Seconds between two progress calls
+        """
+        self.solver = None
+        self.solved = False
+        self.nodes = 0  # search nodes expanded, or placements tried
+        self.propagations = 0  # boards propagated, fully or incrementally
+        self.propagation_steps = 0  # lazor half steps traced
+        self.cache_hits = 0  # solution cache and propagation memo hits
+        self.pruned = 0  # branches cut without searching them
+        self.construction_time = 0.0
+        self.propagation_time = 0.0
+        self.validation_time = 0.0
+        self.total_time = 0.0
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.next_progress = time.perf_counter() + progress_interval
+
+    def node(self, count: int = 1) -> None:
+        """
+        Count expanded nodes, and call the progress hook when it is due.
+        """
+        self.nodes += count
+        if self.progress is not None and time.perf_counter() >= self.next_progress:
+            self.next_progress = time.perf_counter() + self.progress_interval
+            self.progress(self)
+
+    def new_game(self, template: BoardTemplate, placement=()) -> "LazorGame":
+        start_time = time.perf_counter()
+        game = template.new_game(placement)
+        self.construction_time += time.perf_counter() - start_time
+        return game
+
+    def propagate(self, game: "LazorGame") -> None:
+        start_time = time.perf_counter()
+        game.propagate()
+        self.propagation_time += time.perf_counter() - start_time
+        self.propagations += 1
+        self.propagation_steps += game.segment_count()
+
+    def propagate_incremental(self, game: "LazorGame", change=None, *args) -> None:
+        """
+        Run game.propagate_incremental, after change(*args) (add_block or
+        remove_block of the game) if given, as one timed propagation.
+        """
+        traced = game.beams.traced if game.beams is not None else 0
+        start_time = time.perf_counter()
+        if change is not None:
+            change(*args)
+        game.propagate_incremental()
+        self.propagation_time += time.perf_counter() - start_time
+        self.propagations += 1
+        self.propagation_steps += game.beams.traced - traced
+
+    def validate(self, game: "LazorGame") -> bool:
+        start_time = time.perf_counter()
+        solved = game.validate()
+        self.validation_time += time.perf_counter() - start_time
+        return solved
+
+    def merge(self, other: "SolverStats") -> None:
+        """
+        Add the counters and timings of another run (e.g. of a worker) to these.
+        """
+        for name in ('nodes', 'propagations', 'propagation_steps', 'cache_hits', 'pruned',
+                     'construction_time', 'propagation_time', 'validation_time'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def as_dict(self) -> dict:
+        return {'solver': self.solver, 'solved': self.solved, 'nodes': self.nodes,
+                'propagations': self.propagations, 'propagation_steps': self.propagation_steps,
+                'cache_hits': self.cache_hits, 'pruned': self.pruned,
+                'construction_time': self.construction_time, 'propagation_time': self.propagation_time,
+                'validation_time': self.validation_time, 'total_time': self.total_time}
+
+    def __getstate__(self):
+        # The progress hook stays in the process it was given in
+        state = self.__dict__.copy()
+        state['progress'] = None
+        return state
+
+    def __repr__(self):
+        return (f"SolverStats({self.solver}: solved={self.solved}, nodes={self.nodes}, "
+                f"propagations={self.propagations}, steps={self.propagation_steps}, "
+                f"cache_hits={self.cache_hits}, pruned={self.pruned}, "
+                f"build {self.construction_time:.3f} s, propagate {self.propagation_time:.3f} s, "
+                f"validate {self.validation_time:.3f} s, total {self.total_time:.3f} s)")
+
+
+PROPAGATION_ENGINES = ('python', 'bitboard')
+
+
 class LazorGame:
-    def __init__(self, filename: str):
+    # Engine of propagate, one of PROPAGATION_ENGINES. Set it on the class to
+    # switch every game, or on a game to switch just that one
+    engine = 'python'
+
+    def __init__(self, filename: str = None, template: BoardTemplate = None):
         """
-        Initialize the Lazor board from a .bff file
+        Initialize the Lazor board from a .bff file or an already parsed template
         
         Args:
             filename (str): Path to the .bff file
+            template (BoardTemplate): Parsed board to start from, skips reading the file
         """
-        self.filename = filename
-        self.grid = []  # The game grid
-        self.blocks = {}  # Dictionary to store block requirements
-        self.block_objects = []  # List of block objects
-        self.lazor_objects = []  # List of lazor objects when reading the document
-        self.points = []  # List of points to intersect
-        self.path = [] # list of path travelled by lazor
-        self.created_lazors = []
-        self.lazors = []
-        self.read_board()
-        self.initialize_lazors()
-        self.initialize_blocks()
+        if template is None:
+            template = BoardTemplate.from_file(filename)
+        self.template = template
+        self.filename = template.filename if filename is None else filename
+        self.reset()
     
     def reset(self):
-        self.grid = []  # The game grid
-        self.blocks = {}  # Dictionary to store block requirements
+        """
+        Restore the board to the state described by its template. No file is read.
+        """
+        self.grid = [list(row) for row in self.template.grid]  # The game grid
+        self.blocks = dict(self.template.blocks)  # Dictionary to store block requirements
         self.block_objects = []  # List of block objects
-        self.lazor_objects = []  # List of lazor objects
-        self.points = []  # List of points to intersect
+        self.block_bits = {'A': 0, 'B': 0, 'C': 0}  # Cells of each block type as bitsets, bit y * width + x
+        self.lazor_objects = [Lazor(position, direction) for position, direction in self.template.lazors]  # List of lazor objects
+        self.points = list(self.template.points)  # List of points to intersect
+        self.bitboard = None # (propagator, segments, points) of the bitboard engine, see bitboard.py
         self.path = [] # list of path travelled by lazor
-        self.created_lazors = []
+        self.visited = set() # the segments of self.path, for O(1) lookups
+        self.created_lazors = set() # (position, direction) of lazors spawned by refraction
         self.lazors = []
-        self.read_board()
+        self.beams = None # BeamGraph kept by propagate_incremental
+        self.stats = None # SolverStats of the last solver run on the game
         self.initialize_lazors()
         self.initialize_blocks()
 
     def read_board(self) -> None:
-        """Read and parse the .bff file"""
-        try:
-            with open(self.filename, 'r') as f:
-                lines = [line.strip() for line in f.readlines()]
-                
-            reading_grid = False # Change to true after reading the GRID START
-            for line in lines:
-                # Skip empty lines and comments
-                if not line or line.startswith('#'):
-                    continue
-                    
-                if line == 'GRID START':
-                    reading_grid = True
-                    continue
-                elif line == 'GRID STOP':
-                    reading_grid = False
-                    continue
-                    
-                if reading_grid:
-                    # Add grid row, splitting by spaces
-                    self.grid.append(line.split()) #nested list
-                else:
-                    # Parse other elements when not readiong grid
-                    parts = line.split()
-                    if not parts:
-                        continue
-                        
-                    if parts[0] in ['A', 'B', 'C']: #blocks
-                        # Block specifications
-                        self.blocks[parts[0]] = int(parts[1])
-                    elif parts[0] == 'L': #lazers
-                        # Lazor specification
-                        lazor = Lazor(position=(int(parts[1]), int(parts[2])), direction=(int(parts[3]), int(parts[4])))
-                        self.lazor_objects.append(lazor)
-                    elif parts[0] == 'P':
-                        # Point specification: x, y
-                        self.points.append(tuple(map(int, parts[1:])))
-
-
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Could not find file: {self.filename}")
-        except Exception as e:
-            raise ValueError(f"Error parsing board file: {str(e)}")
+        """Read and parse the .bff file again and restart from it"""
+        self.template = BoardTemplate.from_file(self.filename)
+        self.reset()
     
     def initialize_blocks(self) -> None:
         """
@@ -124,6 +670,7 @@ class LazorGame:
                 if cell in ['A', 'B', 'C']:
                     block = Block(block_type=cell, position=(x, y))
                     self.block_objects.append(block)
+                    self.block_bits[cell] |= 1 << (y * len(row) + x)
 
     def initialize_lazors(self) -> None:
         """
@@ -134,126 +681,164 @@ class LazorGame:
 
     def visualize(self, address = None, file_name = None) -> None:
         """
-        Visualize the Lazor board using matplotlib
+        Visualize the Lazor board, see render.py. The drawing code is only
+        imported here, so the solvers do not load it.
         Args
             address : The adress to save the plot
             file_name : The file_name to save the plot
-            if exist, then save
-        """            
- 
-        fig, ax = plt.subplots(figsize=(10, 10))
-        
-        rows = len(self.grid)
-        cols = len(self.grid[0])
-        
-        # Define colors
-        block_styles = {
-            'x': {'color': 'gray', 'label': 'No Block Allowed'},
-            'o': {'color': 'white', 'label': 'Block Allowed'},
-            'A': {'color': 'blue', 'label': 'Reflect Block'},
-            'B': {'color': 'black', 'label': 'Opaque Block'},
-            'C': {'color': 'yellow', 'label': 'Refract Block'}
-        }
-        
-        # Create base grid
-        legend_handles = []
-        for i in range(rows):
-            for j in range(cols):
-                cell = self.grid[i][j]
-                style = block_styles[cell]
-                patch = plt.Rectangle((j, rows-1-i), 1, 1, facecolor=style['color'],edgecolor='black')
-                ax.add_patch(patch)
-                
-                # Add to legend if not already added
-                if style['label'] not in [h.get_label() for h in legend_handles]:
-                    legend_handles.append(plt.Rectangle((0,0), 1, 1, facecolor=style['color'],edgecolor='black',label=style['label']))
-        
-        # Plot points to intersect
-        for x, y in self.points:
-            point = ax.plot(x/2, rows-y/2, 'ro', markersize=10)[0]
-            if 'Target Points' not in [h.get_label() for h in legend_handles]:
-                legend_handles.append(point)
-                point.set_label('Target Points')
-         # Plot initial lazor positions and directions
-        for lazor in self.lazor_objects:
-            x, y = lazor.position
-            vx, vy = lazor.direction
-            ax.plot(x / 2, rows - y / 2, 'go', markersize=10, label='Lazor Start')
-            ax.arrow(x / 2, rows - y / 2, vx / 4, -vy / 4, head_width=0.1, head_length=0.1, fc='g', ec='g')
-        
-        # Plot laser paths based on path
-        for segment in self.path:
-            (x1, y1), (x2, y2) = segment
-            ax.plot([x1 / 2, x2 / 2], [rows - y1 / 2, rows - y2 / 2], 'r-', linewidth=2)
-
-        ax.set_xticks(range(cols + 1))
-        ax.set_yticks(range(rows + 1))
-        ax.grid(True)
-        ax.set_aspect('equal')
-        # Add legend
-        ax.legend(handles=legend_handles, loc='center left', bbox_to_anchor=(1, 0.5))
-        
-        plt.title(f'Lazor Board: {os.path.basename(self.filename)}')
-        plt.tight_layout()
-        
+            if exist, then save it as <file_name>_solution.png, else show it
+            with matplotlib
+        """
+        import render
         if address is not None:
             print("Saving the solution for :" , file_name)
-            plt.savefig(os.path.join(address, f"{file_name}_solution.png"))
-            plt.close()
+            render.save_render(self, os.path.join(address, f"{file_name}_solution.png"))
         else:
-            plt.show()
+            render.show(self)
+
+    @property
+    def path(self) -> list:
+        if self.bitboard is not None:
+            self._read_bitboard()
+        return self._path
+
+    @path.setter
+    def path(self, path: list) -> None:
+        self.bitboard = None
+        self._path = path
+
+    @property
+    def visited(self) -> set:
+        if self.bitboard is not None:
+            self._read_bitboard()
+        return self._visited
+
+    @visited.setter
+    def visited(self, visited: set) -> None:
+        self.bitboard = None
+        self._visited = visited
+
+    def _read_bitboard(self) -> None:
+        """Turn the segment bitset of the bitboard engine into path and visited, on first use"""
+        propagator, segments, _ = self.bitboard
+        self.path = propagator.path(segments)
+        self.visited = set(self._path)
+
+    def segment_count(self) -> int:
+        """Number of drawn segments, counted on the bitset without decoding the path"""
+        if self.bitboard is not None:
+            return self.bitboard[1].bit_count()
+        return len(self._visited)
 
     def propagate(self) -> None:
         """
-        Propagate all lazors until all of them have ended.
+        Propagate all lazors until all of them have ended, with the engine
+        set in self.engine. The 'bitboard' engine (see bitboard.py) draws the
+        same segments, but lists them in segment order, and reads the lazors
+        from lazor_objects each time instead of going on from self.lazors.
+
+        The 'python' engine:
+        Only the lazors still going are stepped, one half step per tick in the
+        order they were created (a lazor split off by a C block takes its first
+        step in the tick it was made), so the ordered segments in self.path
+        are the same as when every lazor was rescanned on every tick.
+        A segment stands for the (position, direction) state of a lazor after
+        the block it checks, so self.visited, the set of drawn segments, is the
+        set of visited states: a lazor ends the moment it gets back into a
+        state some lazor was already in, as everything from there on is drawn.
+        The states stay (x, y) tuples here: path and visited hold tuples, and
+        encoding the states as ints like BeamGraph only pays off if the path
+        is not decoded back after every call (for that, see bitboard.py).
         """
+        if self.engine != 'python':
+            self._propagate_bitboard()
+            return
         self.path = []
-        while any(not lazor.end for lazor in self.lazors):
-            #print(self.lazors)
-            for lazor in self.lazors:
-                if lazor.end:
-                    #print("continue 1")
-                    continue
-                
+        self.visited = set()
+        path = self.path
+        visited = self.visited
+        lazors = self.lazors
+        grid = self.grid
+        max_x = len(grid[0]) * 2
+        max_y = len(grid) * 2
+        created = self.created_lazors
+        active = [lazor for lazor in lazors if not lazor.end]
+        while active:
+            still_going = []
+            # Lazors split off during the tick are appended to active and stepped in it
+            for lazor in active:
                 # 1 Check if the lazor hits a block before moving to the new position
-                if lazor.position[0] % 2 == 0:  # Check x direction
-                    check_x = (lazor.position[0] + lazor.direction[0]) // 2
-                    check_y = lazor.position[1] // 2
-                    if self.grid[check_y][check_x] not in ['o', 'x']:
-                        self.interact_with_block(lazor, check_x, check_y)
-                        
-                elif lazor.position[1] % 2 == 0:  # Check y direction
-                    check_x = lazor.position[0] // 2
-                    check_y = (lazor.position[1] + lazor.direction[1]) // 2
-                    if self.grid[check_y][check_x] not in ['o', 'x']:
-                        self.interact_with_block(lazor, check_x, check_y)
-                        
-                new_x = lazor.position[0] + lazor.direction[0]
-                new_y = lazor.position[1] + lazor.direction[1]
-                # 2 Check if the lazor hits a boundary
-                if new_x <= 0 or new_x >= len(self.grid[0]) * 2 or new_y <= 0 or new_y >= len(self.grid) * 2:
+                position = lazor.position
+                (x, y), (vx, vy) = position, lazor.direction
+                if x % 2 == 0:  # Check x direction
+                    check_x = (x + vx) // 2
+                    check_y = y // 2
+                    block = grid[check_y][check_x]
+                elif y % 2 == 0:  # Check y direction
+                    check_x = x // 2
+                    check_y = (y + vy) // 2
+                    block = grid[check_y][check_x]
+                else:
+                    block = None
+
+                if block in BLOCK_TYPES:
+                    # Same rules as interact_with_block
+                    reflected = (-vx, vy) if x % 2 == 0 else (vx, -vy)
+                    if block == 'A':
+                        lazor.direction = (vx, vy) = reflected
+                    elif block == 'B':
+                        lazor.direction = (0, 0)
+                        lazor.end = True
+                        vx = vy = 0
+                    elif (position, reflected) not in created:
+                        created.add((position, reflected))
+                        spawned = Lazor(position=position, direction=reflected)
+                        lazors.append(spawned)
+                        active.append(spawned)
+
+                # 2 Draw the segment, unless some lazor was already in this state
+                new_x = x + vx
+                new_y = y + vy
+                segment = (position, (new_x, new_y))
+                drawn = segment in visited
+                if not drawn:
+                    visited.add(segment)
+                    path.append(segment)
+
+                # 3 Check if the lazor hits a boundary or joins a drawn segment
+                if new_x <= 0 or new_x >= max_x or new_y <= 0 or new_y >= max_y:
                     lazor.end = True
-                    path_segment = (lazor.position, (new_x, new_y))
                     lazor.position = (new_x, new_y)
-                    if path_segment not in self.path:
-                        self.path.append(path_segment)
-                    #print("continue 2")
                     continue
-                
-                # 3 Update path
-                path_segment = (lazor.position, (new_x, new_y))
-                if path_segment not in self.path:
-                    self.path.append(path_segment)
-                else:
+                if drawn:
                     lazor.end = True
-                    #print("continue 3")
                     continue
-                
+
                 # 4 Update lazor position
-                if self.grid[check_y][check_x] not in ['B']:
+                if grid[check_y][check_x] != 'B':
                     lazor.position = (new_x, new_y)
-                #print(lazor.position)
-    
+                if not lazor.end:
+                    still_going.append(lazor)
+            active = still_going
+
+    def _propagate_bitboard(self) -> None:
+        if self.engine != 'bitboard':
+            raise ValueError(f"Unknown propagation engine {self.engine!r}, expected one of {PROPAGATION_ENGINES}")
+        import bitboard
+        self.bitboard = bitboard.propagate(self)
+
+    def propagate_incremental(self) -> None:
+        """
+        Propagate all lazors like propagate, but keep the traced beam states.
+        After the first call, add_block and remove_block only re-trace the beams
+        passing through the changed cell, and the next call just reads the result.
+        The path holds the same segments as propagate, not necessarily in the same order.
+        """
+        if self.beams is None:
+            self.beams = BeamGraph(self.grid, [(lazor.position, lazor.direction) for lazor in self.lazor_objects])
+        self.path = self.beams.path()
+        self.visited = set(self.path)
+
     def add_block(self, block_type: str, position: Tuple[int, int]) -> bool:
         """
         Add a new block to the board.
@@ -284,9 +869,48 @@ class LazorGame:
 
         # Update grid
         self.grid[y][x] = block_type
+        self.block_bits[block_type] |= 1 << (y * len(self.grid[0]) + x)
+        if self.beams is not None:
+            self.beams.update_cell(x, y)
         #print(f"Block {block_type} added at position ({x}, {y})")
         return True
 
+    def placed_blocks(self) -> list:
+        """
+        Blocks added with add_block, i.e. all blocks except the fixed ones of the board.
+        
+        Returns:
+            list: ((x, y), block_type) pairs
+        """
+        return [(block.position, block.block_type) for block in self.block_objects
+                if self.template.grid[block.position[1]][block.position[0]] == 'o']
+
+    def remove_block(self, position: Tuple[int, int]) -> bool:
+        """
+        Remove a block placed with add_block. Fixed blocks of the board stay.
+        
+        Args:
+            position (Tuple[int, int]): The (x, y) position of the block.
+        
+        Returns:
+            bool: True if the block was removed, False otherwise.
+        """
+        x, y = position
+        if x < 0 or y < 0 or y >= len(self.grid) or x >= len(self.grid[0]):
+            print(f"Position out of bounds: ({x}, {y})")
+            return False
+        
+        if self.template.grid[y][x] != 'o' or self.grid[y][x] not in BLOCK_TYPES:
+            print(f"No removable block at position: ({x}, {y})")
+            return False
+        
+        self.block_objects = [block for block in self.block_objects if block.position != (x, y)]
+        self.block_bits[self.grid[y][x]] &= ~(1 << (y * len(self.grid[0]) + x))
+        self.grid[y][x] = 'o'
+        if self.beams is not None:
+            self.beams.update_cell(x, y)
+        return True
+
     def interact_with_block(self, lazor: Lazor, x: int, y: int) -> None:
         """
         Handle the interaction of a lazor with a block.
@@ -295,37 +919,30 @@ class LazorGame:
             lazor (Lazor): The lazor interacting with the block.
             x (int): The x-coordinate of the block.
             y (int): The y-coordinate of the block.
+        The block type is read straight from the grid, the grid is kept in sync
+        with block_objects by add_block.
         """
-        #print("Interact")
-        for block in self.block_objects:
-            #print(block)
-            if block.position == (x, y):
-                #print(block)
-                if block.block_type == 'A':
-                    #print("Reflect!")
-                    # Reflect lazor
-                    if lazor.position[0] % 2 == 0:  # Hitting in x direction
-                        lazor.direction = (-lazor.direction[0], lazor.direction[1])
-                    elif lazor.position[1] % 2 == 0:  # Hitting in y direction
-                        lazor.direction = (lazor.direction[0], -lazor.direction[1])
-                elif block.block_type == 'B':
-                    #print("Opague!")
-                    # Opaque block, lazor ends
-                    lazor.direction = (0,0)
-                    lazor.end = True
-                    
-                elif block.block_type == 'C':
-                    #print("Refract!")
-                    # Refract block, lazor continues and a new lazor is created
-                    if lazor.position[0] % 2 == 0:  # Hitting in x direction
-                        new_direction = (-lazor.direction[0], lazor.direction[1])
-                    elif lazor.position[1] % 2 == 0:  # Hitting in y direction
-                        new_direction = (lazor.direction[0], -lazor.direction[1])
-                    new_lazor = Lazor(position=lazor.position, direction=new_direction)
-                    if ([ lazor.position, new_direction] not in self.created_lazors):
-                        self.created_lazors.append([lazor.position, new_direction])
-                        self.lazors.append(new_lazor)
-                    #print(self.lazors)
+        block_type = self.grid[y][x]
+        if block_type == 'A':
+            # Reflect lazor
+            if lazor.position[0] % 2 == 0:  # Hitting in x direction
+                lazor.direction = (-lazor.direction[0], lazor.direction[1])
+            elif lazor.position[1] % 2 == 0:  # Hitting in y direction
+                lazor.direction = (lazor.direction[0], -lazor.direction[1])
+        elif block_type == 'B':
+            # Opaque block, lazor ends
+            lazor.direction = (0,0)
+            lazor.end = True
+            
+        elif block_type == 'C':
+            # Refract block, lazor continues and a new lazor is created
+            if lazor.position[0] % 2 == 0:  # Hitting in x direction
+                new_direction = (-lazor.direction[0], lazor.direction[1])
+            elif lazor.position[1] % 2 == 0:  # Hitting in y direction
+                new_direction = (lazor.direction[0], -lazor.direction[1])
+            if (lazor.position, new_direction) not in self.created_lazors:
+                self.created_lazors.add((lazor.position, new_direction))
+                self.lazors.append(Lazor(position=lazor.position, direction=new_direction))
                     
     def validate(self) -> bool:
         """
@@ -334,8 +951,21 @@ class LazorGame:
         Returns:
             True if all target points are covered
         """
-        for point in self.points:
-            if not any(point in segment for segment in self.path):
-                return False
-        return True
+        if self.bitboard is not None:
+            propagator, _, points = self.bitboard
+            return propagator.covers(points, self.points)
+        covered = self.covered_points()
+        return all(point in covered for point in self.points)
 
+    def covered_points(self) -> set:
+        """
+        All points on the lazor paths, i.e. the ends of every path segment.
+        """
+        if self.bitboard is not None:
+            propagator, _, points = self.bitboard
+            return propagator.covered_points(points)
+        covered = set()
+        for start, end in self.path:
+            covered.add(start)
+            covered.add(end)
+        return covered
@@ -2,6 +2,42 @@ from classes import *
 import os
 import math
 import itertools
+import functools
+import inspect
+import multiprocessing
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from vectorized import BatchPropagator
+
+try:
+    import pysat  # python-sat, only needed by solve_board_sat
+    HAVE_SAT = True
+except ImportError:
+    HAVE_SAT = False
+
+def instrumented(solver):
+    """
+    Decorator for the solvers: makes sure the solver gets a SolverStats
+    (a new one if the caller passes none), times the whole run, records the
+    outcome and leaves the stats on game.stats. The arguments are bound to
+    the signature of the solver, so stats may be passed by position as well.
+    """
+    signature = inspect.signature(solver)
+
+    @functools.wraps(solver)
+    def run(*args, **kwargs) -> bool:
+        bound = signature.bind(*args, **kwargs)
+        stats = bound.arguments.get('stats')
+        if stats is None:
+            stats = bound.arguments['stats'] = SolverStats()
+        stats.solver = solver.__name__
+        start_time = time.perf_counter()
+        stats.solved = solver(*bound.args, **bound.kwargs)
+        stats.total_time += time.perf_counter() - start_time
+        bound.arguments['game'].stats = stats
+        return stats.solved
+    return run
 
 def read_and_visualize_board(filename: str) -> LazorGame:
     """
@@ -19,13 +55,70 @@ def read_and_visualize_board(filename: str) -> LazorGame:
     board.visualize()
     return board
 
-def solve_board(game: LazorGame) -> bool:
+def count_placements(num_positions: int, block_counts) -> int:
+    """
+    Count the distinct ways to put blocks on free positions. Blocks of the same
+    type are interchangeable, so A A B on three cells is 3 placements, not 3!.
+    
+    Args:
+        num_positions : Number of free positions
+        block_counts : (block_type, count) pairs
+        
+    Returns:
+        int: The number of distinct placements
+    """
+    total = 1
+    for _, count in block_counts:
+        total *= math.comb(num_positions, count)
+        num_positions -= count
+    return total
+
+def iter_placements(positions, block_counts, start: int = 0):
+    """
+    Yield every distinct placement of the blocks exactly once.
+    The cells of the first block type are picked as a combination of the
+    positions, the cells of the next type as a combination of what is left, etc.
+    
+    Args:
+        positions : Free (x, y) positions, in the order to enumerate them
+        block_counts : (block_type, count) pairs
+        start : Number of placements to skip, whole branches of the
+            enumeration are skipped by counting them
+        
+    Yields:
+        tuple: ((x, y), block_type) pairs of one placement
+    """
+    block_counts = [(block_type, count) for block_type, count in block_counts if count > 0]
+    skip = start
+
+    def place(remaining, index, placement):
+        nonlocal skip
+        if index == len(block_counts):
+            if skip:
+                skip -= 1
+                return
+            yield placement
+            return
+        block_type, count = block_counts[index]
+        below = count_placements(max(len(remaining) - count, 0), block_counts[index + 1:])
+        for chosen in itertools.combinations(remaining, count):
+            if skip >= below:
+                skip -= below
+                continue
+            rest = [pos for pos in remaining if pos not in chosen]
+            yield from place(rest, index + 1, placement + tuple((pos, block_type) for pos in chosen))
+
+    yield from place(list(positions), 0, ())
+
+@instrumented
+def solve_board(game: LazorGame, stats: SolverStats = None) -> bool:
     """
     Solve the Lazor game by trying different block configurations.
-    Shows progress with a progress bar.
+    Every distinct placement is tried once, so this is the exhaustive reference.
     
     Args:
         game (LazorGame): The game to solve
+        stats (SolverStats): Optional, filled in with the counters and timings
         
     Returns:
         bool: True if a solution was found, False otherwise
@@ -44,53 +137,179 @@ def solve_board(game: LazorGame) -> bool:
 
     # If no blocks needed, check if current configuration works
     if not blocks_needed:
-        game.propagate()
-        return game.validate()
+        stats.propagate(game)
+        return stats.validate(game)
     
     # 3 Get all possible combinations of positions for the blocks
     num_positions_needed = len(blocks_needed)
     if num_positions_needed > len(available_positions):
         return False
-    # 4 Calculate total number of combinations to try
-    n_c = math.comb(len(available_positions), num_positions_needed)
-    n_p = math.factorial(num_positions_needed)
-    total_it = n_c * n_p
+    # 4 Calculate total number of distinct placements to try
+    total_it = count_placements(len(available_positions), game.blocks.items())
     
     print(f"In total {total_it:,} possibilities")
     
-    # 5 Try each permutation of block types in these positions
-    for positions in itertools.combinations(available_positions, num_positions_needed):
-        for block_arrangement in itertools.permutations(blocks_needed):
-
-            # 6 Create a copy of the game to test this configuration
-            test_game = LazorGame(game.filename)
-
-            # 7 Place blocks according to this arrangement
-            valid = True
-            for (x, y), block_type in zip(positions, block_arrangement):
-                if not test_game.add_block(block_type, (x, y)):
-                    valid = False
-                    break
-    # 8 check if this is a solution
-            test_game.propagate()
-            if test_game.validate():
-    # 9 If solution found, apply it to the original game
-                for (x, y), block_type in zip(positions, block_arrangement):
-                    game.add_block(block_type, (x, y))
-                return True
+    # 5 Try each placement once, blocks of the same type are interchangeable
+    template = game.template
+    for placement in iter_placements(available_positions, game.blocks.items()):
+
+        # 6 Create a copy of the game with the blocks of this placement
+        stats.node()
+        test_game = stats.new_game(template, placement)
+
+    # 7 check if this is a solution
+        stats.propagate(test_game)
+        if stats.validate(test_game):
+    # 8 If solution found, apply it to the original game
+            for (x, y), block_type in placement:
+                game.add_block(block_type, (x, y))
+            return True
     return False
 
 
-def solve_board_optimized(game: LazorGame) -> bool:
+def solve_from_cache(game: LazorGame, cache, stats: SolverStats = None) -> bool:
+    """
+    Apply the cached solution of the board to the game, if the cache has one.
+    
+    Args:
+        game (LazorGame): The game to solve
+        cache (SolutionCache): The cache to look in, or None
+        stats (SolverStats): Optional, counts the cache hit
+        
+    Returns:
+        bool: True if a verified solution was found in the cache and applied
+    """
+    if cache is None:
+        return False
+    placement = cache.get(game.template)
+    if placement is None:
+        return False
+    if stats is not None:
+        stats.cache_hits += 1
+    for pos, block_type in placement:
+        game.add_block(block_type, pos)
+    return True
+
+
+def iter_solutions(board, limit: int = None, should_stop=None, batch_size: int = 4096, state: dict = None,
+                   stats: SolverStats = None):
+    """
+    Yield every solution of the board, in the order solve_board tries the
+    placements. The placements are enumerated lazily and scored in batches
+    with the NumPy engine, so memory use only depends on batch_size and not
+    on how many solutions the board has. The board is never modified.
+    The position in the enumeration is kept in state['index'] (the number of
+    placements already tried), passing the same state again continues
+    right after the last solution yielded or batch scored.
+    
+    Args:
+        board: A LazorGame or BoardTemplate
+        limit (int): Stop after this many solutions, None for all of them
+        should_stop: Optional callable checked before every batch, the
+            enumeration ends once it returns True
+        batch_size (int): Number of placements scored per NumPy call
+        state (dict): Optional, 'index' is where the enumeration starts and
+            is updated as it goes
+        stats (SolverStats): Optional, filled in with the counters and timings.
+            The NumPy engine checks the targets as part of propagating, so
+            that time counts as propagation.
+        
+    Yields:
+        tuple: ((x, y), block_type) pairs of one solution
+    """
+    template = board.template if isinstance(board, LazorGame) else board
+    available_positions = template.available_positions()
+    if len(template.blocks_needed()) > len(available_positions) or limit == 0:
+        return
+
+    if state is None:
+        state = {}
+    if stats is None:
+        stats = SolverStats()
+    start = state.setdefault('index', 0)
+    start_time = time.perf_counter()
+    propagator = BatchPropagator(template)
+    stats.construction_time += time.perf_counter() - start_time
+    placements = iter_placements(available_positions, template.blocks, start)
+    found = 0
+    while should_stop is None or not should_stop():
+        batch = list(itertools.islice(placements, batch_size))
+        if not batch:
+            return
+        stats.node(len(batch))
+        start_time = time.perf_counter()
+        grids = propagator.grids_for(batch)
+        built_time = time.perf_counter()
+        solved = propagator.validate(grids)
+        stats.construction_time += built_time - start_time
+        stats.propagation_time += time.perf_counter() - built_time
+        stats.propagations += len(batch)
+        stats.propagation_steps += propagator.steps
+        for index in np.flatnonzero(solved):
+            state['index'] = start + int(index) + 1
+            yield batch[index]
+            found += 1
+            if found == limit:
+                return
+        start += len(batch)
+        state['index'] = start
+
+
+@instrumented
+def solve_board_vectorized(game: LazorGame, batch_size: int = 4096, stats: SolverStats = None) -> bool:
+    """
+    Solve the Lazor game by brute force, scoring the placements in batches
+    with the NumPy engine instead of one LazorGame at a time.
+    Placements are tried in the same order as solve_board.
+    
+    Args:
+        game (LazorGame): The game to solve
+        batch_size (int): Number of placements scored per NumPy call
+        stats (SolverStats): Optional, filled in with the counters and timings
+        
+    Returns:
+        bool: True if a solution was found, False otherwise
+    """
+    template = game.template
+    if not template.blocks_needed():
+        # If no blocks needed, check if current configuration works
+        stats.propagate(game)
+        return stats.validate(game)
+
+    solution = next(iter_solutions(template, batch_size=batch_size, stats=stats), None)
+    if solution is None:
+        return False
+
+    # Apply the first solution to the original game
+    for pos, block_type in solution:
+        game.add_block(block_type, pos)
+    return True
+
+
+@instrumented
+def solve_board_optimized(game: LazorGame, cache=None, memo: PropagationMemo = None,
+                          stats: SolverStats = None) -> bool:
     """
     Solve the Lazor game recursively.
+    The search reaches the same placements in many orders, so the beam of each
+    placement is memoized and computed once.
 
     Args:
         LazorGame: The game to solve
+        cache (SolutionCache): Optional solution cache, checked first and updated
+            with the solution found
+        memo (PropagationMemo): Memo of beams by placement, a new one with the
+            default memory cap if None. Pass one in to read its hit/miss counters.
+        stats (SolverStats): Optional, filled in with the counters and timings.
+            Memo hits count as cache hits, and the target check of a new
+            beam is part of its propagation.
         
     Returns:
         bool: True if a solution was found, False otherwise
     """
+    if solve_from_cache(game, cache, stats):
+        return True
+
     # Get all possible positions for blocks
     available_positions = []
     for y in range(len(game.grid)):
@@ -105,44 +324,67 @@ def solve_board_optimized(game: LazorGame) -> bool:
     
     if not blocks_needed:
         # If no blocks needed, check if current configuration works
-        game.propagate()
-        return game.validate()
+        stats.propagate(game)
+        return stats.validate(game)
     
     # Get all possible combinations of positions for the blocks
     num_positions_needed = len(blocks_needed)
     if num_positions_needed > len(available_positions):
         return False
     
-    def check_block_effect(test_game: LazorGame, pos: tuple, block_type: str, 
-                          current_blocks: list) -> bool:
+    # Parsed once, every candidate state below is built from it
+    template = game.template
+    if memo is None:
+        memo = PropagationMemo(available_positions, [block_type for block_type, _ in game.blocks.items()])
+    memo_hits = memo.hits
+
+    def beam_of(placement) -> BeamResult:
+        """
+        Beam of a placement, from the memo or traced on a fresh board.
+        """
+        key = memo.key(placement)
+        result = memo.get(key)
+        if result is None:
+            test_game = stats.new_game(template, placement)
+            stats.propagate_incremental(test_game)
+            result = memo.put(key, test_game)
+        return result
+
+    def check_block_effect(node_game: list, placed_blocks: list, original: BeamResult,
+                           pos: tuple, block_type: str) -> bool:
         """
         Check if placing a block actually changes the laser path.
+        The new beam comes from the memo. On a miss the block is placed on the
+        board of the current node and taken back again, with incremental
+        propagation only the beams through pos are traced again.
         
         Args:
-            test_game: Current game state
+            node_game: Board of the current node, empty until a miss needs it
+            placed_blocks: Blocks placed at the current node
+            original: Beam of the current node
             pos: Position to place block
             block_type: Type of block to place
-            current_blocks: List of currently placed blocks
         
         Returns:
-            True if block placement changes path, False otherwise
+            True if block placement changes path or solves the board, False otherwise
         """
-        # First propagate with current blocks
-        for placed_pos, placed_type in current_blocks:
-            test_game.add_block(placed_type, placed_pos)
-        test_game.propagate()
-        original_path = test_game.path.copy()
-        
-        # Reset and add new block
-        test_game.reset()
-        for placed_pos, placed_type in current_blocks:
-            test_game.add_block(placed_type, placed_pos)
-        test_game.add_block(block_type, pos)
-        test_game.propagate()
-        new_path = test_game.path
+        key = memo.key(placed_blocks + [(pos, block_type)])
+        new = memo.get(key)
+        if new is None:
+            if not node_game:
+                node_game.append(stats.new_game(template, placed_blocks))
+                stats.propagate_incremental(node_game[0])
+            test_game = node_game[0]
+            stats.propagate_incremental(test_game, test_game.add_block, block_type, pos)
+            new = memo.put(key, test_game)
+            
+            # Take the block back for the next candidate
+            start_time = time.perf_counter()
+            test_game.remove_block(pos)
+            stats.propagation_time += time.perf_counter() - start_time
         
         # Check if path changed
-        return original_path != new_path
+        return new.segments != original.segments or new.solved
     
     def solve_recursive(positions_left, blocks_left, placed_blocks=None):
         """
@@ -158,14 +400,11 @@ def solve_board_optimized(game: LazorGame) -> bool:
         """
         if placed_blocks is None:
             placed_blocks = []
+        stats.node()
             
         # Base case: if we've placed all blocks, check if it's a solution
         if not blocks_left:
-            test_game = LazorGame(game.filename)
-            for pos, block_type in placed_blocks:
-                test_game.add_block(block_type, pos)
-            test_game.propagate()
-            if test_game.validate():
+            if beam_of(placed_blocks).solved:
                 # Apply solution to original game
                 for pos, block_type in placed_blocks:
                     game.add_block(block_type, pos)
@@ -173,15 +412,15 @@ def solve_board_optimized(game: LazorGame) -> bool:
             return False
         
         # Try each position for the next block
-        
+        # The beam of the blocks placed so far is usually memoized by the parent
+        original = beam_of(placed_blocks)
+        node_game = []
         for i, pos in enumerate(positions_left):
-            for block_type in set(blocks_left):  # Only try each block type once per position          
+            for block_type in dict.fromkeys(blocks_left):  # Each block type once per position, in file order
                 # Check if this block placement actually affects the path
-                test_game = LazorGame(game.filename)
-                if not check_block_effect(test_game, pos, block_type, placed_blocks):
-                    if not test_game.validate():
-                        # Skip this placement if it doesn't change the path and it is not the solution
-                        continue
+                if not check_block_effect(node_game, placed_blocks, original, pos, block_type):
+                    # Skip this placement if it doesn't change the path and it is not the solution
+                    continue
 
                 # Remove the block type we're using
                 new_blocks = list(blocks_left)
@@ -198,9 +437,486 @@ def solve_board_optimized(game: LazorGame) -> bool:
     
 
     result = solve_recursive(available_positions, blocks_needed)
+    stats.cache_hits += memo.hits - memo_hits
+    if result and cache is not None:
+        cache.put(template, game.placed_blocks())
  
     return result
 
 
+def order_beam(test_game: LazorGame, blocks_left):
+    """
+    Cells the lazors reach first go first: a block upstream changes
+    everything downstream of it.
+    """
+    beams = test_game.beams
+    steps = {}
+    frontier = list(beams.sources)
+    seen = set(frontier)
+    distance = 0
+    while frontier:
+        next_frontier = []
+        for state in frontier:
+            cell, _, successors = beams.edges[state]
+            if cell >= 0:
+                steps.setdefault(cell, distance)
+            for next_state in successors:
+                if next_state not in seen:
+                    seen.add(next_state)
+                    next_frontier.append(next_state)
+        frontier = next_frontier
+        distance += 1
+    return lambda pos, block_type: steps.get(pos[1] * beams.width + pos[0], distance)
+
+
+def order_target_distance(test_game: LazorGame, blocks_left):
+    """
+    Cells closest to a target the lazors miss go first. Lazors move
+    diagonally, so the distance is counted in diagonal half steps.
+    """
+    covered = test_game.covered_points()
+    missed = [point for point in test_game.points if point not in covered]
+    if not missed:
+        return lambda pos, block_type: 0
+    return lambda pos, block_type: min(max(abs(2 * pos[0] + 1 - x), abs(2 * pos[1] + 1 - y))
+                                       for x, y in missed)
+
+
+# Refract blocks add a lazor and opaque blocks end one, both change more of the
+# path than a reflect block
+BLOCK_IMPACT = {'C': 0, 'B': 1, 'A': 2}
+
+def order_scarce_first(test_game: LazorGame, blocks_left):
+    """
+    Block types with the fewest blocks left go first, then the types that
+    change the path the most.
+    """
+    return lambda pos, block_type: (blocks_left.count(block_type), BLOCK_IMPACT[block_type])
+
+
+# Candidate orderings of the guided search: name -> function of the game and
+# the blocks left giving the sort key of a (position, block type) candidate.
+# Ties keep the row-major order, so every ordering is deterministic.
+ORDERINGS = {
+    'row-major': None,
+    'beam': order_beam,
+    'target-distance': order_target_distance,
+    'scarce-first': order_scarce_first,
+}
+
+
+def guided_candidates(test_game: LazorGame, available_positions, placed: dict, blocks_left,
+                      ordering: str = 'row-major') -> list:
+    """
+    Next block placements of the beam-guided search, in search order: every
+    free position some lazor state checks, with every block type still left.
+
+    Args:
+        test_game: Game holding the placed blocks, propagated with propagate_incremental
+        available_positions: Free positions of the board, in row-major order
+        placed: Blocks placed so far, position -> block type
+        blocks_left: Blocks still to be placed
+        ordering: Name of the candidate order in ORDERINGS
+
+    Returns:
+        list: (position, block_type) pairs
+    """
+    checked = test_game.beams.checked_cells()
+    candidates = [(pos, block_type)
+                  for pos in available_positions if pos not in placed and pos in checked
+                  for block_type in sorted(set(blocks_left))]
+    if ORDERINGS[ordering] is not None:
+        key = ORDERINGS[ordering](test_game, blocks_left)
+        candidates.sort(key=lambda candidate: key(*candidate))
+    return candidates
+
+
+def park_blocks(test_game: LazorGame, available_positions, placed: dict, blocks_left, covered: set = None):
+    """
+    If every target is hit, put the remaining blocks on cells no beam checks,
+    where they cannot change the path.
+
+    Args:
+        covered : test_game.covered_points(), if the caller has it already
+    
+    Returns:
+        dict: The complete placement, or None if the board is not solved this way
+    """
+    if covered is None:
+        covered = test_game.covered_points()
+    if not all(point in covered for point in test_game.points):
+        return None
+    checked = test_game.beams.checked_cells()
+    unused = [pos for pos in available_positions if pos not in placed and pos not in checked]
+    if len(unused) < len(blocks_left):
+        return None
+    solution = dict(placed)
+    for pos, block_type in zip(unused, blocks_left):
+        solution[pos] = block_type
+    return solution
+
+
+def guided_search(template: BoardTemplate, prefix=(), expand: bool = True, should_stop=None,
+                  prune: bool = True, stats: SolverStats = None, state: dict = None,
+                  ordering: str = 'row-major'):
+    """
+    Beam-guided depth first search below a partial placement.
+    A block that no beam reaches cannot change the path, and any solution can be
+    built by repeatedly placing one of its blocks in a cell the beam of the blocks
+    before it checks, so each step only branches on guided_candidates.
+    Placements reached in a different order are searched once, and with prune
+    a placement is dropped as soon as TargetIndex shows that the blocks left can
+    no longer bring a lazor onto every target.
+
+    The search keeps its progress in state: 'path' holds the index of the
+    candidate being searched at every level above the current node,
+    'explored' the placements already searched (a dict used as a set, in the
+    order they were reached, so a checkpoint only appends the new ones),
+    'ordering' the candidate order and 'done' tells if the search ended.
+    A search that was stopped can be continued by passing the same state
+    (e.g. saved with SearchCheckpoint) again, it then searches exactly the
+    placements left.
+    
+    Args:
+        template: The parsed board
+        prefix: ((x, y), block_type) pairs already placed
+        expand: If False, only check whether the prefix itself solves the board
+        should_stop: Optional callable, the search gives up once it returns True
+        prune: Cut placements that cannot be completed to a solution
+        stats: Optional SolverStats, filled in with the counters and timings. The
+            target checks and TargetIndex tests count as validation.
+        state: Optional dict with 'path' and 'explored', updated as the search goes
+        ordering: Name of the candidate order in ORDERINGS, a resumed search
+            must use the order it was started with
+        
+    Returns:
+        dict: Solution placement, position -> block type, or None
+    """
+    if ordering not in ORDERINGS:
+        raise ValueError(f"Unknown ordering {ordering!r}, expected one of {sorted(ORDERINGS)}")
+    available_positions = template.available_positions()
+    blocks_needed = template.blocks_needed()
+    placed = dict(prefix)
+    for block_type in placed.values():
+        blocks_needed.remove(block_type)
+
+    if stats is None:
+        stats = SolverStats()
+    # One board for the whole search, blocks are added and removed incrementally
+    test_game = stats.new_game(template, prefix)
+    stats.propagate_incremental(test_game)
+    # Placements already searched (reached in another order), as one int with
+    # a bit per (position, block type), kept in insertion order for SearchCheckpoint
+    block_types = [block_type for block_type, _ in template.blocks]
+    bits = {(pos, block_type): 1 << (i * len(block_types) + j)
+            for i, pos in enumerate(available_positions) for j, block_type in enumerate(block_types)}
+    if state is None:
+        state = {}
+    if state.setdefault('ordering', ordering) != ordering:
+        raise ValueError(f"The search was started with the {state['ordering']!r} ordering, not {ordering!r}")
+    path = state.setdefault('path', [])
+    explored = state.setdefault('explored', {})
+    resume_depth = len(path)
+    stopped = False
+    placement = sum(bits[item] for item in placed.items())
+    start_time = time.perf_counter()
+    index = TargetIndex(template) if prune else None
+    stats.construction_time += time.perf_counter() - start_time
+
+    def solve_recursive(blocks_left, placement, depth):
+        """
+        Recursive function 
+        
+        Args:
+            blocks_left : Blocks still to be placed
+            placement : Bits of the blocks placed so far
+            depth : Number of blocks placed by the search
+        
+        Returns:
+            dict: Solution placement or None
+        """
+        nonlocal stopped, resume_depth
+        if depth < resume_depth:
+            # Node on the path of a resumed search, it was already checked
+            # and its candidates before path[depth] are done
+            first = path[depth]
+        else:
+            resume_depth = 0
+            first = 0
+            start_time = time.perf_counter()
+            # The covered points are shared by the target check and TargetIndex
+            covered = test_game.covered_points()
+            solution = park_blocks(test_game, available_positions, placed, blocks_left, covered)
+            stats.validation_time += time.perf_counter() - start_time
+            if solution is not None or not expand:
+                return solution
+            if should_stop is not None and should_stop():
+                stopped = True
+                return None
+            stats.node()
+            start_time = time.perf_counter()
+            feasible = index is None or index.feasible(test_game, blocks_left, covered)
+            stats.validation_time += time.perf_counter() - start_time
+            if not feasible:
+                stats.pruned += 1
+                return None
+            path.append(0)
+
+        candidates = guided_candidates(test_game, available_positions, placed, blocks_left, ordering)
+        for i in range(first, len(candidates)):
+            pos, block_type = candidates[i]
+            new_placement = placement | bits[pos, block_type]
+            if depth < resume_depth and i == first:
+                pass  # the candidate the search stopped in
+            elif new_placement in explored:
+                continue
+            else:
+                explored[new_placement] = None
+            path[depth] = i
+
+            stats.propagate_incremental(test_game, test_game.add_block, block_type, pos)
+            placed[pos] = block_type
+
+            new_blocks = list(blocks_left)
+            new_blocks.remove(block_type)
+            solution = solve_recursive(new_blocks, new_placement, depth + 1)
+            if solution is not None or stopped:
+                return solution
+
+            del placed[pos]
+            stats.propagate_incremental(test_game, test_game.remove_block, pos)
+        path.pop()
+        return None
+
+    solution = solve_recursive(blocks_needed, placement, 0)
+    state['done'] = not stopped
+    if solution is not None:
+        # The search is over, nothing is left to resume
+        path.clear()
+    return solution
+
+
+@instrumented
+def solve_board_guided(game: LazorGame, should_stop=None, cache=None, stats: SolverStats = None,
+                       state: dict = None, ordering: str = 'row-major') -> bool:
+    """
+    Solve the Lazor game recursively, only branching on cells the current beams check.
+    See guided_search.
+
+    Args:
+        LazorGame: The game to solve
+        should_stop: Optional callable checked at every search node, the search
+            gives up once it returns True
+        cache (SolutionCache): Optional solution cache, checked first and updated
+            with the solution found
+        stats (SolverStats): Optional, filled in with the counters and timings
+        state (dict): Optional progress of the search, to continue a search that
+            was stopped (see guided_search)
+        ordering (str): Order the candidate placements are tried in, see ORDERINGS
+        
+    Returns:
+        bool: True if a solution was found, False otherwise
+    """
+    if solve_from_cache(game, cache, stats):
+        return True
+
+    template = game.template
+    if not template.blocks_needed():
+        # If no blocks needed, check if current configuration works
+        stats.propagate(game)
+        return stats.validate(game)
+
+    if len(template.blocks_needed()) > len(template.available_positions()):
+        return False
+
+    solution = guided_search(template, should_stop=should_stop, stats=stats, state=state, ordering=ordering)
+    if solution is None:
+        return False
+
+    # Apply solution to original game
+    for pos, block_type in solution.items():
+        game.add_block(block_type, pos)
+    if cache is not None:
+        cache.put(template, solution.items())
+    return True
+
+
+def split_guided_search(template: BoardTemplate, depth: int, ordering: str = 'row-major') -> list:
+    """
+    Cut the guided search into shards, in the order the serial search visits them.
+    A shard is a prefix of up to depth blocks. Prefixes shorter than depth only
+    have their own placement checked (the blocks below them are in later shards).
+    
+    Args:
+        template: The parsed board
+        depth: Number of blocks fixed by each full shard
+        ordering: Candidate order of the search, see ORDERINGS
+        
+    Returns:
+        list: (prefix, expand) pairs for guided_search
+    """
+    available_positions = template.available_positions()
+    shards = []
+    explored = set()
+
+    def split(prefix, blocks_left):
+        if len(prefix) == depth or not blocks_left:
+            shards.append((prefix, True))
+            return
+        shards.append((prefix, False))
+        test_game = template.new_game(prefix)
+        test_game.propagate_incremental()
+        for pos, block_type in guided_candidates(test_game, available_positions, dict(prefix), blocks_left, ordering):
+            placement = frozenset(prefix) | {(pos, block_type)}
+            if placement in explored:
+                continue
+            explored.add(placement)
+            new_blocks = list(blocks_left)
+            new_blocks.remove(block_type)
+            split(prefix + ((pos, block_type),), new_blocks)
+
+    split((), template.blocks_needed())
+    return shards
+
+
+_worker_template = None
+_worker_first_solved = None
+_worker_ordering = 'row-major'
+
+def _init_solver_worker(template: BoardTemplate, first_solved, ordering: str = 'row-major') -> None:
+    """
+    Keep the parsed board, the shared "lowest solved shard" value and the
+    candidate order in the worker.
+    """
+    global _worker_template, _worker_first_solved, _worker_ordering
+    _worker_template = template
+    _worker_first_solved = first_solved
+    _worker_ordering = ordering
+
+def _solve_shard(index: int, prefix, expand: bool):
+    """
+    Search one shard in a worker. Gives up as soon as an earlier shard is solved,
+    since the serial search would never get here.
+    """
+    def should_stop():
+        return _worker_first_solved.value < index
+
+    stats = SolverStats()
+    solution = guided_search(_worker_template, prefix, expand, should_stop, stats=stats,
+                             ordering=_worker_ordering)
+    if solution is not None:
+        with _worker_first_solved.get_lock():
+            _worker_first_solved.value = min(_worker_first_solved.value, index)
+    return index, solution, stats
+
+
+@instrumented
+def solve_board_parallel(game: LazorGame, workers: int = None, split_depth: int = 2,
+                         stats: SolverStats = None, ordering: str = 'row-major') -> bool:
+    """
+    Solve the Lazor game with the guided search spread over a pool of processes.
+    The search is cut into shards by the first split_depth block choices. The
+    solution of the first shard in serial order wins, so the result is the same
+    placement as solve_board_guided. Once a shard is solved, later shards stop.
+
+    Args:
+        game (LazorGame): The game to solve
+        workers (int): Number of worker processes, defaults to the number of cores
+        split_depth (int): Number of block choices that define a shard
+        stats (SolverStats): Optional, filled in with the counters and timings
+            of all shards added up, the progress hook is called as shards finish
+        ordering (str): Candidate order of the search, see ORDERINGS
         
-            
\ No newline at end of file
+    Returns:
+        bool: True if a solution was found, False otherwise
+    """
+    template = game.template
+    if not template.blocks_needed():
+        # If no blocks needed, check if current configuration works
+        stats.propagate(game)
+        return stats.validate(game)
+
+    if len(template.blocks_needed()) > len(template.available_positions()):
+        return False
+
+    shards = split_guided_search(template, split_depth, ordering)
+    first_solved = multiprocessing.Value('i', len(shards))
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_solver_worker,
+                             initargs=(template, first_solved, ordering)) as executor:
+        futures = [executor.submit(_solve_shard, index, prefix, expand)
+                   for index, (prefix, expand) in enumerate(shards)]
+        for future in as_completed(futures):
+            index, solution, shard_stats = future.result()
+            results[index] = solution
+            stats.merge(shard_stats)
+            stats.node(0)
+            # Done once every shard before the first solved one has finished
+            if first_solved.value < len(shards) and all(i in results for i in range(first_solved.value + 1)):
+                break
+        for future in futures:
+            future.cancel()
+
+    solution = results.get(first_solved.value)
+    if solution is None:
+        return False
+
+    # Apply solution to original game
+    for pos, block_type in solution.items():
+        game.add_block(block_type, pos)
+    return True
+
+
+@instrumented
+def solve_board_sat(game: LazorGame, should_stop=None, cache=None, stats: SolverStats = None) -> bool:
+    """
+    Solve the Lazor game as a SAT problem (see sat_solver.SatEncoding) instead
+    of searching over placements.
+
+    Args:
+        game (LazorGame): The game to solve
+        should_stop: Optional callable checked while the SAT solver runs, the
+            search gives up once it returns True
+        cache (SolutionCache): Optional solution cache, checked first and updated
+            with the solution found
+        stats (SolverStats): Optional, filled in with the counters and timings.
+            Nodes are the decisions of the SAT solver, pruned counts the models
+            that were ruled out after propagating them and building the
+            encoding counts as construction.
+
+    Returns:
+        bool: True if a solution was found, False otherwise
+    """
+    if solve_from_cache(game, cache, stats):
+        return True
+
+    template = game.template
+    if len(template.blocks_needed()) > len(template.available_positions()):
+        return False
+
+    if not HAVE_SAT:
+        raise ImportError("solve_board_sat needs python-sat, install it with: pip install python-sat")
+    # Imported here, python-sat is only needed by this solver
+    from sat_solver import SatEncoding
+    start_time = time.perf_counter()
+    encoding = SatEncoding(template)
+    stats.construction_time += time.perf_counter() - start_time
+    solution = encoding.solve(should_stop, stats)
+    if solution is None:
+        return False
+
+    # Apply solution to original game
+    for pos, block_type in solution:
+        game.add_block(block_type, pos)
+    if cache is not None:
+        cache.put(template, solution)
+    return True
+
+
+# Solvers that can be picked by name, all called as solver(game, should_stop, cache, stats=stats).
+# 'sat' is only there when python-sat is installed
+SOLVERS = {
+    'guided': solve_board_guided,
+}
+if HAVE_SAT:
+    SOLVERS['sat'] = solve_board_sat
@@ -0,0 +1,145 @@
+"""
+Seeded generator of solvable Lazor boards.
+
+    python generator.py generated --count 1000 --width 8 --height 8 --blocks A=4 B=2 C=3 --lazors 3 --targets 12 --seed 0
+
+The blocks are placed first on an open grid, the lazors are traced through
+them and the targets are picked from the resulting path, so every board is
+solvable by the placement it was made from (written as a comment at the top of
+the file). Board i of a run only depends on the seed and on i, so the same
+command writes the same files, and a board can be made again on its own.
+"""
+from classes import *
+import argparse
+import os
+import random
+import time
+
+
+def random_placement(template: BoardTemplate, rng: random.Random, full: bool = False) -> list:
+    """
+    Draw a random (possibly partial) placement of the board's block inventory.
+
+    Args:
+        template : The parsed board
+        rng : Random generator to draw from
+        full : Place the whole inventory
+
+    Returns:
+        list: ((x, y), block_type) pairs
+    """
+    positions = template.available_positions()
+    blocks = template.blocks_needed()
+    rng.shuffle(blocks)
+    count = min(len(blocks), len(positions))
+    if not full:
+        count = rng.randint(0, count)
+    return list(zip(rng.sample(positions, count), blocks[:count]))
+
+
+def random_board(width: int, height: int, inventory, num_lazors: int, num_points: int,
+                 rng: random.Random):
+    """
+    Make a solvable board: the inventory is placed at random on an open grid,
+    lazors start from random cell sides, and the targets are picked from the
+    resulting path.
+
+    Args:
+        width, height : Size of the grid in cells
+        inventory : (block_type, count) pairs
+        num_lazors : Number of lazors
+        num_points : Number of targets, fewer if the path is shorter
+        rng : Random generator to draw from
+
+    Returns:
+        tuple: The BoardTemplate, with the blocks as its inventory, and the
+        ((x, y), block_type) placement that solves it
+    """
+    if sum(count for _, count in inventory) > width * height:
+        raise ValueError(f"{width}x{height} grid has no room for the blocks {inventory}")
+    grid = [['o'] * width for _ in range(height)]
+    # Lazors start on a cell side inside the grid, a lazor on the outer edge
+    # could be split back off the board by a C block next to it
+    lazors = []
+    for _ in range(num_lazors):
+        if rng.random() < 0.5:
+            x, y = rng.randrange(2, 2 * width, 2), rng.randrange(1, 2 * height, 2)
+        else:
+            x, y = rng.randrange(1, 2 * width, 2), rng.randrange(2, 2 * height, 2)
+        lazors.append(((x, y), rng.choice(DIRECTIONS)))
+    template = BoardTemplate(grid, inventory, lazors, [])
+    placement = random_placement(template, rng, full=True)
+    test_game = template.new_game(placement)
+    test_game.propagate()
+    path_points = sorted(test_game.covered_points() - {position for position, _ in lazors})
+    points = rng.sample(path_points, min(num_points, len(path_points)))
+    return BoardTemplate(grid, inventory, lazors, points), placement
+
+
+def generate_boards(directory: str, count: int, width: int, height: int, inventory, num_lazors: int,
+                    num_points: int, seed: int = 0, prefix: str = 'board') -> list:
+    """
+    Write count solvable boards as <prefix>_<i>.bff files.
+
+    Args:
+        directory : Folder the files are written to, created if needed
+        count : Number of boards
+        width, height, inventory, num_lazors, num_points : See random_board
+        seed : Seed of the run, board i uses its own generator seeded with
+            the seed and i
+        prefix : Start of the file names
+
+    Returns:
+        list: Paths of the written files
+    """
+    os.makedirs(directory, exist_ok=True)
+    digits = len(str(count - 1))
+    paths = []
+    for index in range(count):
+        template, placement = random_board(width, height, inventory, num_lazors, num_points,
+                                           random.Random(f"{seed}-{index}"))
+        comments = [f"Generated board {index} of seed {seed}", "Solution:"]
+        comments.extend(f"  {block_type} {x} {y}" for (x, y), block_type in placement)
+        path = os.path.join(directory, f"{prefix}_{index:0{digits}d}.bff")
+        with open(path, 'w') as f:
+            f.write(template.to_bff(comments))
+        paths.append(path)
+    return paths
+
+
+def parse_inventory(specs) -> list:
+    """
+    Read block counts given as TYPE=COUNT, e.g. ['A=3', 'C=1'].
+    """
+    inventory = []
+    for spec in specs:
+        block_type, _, count = spec.partition('=')
+        if block_type not in ('A', 'B', 'C') or not count.isdigit():
+            raise argparse.ArgumentTypeError(f"Invalid block count {spec!r}, expected e.g. A=3")
+        inventory.append((block_type, int(count)))
+    return inventory
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write seeded, solvable random Lazor boards")
+    parser.add_argument('directory', help="Folder the .bff files are written to")
+    parser.add_argument('--count', type=int, default=100, help="Number of boards")
+    parser.add_argument('--width', type=int, default=6, help="Grid width in cells")
+    parser.add_argument('--height', type=int, default=6, help="Grid height in cells")
+    parser.add_argument('--blocks', nargs='+', default=['A=3', 'B=1', 'C=1'],
+                        help="Block inventory as TYPE=COUNT")
+    parser.add_argument('--lazors', type=int, default=2, help="Number of lazors")
+    parser.add_argument('--targets', type=int, default=6, help="Number of targets")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the run")
+    parser.add_argument('--prefix', default='board', help="Start of the file names")
+    args = parser.parse_args()
+
+    try:
+        inventory = parse_inventory(args.blocks)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    start_time = time.time()
+    paths = generate_boards(args.directory, args.count, args.width, args.height, inventory,
+                            args.lazors, args.targets, args.seed, args.prefix)
+    elapsed = time.time() - start_time
+    print(f"Wrote {len(paths)} boards to {args.directory} in {elapsed:.2f} s")
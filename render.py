@@ -0,0 +1,225 @@
+"""
+Drawing of boards and their lazor paths, kept out of the solver modules.
+
+Boards are drawn headless, straight into a NumPy image (saved as PNG without
+matplotlib), an SVG drawing or plain text. Only show() needs matplotlib, and
+imports it when it is called.
+
+    render_batch([("bff_files/mad_7.bff", placement), ...], "solutions", fmt='svg')
+"""
+from classes import *
+import numpy as np
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+# Colors of the cells, lazor paths and markers, as RGB
+CELL_COLORS = {'x': (128, 128, 128), 'o': (255, 255, 255), 'A': (0, 0, 255), 'B': (0, 0, 0), 'C': (255, 255, 0)}
+LINE_COLOR = (0, 0, 0)
+PATH_COLOR = (255, 0, 0)
+TARGET_COLOR = (200, 0, 0)
+SOURCE_COLOR = (0, 160, 0)
+FORMATS = ('png', 'svg', 'txt')
+
+
+def _hex(color) -> str:
+    return '#%02x%02x%02x' % color
+
+
+def render_image(game: LazorGame, cell: int = 40) -> np.ndarray:
+    """
+    Draw the board into an RGB image: the cells are filled with one array
+    operation, the path segments and markers are set through index arrays.
+
+    Args:
+        game : The game, propagated if its path should be drawn
+        cell : Size of a grid cell in pixels, an even number
+
+    Returns:
+        np.ndarray: (height, width, 3) uint8 image
+    """
+    rows, cols = len(game.grid), len(game.grid[0])
+    half = cell // 2
+    margin = cell // 4
+    image = np.full((rows * cell + 2 * margin + 1, cols * cell + 2 * margin + 1, 3), 255, dtype=np.uint8)
+
+    # Cells and grid lines
+    palette = np.array(list(CELL_COLORS.values()), dtype=np.uint8)
+    codes = np.array([[list(CELL_COLORS).index(value) for value in row] for row in game.grid])
+    board = image[margin:margin + rows * cell + 1, margin:margin + cols * cell + 1]
+    board[:-1, :-1] = palette[codes].repeat(cell, axis=0).repeat(cell, axis=1)
+    board[::cell, :] = LINE_COLOR
+    board[:, ::cell] = LINE_COLOR
+
+    # Path segments, every half step is a diagonal of half pixels, drawn 2 pixels wide
+    if game.path:
+        segments = np.array([(x1, y1, x2, y2) for (x1, y1), (x2, y2) in game.path])
+        steps = np.arange(half + 1)
+        xs = margin + segments[:, :1] * half + (segments[:, 2:3] - segments[:, :1]) * steps
+        ys = margin + segments[:, 1:2] * half + (segments[:, 3:4] - segments[:, 1:2]) * steps
+        for offset in (0, 1):
+            image[np.clip(ys, 0, image.shape[0] - 1), np.clip(xs + offset, 0, image.shape[1] - 1)] = PATH_COLOR
+
+    # Targets and lazor sources as small squares
+    size = max(cell // 8, 1)
+    around = np.arange(-size, size + 1)
+    for points, color in ((game.points, TARGET_COLOR), ([lazor.position for lazor in game.lazor_objects], SOURCE_COLOR)):
+        if points:
+            points = np.array(points) * half + margin
+            xs = points[:, 0, None, None] + around[None, None, :]
+            ys = points[:, 1, None, None] + around[None, :, None]
+            image[np.clip(ys, 0, image.shape[0] - 1), np.clip(xs, 0, image.shape[1] - 1)] = color
+    return image
+
+
+def write_png(image: np.ndarray, path: str) -> None:
+    """
+    Save an RGB uint8 image as a PNG file, with zlib only.
+    """
+    height, width, _ = image.shape
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width * 3)]).tobytes()
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw, 6)))
+        f.write(chunk(b'IEND', b''))
+
+
+def render_svg(game: LazorGame, cell: int = 40) -> str:
+    """
+    Draw the board as an SVG document: one path per cell color, one for the
+    grid lines and one for the whole lazor path.
+
+    Args:
+        game : The game, propagated if its path should be drawn
+        cell : Size of a grid cell in SVG units
+
+    Returns:
+        str: The SVG document
+    """
+    rows, cols = len(game.grid), len(game.grid[0])
+    half = cell / 2
+    margin = cell / 4
+    width, height = cols * cell + 2 * margin, rows * cell + 2 * margin
+    cells = {}
+    for y, row in enumerate(game.grid):
+        for x, value in enumerate(row):
+            cells.setdefault(value, []).append(f"M{margin + x * cell:g} {margin + y * cell:g}h{cell}v{cell}h-{cell}z")
+    grid = ([f"M{margin:g} {margin + y * cell:g}h{cols * cell}" for y in range(rows + 1)]
+            + [f"M{margin + x * cell:g} {margin:g}v{rows * cell}" for x in range(cols + 1)])
+    beam = [f"M{margin + x1 * half:g} {margin + y1 * half:g}L{margin + x2 * half:g} {margin + y2 * half:g}"
+            for (x1, y1), (x2, y2) in game.path]
+
+    lines = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:g}" height="{height:g}" '
+             f'viewBox="0 0 {width:g} {height:g}">']
+    if game.filename:
+        lines.append(f'<title>Lazor Board: {os.path.basename(game.filename)}</title>')
+    for value, shapes in cells.items():
+        lines.append(f'<path fill="{_hex(CELL_COLORS[value])}" d="{"".join(shapes)}"/>')
+    lines.append(f'<path stroke="{_hex(LINE_COLOR)}" fill="none" d="{"".join(grid)}"/>')
+    if beam:
+        lines.append(f'<path stroke="{_hex(PATH_COLOR)}" stroke-width="3" fill="none" d="{"".join(beam)}"/>')
+    for points, color in ((game.points, TARGET_COLOR), ([lazor.position for lazor in game.lazor_objects], SOURCE_COLOR)):
+        lines.extend(f'<circle cx="{margin + x * half:g}" cy="{margin + y * half:g}" r="{cell / 8:g}" fill="{_hex(color)}"/>'
+                     for x, y in points)
+    lines.append('</svg>')
+    return "\n".join(lines) + "\n"
+
+
+def render_text(game: LazorGame) -> str:
+    """
+    Draw the board as text on the half-step grid: cells show their letter,
+    '*' marks the points on the lazor path, 'L' the lazor sources, '@' the
+    targets that are hit and 'P' the ones that are missed.
+    """
+    rows, cols = len(game.grid), len(game.grid[0])
+    canvas = [[' '] * (2 * cols + 1) for _ in range(2 * rows + 1)]
+    for y, row in enumerate(game.grid):
+        for x, value in enumerate(row):
+            canvas[2 * y + 1][2 * x + 1] = value
+    covered = game.covered_points()
+    marks = [(point, '*') for point in covered]
+    marks += [(lazor.position, 'L') for lazor in game.lazor_objects]
+    marks += [(point, '@' if point in covered else 'P') for point in game.points]
+    for (x, y), mark in marks:
+        if 0 <= y < len(canvas) and 0 <= x < len(canvas[0]):
+            canvas[y][x] = mark
+    return "\n".join("".join(line).rstrip() for line in canvas) + "\n"
+
+
+def save_render(game: LazorGame, path: str, fmt: str = None) -> None:
+    """
+    Draw the board to a file.
+
+    Args:
+        game : The game, propagated if its path should be drawn
+        path : File to write
+        fmt : One of FORMATS, taken from the extension of path if None
+    """
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt == 'png':
+        write_png(render_image(game), path)
+    elif fmt in ('svg', 'txt'):
+        with open(path, 'w') as f:
+            f.write(render_svg(game) if fmt == 'svg' else render_text(game))
+    else:
+        raise ValueError(f"Unknown image format {fmt!r}, expected one of {FORMATS}")
+
+
+def show(game: LazorGame) -> None:
+    """
+    Show the board in a matplotlib window. matplotlib is only imported here.
+    """
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(10, 10))
+    ax.imshow(render_image(game))
+    ax.set_axis_off()
+    if game.filename:
+        ax.set_title(f'Lazor Board: {os.path.basename(game.filename)}')
+    plt.tight_layout()
+    plt.show()
+
+
+_templates = {}
+
+def _render_job(job) -> str:
+    """
+    Draw one solved board in a worker, the boards are read once per worker.
+    """
+    file_path, placement, path, fmt = job
+    if file_path not in _templates:
+        _templates[file_path] = BoardTemplate.from_file(file_path)
+    game = _templates[file_path].new_game(placement)
+    game.propagate()
+    save_render(game, path, fmt)
+    return path
+
+
+def render_batch(jobs, directory: str, fmt: str = 'png', workers: int = None) -> list:
+    """
+    Draw many solved boards on a process pool, as <file name>_solution.<fmt>
+    (the names LazorGame.visualize uses).
+
+    Args:
+        jobs : (.bff file, ((x, y), block_type) placement) pairs
+        directory : Folder the drawings are written to, created if needed
+        fmt : One of FORMATS
+        workers : Number of worker processes, defaults to the number of cores
+
+    Returns:
+        list: Paths of the written files, in the order of the jobs
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown image format {fmt!r}, expected one of {FORMATS}")
+    os.makedirs(directory, exist_ok=True)
+    tasks = [(file_path, tuple(placement), os.path.join(directory, f"{os.path.basename(file_path)}_solution.{fmt}"), fmt)
+             for file_path, placement in jobs]
+    if not tasks:
+        return []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_render_job, tasks, chunksize=max(len(tasks) // (4 * (workers or os.cpu_count() or 1)), 1)))
@@ -0,0 +1,164 @@
+"""
+SAT encoding of a Lazor board, solved with a local SAT solver (python-sat).
+
+The variables are the block type of every free cell and whether a lazor state
+(half-step position x direction, the same states as BeamGraph) is reached.
+A reached state must be a source or be led to by a reached state whose checked
+cell lets it through, targets must be hit by a reached state and every block
+type is used exactly as often as the inventory says. These clauses allow a
+loop of states to keep itself reached without any lazor entering it, so every
+model is checked with LazorGame.propagate and ruled out if it does not solve
+the board.
+"""
+from classes import *
+from vectorized import BatchPropagator
+from pysat.card import CardEnc, EncType
+from pysat.formula import IDPool
+from pysat.solvers import Solver
+
+
+class SatEncoding:
+    def __init__(self, template: BoardTemplate, solver_name: str = 'glucose4'):
+        """
+        Build the clauses of a board and load them into a solver.
+
+        Args:
+            template : The parsed board
+            solver_name : Name of the python-sat solver to use
+        """
+        self.template = template
+        tables = BatchPropagator(template)
+        self.pool = IDPool()
+        self.clauses = []
+        width = tables.width
+
+        # Block codes each cell can end up with
+        block_types = [block_type for block_type, count in template.blocks if count > 0]
+        codes = {}
+        for y, row in enumerate(template.grid):
+            for x, cell in enumerate(row):
+                if cell == 'o':
+                    codes[y * width + x] = [EMPTY] + [CELL_CODES[block_type] for block_type in block_types]
+                else:
+                    codes[y * width + x] = [CELL_CODES[cell]]
+        codes[tables.num_cells] = [EMPTY]  # states that check no cell
+
+        # Every free cell holds exactly one of: nothing, or one of the block types
+        self.free_cells = {y * width + x: (x, y) for x, y in template.available_positions()}
+        for cell in self.free_cells:
+            self.add_cardinality([self.cell_var(cell, code) for code in codes[cell]], 1)
+        for block_type, count in template.blocks:
+            if count > 0:
+                self.add_cardinality([self.cell_var(cell, CELL_CODES[block_type]) for cell in self.free_cells], count)
+
+        # States any placement could reach, with the (cell code, next state) moves out of them
+        moves = {}
+        stack = [int(source) for source in tables.sources]
+        while stack:
+            state = stack.pop()
+            if state in moves:
+                continue
+            cell = int(tables.cell[state])
+            moves[state] = []
+            for code in codes[cell]:
+                if code in (EMPTY, REFRACT):
+                    moves[state].append((code, int(tables.straight[state])))
+                if code == REFLECT:
+                    moves[state].append((code, int(tables.reflected[state])))
+                if code == REFRACT:
+                    moves[state].append((code, int(tables.child[state])))
+            for _, next_state in moves[state]:
+                if next_state != tables.num_states:
+                    stack.append(next_state)
+
+        # A reached state is a source or supported by a move into it
+        supports = {int(source): None for source in tables.sources}
+        for state, state_moves in moves.items():
+            for code, next_state in state_moves:
+                if supports.get(next_state, ()) is not None:
+                    supports.setdefault(next_state, []).append(self.move_literal(state, int(tables.cell[state]), code))
+        for state in moves:
+            if supports[state] is None:
+                self.clauses.append([self.state_var(state)])
+            else:
+                self.clauses.append([-self.state_var(state)] + supports[state])
+
+        # Every target is hit by a state on it or by a move leaving the board through it
+        for at, straight_exits, reflected_exits in tables.target_states:
+            hits = [self.state_var(int(state)) for state in at if int(state) in moves]
+            for exits, exit_codes in ((straight_exits, (EMPTY, REFRACT)), (reflected_exits, (REFLECT,))):
+                for state in exits:
+                    state = int(state)
+                    if state not in moves:
+                        continue
+                    cell = int(tables.cell[state])
+                    hits.extend(self.move_literal(state, cell, code) for code in exit_codes if code in codes[cell])
+            self.clauses.append(hits)
+
+        self.solver = Solver(name=solver_name, bootstrap_with=self.clauses)
+
+    def cell_var(self, cell: int, code: int) -> int:
+        return self.pool.id(('cell', cell, code))
+
+    def state_var(self, state: int) -> int:
+        return self.pool.id(('state', state))
+
+    def move_literal(self, state: int, cell: int, code: int) -> int:
+        """
+        Literal that is only true if the state is reached and its checked cell
+        holds the given code. Fixed cells need no extra variable.
+        """
+        if cell not in self.free_cells:
+            return self.state_var(state)
+        move = self.pool.id(('move', state, code))
+        self.clauses.append([-move, self.state_var(state)])
+        self.clauses.append([-move, self.cell_var(cell, code)])
+        return move
+
+    def add_cardinality(self, literals, count: int) -> None:
+        encoding = CardEnc.equals(lits=literals, bound=count, vpool=self.pool, encoding=EncType.seqcounter)
+        self.clauses.extend(encoding.clauses)
+
+    def solve(self, should_stop=None, stats: SolverStats = None, budget: int = 10000):
+        """
+        Look for a placement that solves the board. Models whose lazors do not
+        actually hit every target (a loop of states reached only from itself)
+        are ruled out one by one and the solver is asked again.
+
+        Args:
+            should_stop : Optional callable, checked every budget conflicts,
+                the search gives up once it returns True
+            stats : Optional SolverStats, nodes counts the decisions of the
+                solver and pruned the models ruled out
+            budget : Conflicts the solver runs between two should_stop checks
+
+        Returns:
+            list: ((x, y), block_type) pairs of the solution, or None
+        """
+        if stats is None:
+            stats = SolverStats()
+        block_types = {CELL_CODES[block_type]: block_type for block_type, count in self.template.blocks if count > 0}
+        decisions = self.solver.accum_stats().get('decisions', 0)
+        while True:
+            self.solver.conf_budget(budget)
+            status = self.solver.solve_limited()
+            new_decisions = self.solver.accum_stats().get('decisions', 0)
+            stats.node(new_decisions - decisions)
+            decisions = new_decisions
+            if status is None:
+                if should_stop is not None and should_stop():
+                    return None
+                continue
+            if not status:
+                return None
+
+            model = set(literal for literal in self.solver.get_model() if literal > 0)
+            chosen = [self.cell_var(cell, code) for cell in self.free_cells for code in block_types
+                      if self.cell_var(cell, code) in model]
+            placement = [(self.free_cells[cell], block_types[code]) for _, cell, code in map(self.pool.obj, chosen)]
+            test_game = stats.new_game(self.template, placement)
+            stats.propagate(test_game)
+            if stats.validate(test_game):
+                return placement
+            self.solver.add_clause([-literal for literal in chosen])
+            stats.pruned += 1
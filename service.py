@@ -0,0 +1,539 @@
+"""
+Long-lived local solve service, so other tools can hand boards to the solvers
+without starting Python and importing the solver modules for every board.
+
+    python service.py serve --socket /tmp/lazor.sock --workers 4 --queue-size 64
+    python service.py solve bff_files/mad_7.bff --socket /tmp/lazor.sock
+
+The service listens on a Unix socket (or on localhost with --port) and talks
+JSON, one object per line. A client sends requests:
+
+    {"op": "solve", "id": "job-1", "bff": "<.bff text>", "solver": "guided", "deadline": 30}
+    {"op": "cancel", "id": "job-1"}
+    {"op": "stats"}
+
+and gets events back as they happen, each naming its job. Job ids belong to
+the connection: two clients may use the same ids, and a client can only
+cancel its own jobs.
+
+    {"id": "job-1", "event": "queued", "position": 0}
+    {"id": "job-1", "event": "started", "worker": 4711}
+    {"id": "job-1", "event": "progress", "nodes": 5210, "propagations": 4800, "time": 1.0}
+    {"id": "job-1", "event": "solved", "placement": [[x, y, "A"], ...], "time": 1.4, "stats": {...}}
+
+A job ends with one of the events in FINAL_EVENTS. The deadline of a job (in
+seconds) counts from when it is queued. When queue_size jobs are waiting, new
+jobs are turned down with a 'rejected' event so clients can back off. Jobs run
+on a process pool whose workers are started (and import the solvers) when the
+service starts; each worker keeps the parsed boards and the solutions it
+found in memory, so a board sent again is answered from there. The jobs of a
+client that disconnects are cancelled.
+"""
+from classes import *
+from functions import SOLVERS
+from solution_cache import MemorySolutionCache, SolutionCache
+from bff_parser import parse_bff
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+FINAL_EVENTS = ('solved', 'no_solution', 'timeout', 'cancelled', 'error', 'rejected')
+
+
+# Worker side: set up once per worker process by _init_service_worker
+
+_cancelled = None  # shared flags, one per job slot
+_progress = None  # queue of (job key, event dict) to the service
+_boards = OrderedDict()  # .bff text -> BoardTemplate
+_solutions = None
+_progress_interval = 1.0
+MAX_BOARDS = 256
+
+
+def _init_service_worker(cancelled, progress, cache_path: str, max_solutions: int,
+                         progress_interval: float) -> None:
+    global _cancelled, _progress, _solutions, _progress_interval
+    _cancelled = cancelled
+    _progress = progress
+    _solutions = MemorySolutionCache(max_solutions, SolutionCache(cache_path) if cache_path else None)
+    _progress_interval = progress_interval
+
+
+def _warm_up() -> int:
+    """Nothing to do, submitted once per worker so the pool starts them all up front"""
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def _parse_board(text: str, name: str) -> BoardTemplate:
+    template = _boards.get(text)
+    if template is None:
+        template = _boards[text] = parse_bff(text, name)
+        while len(_boards) > MAX_BOARDS:
+            _boards.popitem(last=False)
+    else:
+        _boards.move_to_end(text)
+    return template
+
+
+def _solve_job(key: int, slot: int, text: str, name: str, solver: str, deadline: float) -> dict:
+    """
+    Solve one job in a worker process.
+
+    Args:
+        key : Key of the job in SolveService.jobs, for the progress events
+        slot : Index of the cancel flag of the job in the shared flags
+        text : Contents of the .bff file
+        name : Name of the board, for the error messages
+        solver : Name of the solver in functions.SOLVERS
+        deadline : time.time() at which the job is given up
+
+    Returns:
+        dict: The final event (without the job id): 'solved' with the
+        placement as [x, y, block_type] lists, or 'no_solution', 'timeout',
+        'cancelled' or 'error', with the time and the solver stats
+    """
+    start_time = time.perf_counter()
+    _progress.put((key, {'event': 'started', 'worker': os.getpid()}))
+
+    def report(stats):
+        _progress.put((key, {'event': 'progress', 'nodes': stats.nodes, 'propagations': stats.propagations,
+                                'time': time.perf_counter() - start_time}))
+
+    stop_reason = None
+
+    def should_stop():
+        nonlocal stop_reason
+        if _cancelled[slot]:
+            stop_reason = 'cancelled'
+        elif time.time() > deadline:
+            stop_reason = 'timeout'
+        return stop_reason is not None
+
+    stats = SolverStats(progress=report, progress_interval=_progress_interval)
+    try:
+        game = LazorGame(template=_parse_board(text, name))
+        solved = SOLVERS[solver](game, should_stop, _solutions, stats=stats)
+    except Exception as error:
+        return {'event': 'error', 'error': str(error), 'time': time.perf_counter() - start_time}
+
+    result = {'event': 'solved' if solved else stop_reason or 'no_solution',
+              'time': time.perf_counter() - start_time, 'stats': stats.as_dict()}
+    if solved:
+        result['placement'] = [[x, y, block_type] for (x, y), block_type in game.placed_blocks()]
+    return result
+
+
+# Service side
+
+class Job:
+    def __init__(self, key: int, job_id: str, client, slot: int, text: str, name: str, solver: str,
+                 deadline: float, send):
+        """
+        A board handed to the service, from queued to its final event.
+
+        Args:
+            key : Number of the job in the service, never used twice
+            job_id : Id given by the client, or made up by the service
+            client : The connection the job came from, job ids are only unique per client
+            slot : Index of the cancel flag of the job
+            text : Contents of the .bff file
+            name : Name of the board
+            solver : Name of the solver in functions.SOLVERS
+            deadline : time.time() at which the job is given up
+            send : Callable that sends an event dict to the client of the job
+        """
+        self.key = key
+        self.id = job_id
+        self.client = client
+        self.slot = slot
+        self.text = text
+        self.name = name
+        self.solver = solver
+        self.deadline = deadline
+        self.send = send
+        self.state = 'queued'  # then 'running', then one of FINAL_EVENTS
+        self.timer = None
+
+
+class SolveService:
+    def __init__(self, workers: int = None, queue_size: int = 64, default_deadline: float = 120,
+                 max_deadline: float = 3600, cache_path: str = None, max_solutions: int = 1000,
+                 progress_interval: float = 1.0):
+        """
+        Job queue and worker pool of the service. Call start() in the event
+        loop, then serve_unix or serve_tcp.
+
+        Args:
+            workers : Number of worker processes, defaults to the number of cores
+            queue_size : Number of jobs that may wait for a worker, further jobs are rejected
+            default_deadline : Seconds a job may take when the client gives no deadline
+            max_deadline : Largest deadline a client may ask for
+            cache_path : Optional on-disk SolutionCache shared by the workers,
+                None keeps the solutions in the memory of each worker only
+            max_solutions : Solutions kept in memory per worker
+            progress_interval : Seconds between two progress events of a job
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.default_deadline = default_deadline
+        self.max_deadline = max_deadline
+        self.cache_path = cache_path
+        self.max_solutions = max_solutions
+        self.progress_interval = progress_interval
+        self.jobs = {}  # key -> Job, until the final event
+        self._client_jobs = {}  # (client, id) -> Job, until the final event
+        self.queued = 0
+        self.completed = 0
+        self.worker_pids = []
+        self.servers = []
+        self._clients = {}  # handler task -> writer of each open connection
+        self._ids = itertools.count()
+        self._keys = itertools.count()
+        self._client_numbers = itertools.count()
+        # At most queue_size queued and one running job per worker are alive at once
+        self._free_slots = list(range(self.workers + queue_size))
+        self._queue = None
+        self._tasks = []
+        self._executor = None
+
+    async def start(self) -> None:
+        """
+        Start the workers, wait until each of them is up, and start taking jobs.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._cancelled = multiprocessing.Array('b', self.workers + self.queue_size, lock=False)
+        self._progress = multiprocessing.Queue()
+        self._executor = ProcessPoolExecutor(self.workers, initializer=_init_service_worker,
+                                             initargs=(self._cancelled, self._progress, self.cache_path,
+                                                       self.max_solutions, self.progress_interval))
+        self.worker_pids = sorted(set(await asyncio.gather(*(self._loop.run_in_executor(self._executor, _warm_up)
+                                                               for _ in range(self.workers)))))
+        self._progress_thread = threading.Thread(target=self._read_progress, daemon=True)
+        self._progress_thread.start()
+        self._tasks = [asyncio.create_task(self._run_jobs()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        """
+        Stop listening, cancel every job and shut the workers down.
+        """
+        for server in self.servers:
+            server.close()
+        for writer in self._clients.values():
+            writer.close()
+        await asyncio.gather(*self._clients, return_exceptions=True)
+        for server in self.servers:
+            await server.wait_closed()
+        for job in list(self.jobs.values()):
+            self._cancel(job)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            await self._loop.run_in_executor(None, self._executor.shutdown)
+            self._progress.put(None)
+            self._progress_thread.join()
+            self._executor = None
+
+    def submit(self, text: str, send, job_id: str = None, name: str = None, solver: str = 'guided',
+               deadline: float = None, client=None) -> Job:
+        """
+        Queue a board. Every event of the job, 'queued' or 'rejected' included,
+        goes to send.
+
+        Args:
+            text : Contents of the .bff file
+            send : Callable taking an event dict
+            job_id : Id of the job, made up if None
+            name : Name of the board in error messages, defaults to the id
+            solver : Name of the solver in functions.SOLVERS
+            deadline : Seconds the job may take from now, default_deadline if None
+            client : Owner of the job, the id has to be unique among its unfinished jobs
+
+        Returns:
+            Job: The job, or None if it was rejected
+        """
+        job_id = str(job_id) if job_id is not None else f"job-{next(self._ids)}"
+        if (client, job_id) in self._client_jobs:
+            send({'id': job_id, 'event': 'rejected', 'reason': f"job {job_id} is already running"})
+            return None
+        if solver not in SOLVERS:
+            send({'id': job_id, 'event': 'rejected', 'reason': f"unknown solver {solver!r}, expected one of {sorted(SOLVERS)}"})
+            return None
+        if self.queued >= self.queue_size:
+            send({'id': job_id, 'event': 'rejected', 'reason': 'queue full', 'queued': self.queued})
+            return None
+        try:
+            deadline = min(float(self.default_deadline if deadline is None else deadline), self.max_deadline)
+        except (TypeError, ValueError):
+            send({'id': job_id, 'event': 'rejected', 'reason': f"deadline {deadline!r} is not a number"})
+            return None
+
+        job = Job(next(self._keys), job_id, client, self._free_slots.pop(), text, name or job_id, solver,
+                  time.time() + deadline, send)
+        self._cancelled[job.slot] = 0
+        self.jobs[job.key] = job
+        self._client_jobs[client, job_id] = job
+        self.queued += 1
+        job.timer = self._loop.call_later(deadline, self._expire, job)
+        self._queue.put_nowait(job)
+        send({'id': job_id, 'event': 'queued', 'position': self.queued - 1})
+        return job
+
+    def cancel(self, job_id: str, client=None) -> bool:
+        """
+        Cancel a job of a client. A queued job ends at once, a running one when
+        its solver next checks should_stop.
+
+        Returns:
+            bool: False if the client has no such job (any more)
+        """
+        job = self._client_jobs.get((client, str(job_id)))
+        if job is None:
+            return False
+        self._cancel(job)
+        return True
+
+    def _cancel(self, job: Job) -> None:
+        if job.state == 'queued':
+            self._finish(job, {'event': 'cancelled', 'time': 0.0})
+        else:
+            self._cancelled[job.slot] = 1
+
+    def stats(self) -> dict:
+        return {'event': 'stats', 'queued': self.queued, 'running': len(self.jobs) - self.queued,
+                'completed': self.completed, 'workers': self.worker_pids, 'queue_size': self.queue_size}
+
+    def _expire(self, job: Job) -> None:
+        # A running job stops itself at the deadline
+        if job.state == 'queued':
+            self._finish(job, {'event': 'timeout', 'time': 0.0})
+
+    def _finish(self, job: Job, result: dict) -> None:
+        if job.state == 'queued':
+            self.queued -= 1
+        job.state = result['event']
+        job.timer.cancel()
+        del self.jobs[job.key]
+        del self._client_jobs[job.client, job.id]
+        self._free_slots.append(job.slot)
+        self.completed += 1
+        job.send({'id': job.id, **result})
+
+    async def _run_jobs(self) -> None:
+        """
+        Hand queued jobs to the pool, one at a time: one of these runs per worker.
+        """
+        while True:
+            job = await self._queue.get()
+            if job.state != 'queued':
+                continue  # cancelled or expired while it waited
+            self.queued -= 1
+            job.state = 'running'
+            try:
+                result = await self._loop.run_in_executor(self._executor, _solve_job, job.key, job.slot, job.text,
+                                                          job.name, job.solver, job.deadline)
+            except Exception as error:
+                result = {'event': 'error', 'error': f"worker failed: {error!r}"}
+            self._finish(job, result)
+
+    def _read_progress(self) -> None:
+        """
+        Thread passing the started and progress events of the workers to the event loop.
+        """
+        while True:
+            message = self._progress.get()
+            if message is None:
+                return
+            self._loop.call_soon_threadsafe(self._forward_progress, *message)
+
+    def _forward_progress(self, key: int, event: dict) -> None:
+        job = self.jobs.get(key)
+        if job is not None and job.state == 'running':
+            job.send({'id': job.id, **event})
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve one connection: read requests line by line, write the events of
+        its jobs as they come. Its unfinished jobs are cancelled when it closes.
+        """
+        client = next(self._client_numbers)
+        outbox = asyncio.Queue()
+        send = outbox.put_nowait
+
+        async def write_events():
+            try:
+                while True:
+                    event = await outbox.get()
+                    writer.write(json.dumps(event).encode() + b'\n')
+                    await writer.drain()
+            except ConnectionError:
+                pass
+
+        writer_task = asyncio.create_task(write_events())
+        self._clients[asyncio.current_task()] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request.get('op')
+                except (ValueError, AttributeError):
+                    send({'event': 'error', 'error': f"not a JSON object: {line[:80]!r}"})
+                    continue
+                if op == 'solve':
+                    self.submit(request.get('bff', ''), send, request.get('id'), request.get('name'),
+                                request.get('solver', 'guided'), request.get('deadline'), client)
+                elif op == 'cancel':
+                    if not self.cancel(request.get('id'), client):
+                        send({'id': request.get('id'), 'event': 'error', 'error': "no such job"})
+                elif op == 'stats':
+                    send(self.stats())
+                else:
+                    send({'event': 'error', 'error': f"unknown op {op!r}, expected solve, cancel or stats"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for job in [job for job in self.jobs.values() if job.client == client]:
+                self._cancel(job)
+            # Let the events already queued go out before closing
+            while not outbox.empty() and not writer_task.done() and not writer.is_closing():
+                await asyncio.sleep(0)
+            writer_task.cancel()
+            writer.close()
+            del self._clients[asyncio.current_task()]
+
+    async def serve_unix(self, path: str) -> asyncio.AbstractServer:
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(self.handle_client, path)
+        self.servers.append(server)
+        return server
+
+    async def serve_tcp(self, port: int, host: str = '127.0.0.1') -> asyncio.AbstractServer:
+        server = await asyncio.start_server(self.handle_client, host, port)
+        self.servers.append(server)
+        return server
+
+
+# Client side
+
+async def open_connection(socket_path: str = None, port: int = None, host: str = '127.0.0.1'):
+    if socket_path is not None:
+        return await asyncio.open_unix_connection(socket_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def solve_remote(boards, socket_path: str = None, port: int = None, solver: str = 'guided',
+                       deadline: float = None):
+    """
+    Send boards to a running service and yield its events until every job has ended.
+
+    Args:
+        boards : (name, .bff text) pairs, numbered as job ids 0, 1, ...
+        socket_path : Unix socket of the service
+        port : Or its localhost port
+        solver : Name of the solver in functions.SOLVERS
+        deadline : Seconds per board, the service default if None
+
+    Yields:
+        dict: The events, in the order they arrive, with the name of their board
+    """
+    reader, writer = await open_connection(socket_path, port)
+    try:
+        waiting = {}
+        for number, (name, text) in enumerate(boards):
+            request = {'op': 'solve', 'id': str(number), 'name': name, 'bff': text, 'solver': solver}
+            if deadline is not None:
+                request['deadline'] = deadline
+            writer.write(json.dumps(request).encode() + b'\n')
+            waiting[str(number)] = name
+        await writer.drain()
+        while waiting:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("the service closed the connection")
+            event = json.loads(line)
+            name = waiting.get(event.get('id'))
+            if name is not None:
+                event['name'] = name
+                if event['event'] in FINAL_EVENTS:
+                    del waiting[event['id']]
+            yield event
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: str = None, port: int = None, **options) -> None:
+    service = SolveService(**options)
+    await service.start()
+    if socket_path is not None:
+        await service.serve_unix(socket_path)
+    if port is not None:
+        await service.serve_tcp(port)
+    print(f"Serving with {len(service.worker_pids)} workers on {socket_path or f'127.0.0.1:{port}'}", flush=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await service.close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local Lazor solve service.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="run the service")
+    solve_parser = commands.add_parser('solve', help="solve .bff files with a running service")
+    for command in (serve_parser, solve_parser):
+        command.add_argument('--socket', default=None, help="Unix socket of the service")
+        command.add_argument('--port', type=int, default=None, help="localhost port of the service")
+    serve_parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    serve_parser.add_argument('--queue-size', type=int, default=64, help="jobs that may wait before new ones are rejected")
+    serve_parser.add_argument('--deadline', type=float, default=120, help="default time budget of a job in seconds")
+    serve_parser.add_argument('--cache', default=None, help="on-disk solution cache shared by the workers")
+    solve_parser.add_argument('paths', nargs='+', help=".bff files")
+    solve_parser.add_argument('--solver', choices=sorted(SOLVERS), default='guided')
+    solve_parser.add_argument('--deadline', type=float, default=None, help="time budget per board in seconds")
+    args = parser.parse_args(argv)
+    if args.socket is None and args.port is None:
+        parser.error("give --socket or --port")
+
+    if args.command == 'serve':
+        asyncio.run(serve(args.socket, args.port, workers=args.workers, queue_size=args.queue_size,
+                          default_deadline=args.deadline, cache_path=args.cache))
+        return 0
+
+    boards = []
+    for path in args.paths:
+        with open(path) as f:
+            boards.append((path, f.read()))
+
+    async def run():
+        solved = 0
+        async for event in solve_remote(boards, args.socket, args.port, args.solver, args.deadline):
+            print(json.dumps(event), flush=True)
+            solved += event.get('event') == 'solved'
+        return solved
+
+    solved = asyncio.run(run())
+    return 0 if solved == len(boards) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+On-disk cache of solved boards.
+
+Solutions are stored in an SQLite file under the content hash of the parsed
+board (BoardTemplate.content_hash), so comments, whitespace and the file name
+of the .bff do not matter. SQLite does the locking, so several processes can
+share one cache file. The least recently used entries are evicted once the
+cache holds more than max_entries boards.
+"""
+from classes import *
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'lazor', 'solutions.sqlite3')
+
+
+class SolutionCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 10000):
+        """
+        Open (or create) a solution cache. The connection is opened lazily, so a
+        cache object can be handed to worker processes.
+
+        Args:
+            path : Path of the SQLite file
+            max_entries : Maximum number of boards kept
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._connection = None
+
+    def __getstate__(self):
+        return {'path': self.path, 'max_entries': self.max_entries, '_connection': None}
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Connection of this process to the cache file, created on first use.
+        """
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS solutions ('
+                                     'key TEXT PRIMARY KEY, placement TEXT NOT NULL, last_used REAL NOT NULL)')
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def get(self, template: BoardTemplate):
+        """
+        Look up the solution of a board. A cached placement is only returned after
+        it was placed and propagated on the board and hit every target; entries
+        that fail this check are dropped.
+
+        Args:
+            template : The parsed board
+
+        Returns:
+            list: ((x, y), block_type) pairs, or None if there is no valid entry
+        """
+        key = template.content_hash()
+        connection = self.connect()
+        row = connection.execute('SELECT placement FROM solutions WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+
+        placement = [((x, y), block_type) for x, y, block_type in json.loads(row[0])]
+        if not self.verify(template, placement):
+            connection.execute('DELETE FROM solutions WHERE key = ?', (key,))
+            return None
+        connection.execute('UPDATE solutions SET last_used = ? WHERE key = ?', (time.time(), key))
+        return placement
+
+    def put(self, template: BoardTemplate, placement) -> None:
+        """
+        Store the solution of a board and evict the least recently used boards
+        beyond max_entries.
+
+        Args:
+            template : The parsed board
+            placement : ((x, y), block_type) pairs of the solution
+        """
+        value = json.dumps([[x, y, block_type] for (x, y), block_type in placement])
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('INSERT OR REPLACE INTO solutions (key, placement, last_used) VALUES (?, ?, ?)',
+                               (template.content_hash(), value, time.time()))
+            connection.execute('DELETE FROM solutions WHERE key NOT IN '
+                               '(SELECT key FROM solutions ORDER BY last_used DESC LIMIT ?)', (self.max_entries,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def __len__(self) -> int:
+        return self.connect().execute('SELECT COUNT(*) FROM solutions').fetchone()[0]
+
+    @staticmethod
+    def verify(template: BoardTemplate, placement) -> bool:
+        """
+        Check that a placement uses exactly the block inventory and solves the board.
+
+        Args:
+            template : The parsed board
+            placement : ((x, y), block_type) pairs
+
+        Returns:
+            bool: True if the placement is a solution
+        """
+        if sorted(block_type for _, block_type in placement) != sorted(template.blocks_needed()):
+            return False
+        positions = template.available_positions()
+        if any(tuple(pos) not in positions for pos, _ in placement):
+            return False
+        if len({tuple(pos) for pos, _ in placement}) != len(placement):
+            return False
+        game = template.new_game(placement)
+        game.propagate()
+        return game.validate()
+
+
+class MemorySolutionCache:
+    def __init__(self, max_entries: int = 1000, backing: SolutionCache = None):
+        """
+        Solution cache held in the memory of one process, for long-lived
+        processes like the workers of service.py. Same get/put as SolutionCache.
+
+        Args:
+            max_entries : Maximum number of boards kept, the least recently
+                used ones are dropped first
+            backing : Optional on-disk cache, looked in when a board is not in
+                memory and written to as well
+        """
+        self.max_entries = max_entries
+        self.backing = backing
+        self.entries = OrderedDict()
+
+    def get(self, template: BoardTemplate):
+        """
+        Look up the solution of a board, in memory first.
+
+        Returns:
+            list: ((x, y), block_type) pairs, or None if there is none
+        """
+        key = template.content_hash()
+        placement = self.entries.get(key)
+        if placement is not None:
+            self.entries.move_to_end(key)
+            return placement
+        if self.backing is not None:
+            placement = self.backing.get(template)
+            if placement is not None:
+                self._store(key, placement)
+        return placement
+
+    def put(self, template: BoardTemplate, placement) -> None:
+        self._store(template.content_hash(), placement)
+        if self.backing is not None:
+            self.backing.put(template, placement)
+
+    def _store(self, key: str, placement) -> None:
+        self.entries[key] = [(tuple(pos), block_type) for pos, block_type in placement]
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -2,8 +2,988 @@
 from functions import *
 from classes import *
 import time
+import random
+import itertools
+import contextlib
+import io
+import tempfile
+from solution_cache import SolutionCache
+from checkpoint import SearchCheckpoint
+from benchmark import find_regressions, percentile, save_baseline, summarize
+from generator import generate_boards, random_board, random_placement
+import csv
+import json
+import subprocess
+import sys
+import matplotlib.pyplot as plt
+from xml.etree import ElementTree
+from render import render_batch, render_svg, render_text
+from bff_parser import BffError, iter_bff, load_boards, parse_bff
+from vectorized import BatchPropagator
+from service import FINAL_EVENTS, SolveService, solve_remote
+from batch import RESULT_FIELDS, run_batch, solve_file, write_results
+import asyncio
 from typing import Dict
 
+def check_incremental_propagation(directory_path, trials=200, seed=0):
+    """
+    Property check: on random sequences of add_block/remove_block, the path kept
+    by propagate_incremental must hold the same segments as a full propagate.
+    """
+    rng = random.Random(seed)
+    mismatches = 0
+    for file_name in sorted(os.listdir(directory_path)):
+        if not file_name.endswith('.bff'):
+            continue
+        template = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+        positions = template.available_positions()
+        game = template.new_game()
+        game.propagate_incremental()
+        placed = {}
+        for _ in range(trials):
+            # Place a block from the inventory, or take one back
+            blocks_left = template.blocks_needed()
+            for block_type in placed.values():
+                blocks_left.remove(block_type)
+            free = [pos for pos in positions if pos not in placed]
+            if placed and (not blocks_left or not free or rng.random() < 0.4):
+                pos = rng.choice(sorted(placed))
+                game.remove_block(pos)
+                del placed[pos]
+            elif blocks_left and free:
+                pos = rng.choice(free)
+                placed[pos] = rng.choice(blocks_left)
+                game.add_block(placed[pos], pos)
+            game.propagate_incremental()
+
+            full_game = template.new_game([(pos, block_type) for pos, block_type in placed.items()])
+            full_game.propagate()
+            if set(game.path) != set(full_game.path) or game.validate() != full_game.validate():
+                mismatches += 1
+                print("Incremental path differs for", file_name, "with blocks", placed)
+    print("Incremental propagation mismatches:", mismatches)
+    return mismatches == 0
+
+def rescan_propagate(game):
+    """
+    Reference propagation: every lazor is rescanned on every tick and ends
+    when it draws a segment already on the path, using interact_with_block.
+
+    Returns:
+        list: The path, in drawing order
+    """
+    grid = game.grid
+    max_x, max_y = len(grid[0]) * 2, len(grid) * 2
+    path = []
+    while any(not lazor.end for lazor in game.lazors):
+        for lazor in game.lazors:
+            if lazor.end:
+                continue
+            (x, y), (vx, vy) = lazor.position, lazor.direction
+            check_x, check_y = ((x + vx) // 2, y // 2) if x % 2 == 0 else (x // 2, (y + vy) // 2)
+            if grid[check_y][check_x] in ('A', 'B', 'C'):
+                game.interact_with_block(lazor, check_x, check_y)
+            vx, vy = lazor.direction
+            new_position = (x + vx, y + vy)
+            segment = (lazor.position, new_position)
+            drawn = segment in path
+            if not drawn:
+                path.append(segment)
+            if drawn or not (0 < new_position[0] < max_x and 0 < new_position[1] < max_y):
+                lazor.end = True
+            elif grid[check_y][check_x] != 'B':
+                lazor.position = new_position
+    return path
+
+def check_propagate_order(directory_path, trials=50, generated=20, seed=0):
+    """
+    Check that propagate draws exactly the path of the rescanning reference,
+    in the same order, on random placements of the bundled boards and of
+    generated boards with many refract blocks.
+    """
+    rng = random.Random(seed)
+    templates = [BoardTemplate.from_file(os.path.join(directory_path, file_name))
+                 for file_name in sorted(os.listdir(directory_path)) if file_name.endswith('.bff')]
+    templates.extend(random_board(8, 8, [('A', 4), ('B', 1), ('C', 6)], 3, 6, random.Random(f"{seed}-{index}"))[0]
+                     for index in range(generated))
+    mismatches = 0
+    for template in templates:
+        for _ in range(trials):
+            placement = random_placement(template, rng)
+            game = template.new_game(placement)
+            game.propagate()
+            if game.path != rescan_propagate(template.new_game(placement)):
+                mismatches += 1
+                print("Path differs from the reference on", template.filename, "with blocks", placement)
+    print("Propagation order mismatches:", mismatches)
+    return mismatches == 0
+
+def check_bitboard_engine(directory_path, trials=50, generated=20, seed=0):
+    """
+    Check that the bitboard engine draws the same segments, covers the same
+    points and validates the same as the Python engine, on random placements
+    of the bundled boards and of generated boards with many refract blocks,
+    and after blocks are removed again. Also checks that the engine is picked
+    per game or for all games.
+    """
+    rng = random.Random(seed)
+    templates = [BoardTemplate.from_file(os.path.join(directory_path, file_name))
+                 for file_name in sorted(os.listdir(directory_path)) if file_name.endswith('.bff')]
+    templates.extend(random_board(8, 8, [('A', 4), ('B', 1), ('C', 6)], 3, 6, random.Random(f"{seed}-{index}"))[0]
+                     for index in range(generated))
+    mismatches = 0
+    for template in templates:
+        for _ in range(trials):
+            placement = random_placement(template, rng)
+            game = template.new_game(placement)
+            game.propagate()
+            bitboard_game = template.new_game(placement)
+            bitboard_game.engine = 'bitboard'
+            if rng.random() < 0.5:
+                bitboard_game.propagate()
+            bitboard_game.propagate()
+            if rng.random() < 0.5 and placement:
+                # A board that got back to this placement, through a removed block
+                position, _ = placement[0]
+                bitboard_game.remove_block(position)
+                bitboard_game.propagate()
+                bitboard_game.add_block(placement[0][1], position)
+                bitboard_game.propagate()
+            if (bitboard_game.validate() != game.validate()
+                    or bitboard_game.covered_points() != game.covered_points()
+                    or sorted(bitboard_game.path) != sorted(game.path)
+                    or bitboard_game.visited != game.visited):
+                mismatches += 1
+                print("Bitboard engine differs on", template.filename, "with blocks", placement)
+
+    # The engine of the class is the default of every game
+    template = templates[0]
+    placement = random_placement(template, rng)
+    game = template.new_game(placement)
+    game.propagate()
+    LazorGame.engine = 'bitboard'
+    try:
+        bitboard_game = template.new_game(placement)
+        bitboard_game.propagate()
+        if bitboard_game.bitboard is None or sorted(bitboard_game.path) != sorted(game.path):
+            mismatches += 1
+            print("LazorGame.engine = 'bitboard' was not used by new games")
+    finally:
+        LazorGame.engine = 'python'
+    game.engine = 'fortran'
+    try:
+        game.propagate()
+        mismatches += 1
+        print("An unknown engine was accepted")
+    except ValueError:
+        pass
+    print("Bitboard engine mismatches:", mismatches)
+    return mismatches == 0
+
+def small_variants(directory_path, variants=6, seed=0):
+    """
+    Turn every board in the directory into small variants (at most 3 blocks)
+    with targets taken either from the path of a random placement, so they are
+    solvable, or from random points, so most are not.
+
+    Yields:
+        (file name, BoardTemplate) pairs
+    """
+    rng = random.Random(seed)
+    for file_name in sorted(os.listdir(directory_path)):
+        if not file_name.endswith('.bff'):
+            continue
+        board = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+        positions = board.available_positions()
+        for variant in range(variants):
+            blocks = rng.sample(board.blocks_needed(), min(3, len(board.blocks_needed())))
+            if variant % 2 == 0:
+                placement = list(zip(rng.sample(positions, len(blocks)), blocks))
+                placed_game = board.new_game(placement)
+                placed_game.propagate()
+                path_points = sorted({point for segment in placed_game.path for point in segment})
+                points = rng.sample(path_points, min(3, len(path_points)))
+            else:
+                points = [(rng.randint(0, 2 * len(board.grid[0])), rng.randint(0, 2 * len(board.grid)))
+                          for _ in range(2)]
+            inventory = {}
+            for block_type in blocks:
+                inventory[block_type] = inventory.get(block_type, 0) + 1
+            yield file_name, BoardTemplate(board.grid, inventory.items(), board.lazors, points, board.filename)
+
+def check_guided_completeness(directory_path, variants=6, seed=0):
+    """
+    Check that solve_board_guided finds a solution exactly when the brute force
+    solve_board does, on the small variants of every board.
+    """
+    disagreements = 0
+    for file_name, template in small_variants(directory_path, variants, seed):
+        brute_game = template.new_game()
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = solve_board(brute_game)
+        guided_game = template.new_game()
+        found = solve_board_guided(guided_game)
+        guided_game.propagate()
+        if found != expected or (found and not guided_game.validate()):
+            disagreements += 1
+            print("Guided solver disagrees with brute force on", file_name,
+                  "blocks", template.blocks, "targets", template.points)
+    print("Guided solver disagreements:", disagreements)
+    return disagreements == 0
+
+def check_orderings(directory_path, variants=4, seed=3):
+    """
+    Check every candidate ordering of the guided search: it finds a solution
+    exactly when the brute force solve_board does, the same one on every run,
+    and a search cannot be resumed with another ordering.
+    """
+    problems = 0
+    for file_name, template in small_variants(directory_path, variants, seed):
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = solve_board(template.new_game())
+        for ordering in ORDERINGS:
+            solutions = [guided_search(template, ordering=ordering) for _ in range(2)]
+            if (solutions[0] is not None) != expected or solutions[0] != solutions[1]:
+                problems += 1
+                print("Ordering", ordering, "is wrong or not deterministic on", file_name,
+                      "blocks", template.blocks, "targets", template.points)
+    state = {}
+    guided_search(template, should_stop=lambda: True, state=state, ordering='scarce-first')
+    try:
+        guided_search(template, state=state, ordering='beam')
+        problems += 1
+        print("Search resumed with another ordering")
+    except ValueError:
+        pass
+    print("Ordering problems:", problems)
+    return problems == 0
+
+def check_sat_solver(directory_path, variants=6, seed=0):
+    """
+    Check that solve_board_sat solves every bundled board, and finds a solution
+    of the small variants exactly when the brute force solve_board does.
+    Skipped without python-sat.
+    """
+    if not HAVE_SAT:
+        print("SAT solver not checked, python-sat is not installed")
+        return True
+    cases = []
+    for file_name in sorted(os.listdir(directory_path)):
+        if file_name.endswith('.bff'):
+            cases.append((file_name, BoardTemplate.from_file(os.path.join(directory_path, file_name)), True))
+    for file_name, template in small_variants(directory_path, variants, seed):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cases.append((file_name, template, solve_board(template.new_game())))
+
+    disagreements = 0
+    for file_name, template, expected in cases:
+        sat_game = template.new_game()
+        found = solve_board_sat(sat_game)
+        sat_game.propagate()
+        if found != expected or (found and not sat_game.validate()):
+            disagreements += 1
+            print("SAT solver disagrees with brute force on", file_name,
+                  "blocks", template.blocks, "targets", template.points)
+    print("SAT solver disagreements:", disagreements)
+    return disagreements == 0
+
+def check_iter_solutions(directory_path, variants=4, seed=1):
+    """
+    Check that iter_solutions yields exactly the placements that solve the small
+    variants of every board, in the order of iter_placements, that limit gives
+    the first solutions and that the game passed in is left untouched.
+    iter_placements and count_placements themselves are checked against the
+    distinct placements built from every permutation of a mixed inventory,
+    and iter_placements(start=k) against the tail of the full enumeration.
+    """
+    differences = 0
+    positions = [(x, 1) for x in range(1, 13, 2)]
+    inventory = [('A', 2), ('B', 1), ('C', 2)]
+    blocks = [block_type for block_type, count in inventory for _ in range(count)]
+    oracle = {frozenset(zip(cells, blocks)) for cells in itertools.permutations(positions, len(blocks))}
+    enumerated = list(iter_placements(positions, inventory))
+    if (len(enumerated) != len(oracle) or {frozenset(placement) for placement in enumerated} != oracle
+            or count_placements(len(positions), inventory) != len(oracle)):
+        differences += 1
+        print("iter_placements or count_placements differ from the permutations:", len(enumerated),
+              count_placements(len(positions), inventory), "instead of", len(oracle))
+    for start in range(len(enumerated) + 2):
+        if list(iter_placements(positions, inventory, start)) != enumerated[start:]:
+            differences += 1
+            print("iter_placements from", start, "is not the tail of the enumeration")
+            break
+    for file_name, template in small_variants(directory_path, variants, seed):
+        expected = []
+        for placement in iter_placements(template.available_positions(), template.blocks):
+            test_game = template.new_game(placement)
+            test_game.propagate()
+            if test_game.validate():
+                expected.append(placement)
+        game = template.new_game()
+        solutions = list(iter_solutions(game, batch_size=64))
+        first = list(iter_solutions(template, limit=3))
+        if solutions != expected or first != expected[:3] or game.placed_blocks():
+            differences += 1
+            print("iter_solutions differs for", file_name, "blocks", template.blocks, "targets", template.points)
+    print("iter_solutions differences:", differences)
+    return differences == 0
+
+def check_checkpoint_resume(directory_path, stop_every=150, variants=2, seed=2):
+    """
+    Check that a guided search stopped every few nodes, saved with
+    SearchCheckpoint and resumed from the file, expands exactly the nodes of an
+    uninterrupted search and finds the same placement, also when a save was
+    killed after appending to the log of explored placements. Also check on the small
+    variants that iter_solutions taken a few solutions at a time from a saved
+    state yields the same solutions as one pass.
+    """
+    boards = [(file_name, BoardTemplate.from_file(os.path.join(directory_path, file_name)))
+              for file_name in sorted(os.listdir(directory_path)) if file_name.endswith('.bff')]
+    differences = 0
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        for file_name, template in boards + list(small_variants(directory_path, variants, seed)):
+            nodes = 0
+            def count_nodes():
+                nonlocal nodes
+                nodes += 1
+                return False
+            expected = guided_search(template, should_stop=count_nodes)
+            expected_nodes = nodes
+
+            checkpoint = SearchCheckpoint(os.path.join(checkpoint_dir, "search.json"), template)
+            checkpoint.clear()
+            nodes = 0
+            while True:
+                run_nodes = 0
+                def stop_soon():
+                    nonlocal nodes, run_nodes
+                    run_nodes += 1
+                    if run_nodes > stop_every:
+                        return True
+                    nodes += 1
+                    return False
+                state = checkpoint.load()
+                solution = guided_search(template, should_stop=stop_soon, state=state)
+                if state['done']:
+                    break
+                checkpoint.save(state)
+                # As if the next save was killed after appending to the log
+                ahead = {'path': list(state['path']), 'ordering': state['ordering'], 'explored': dict(state['explored'])}
+                ahead_nodes = itertools.count()
+                guided_search(template, should_stop=lambda: next(ahead_nodes) > 20, state=ahead)
+                with open(checkpoint.log_path('explored'), 'a') as f:
+                    f.writelines(f"{item:x}\n" for item in list(ahead['explored'])[len(state['explored']):])
+            if solution != expected or nodes != expected_nodes:
+                differences += 1
+                print("Resumed guided search differs for", file_name, nodes, "nodes instead of", expected_nodes)
+
+            if len(template.blocks_needed()) > 3:
+                continue  # enumerating every placement of the full boards takes too long
+            checkpoint.clear()
+            solutions = []
+            while True:
+                state = checkpoint.load()
+                chunk = list(iter_solutions(template, limit=2, batch_size=64, state=state))
+                if not chunk:
+                    break
+                solutions.extend(chunk)
+                checkpoint.save(state)
+            if solutions != list(iter_solutions(template)):
+                differences += 1
+                print("Resumed iter_solutions differs for", file_name)
+    print("Checkpoint resume differences:", differences)
+    return differences == 0
+
+def check_solver_stats(directory_path, file_name='mad_4.bff'):
+    """
+    Check that every solver fills in the SolverStats passed to it (and leaves
+    it on game.stats), that the phase timings fit in the total time and that
+    the progress hook is called.
+    """
+    template = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+    solvers = [solve_board, solve_board_vectorized, solve_board_optimized, solve_board_guided,
+               solve_board_parallel] + ([solve_board_sat] if HAVE_SAT else [])
+    problems = 0
+    for solver in solvers:
+        game = template.new_game()
+        progress_calls = []
+        stats = SolverStats(progress=lambda stats: progress_calls.append(stats.nodes), progress_interval=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            solved = solver(game, stats=stats)
+        phases = stats.construction_time + stats.propagation_time + stats.validation_time
+        if (game.stats is not stats or stats.solver != solver.__name__ or stats.solved != solved
+                or stats.nodes <= 0 or stats.propagations <= 0 or stats.propagation_steps <= 0
+                or phases > stats.total_time or not progress_calls):
+            problems += 1
+            print("Solver stats look wrong for", solver.__name__, stats)
+
+    # stats can also be passed by position
+    game = template.new_game()
+    stats = SolverStats()
+    try:
+        solve_board_guided(game, None, None, stats)
+    except TypeError as error:
+        problems += 1
+        print("Positional stats rejected:", error)
+    if game.stats is not stats or not stats.solved:
+        problems += 1
+        print("Positional stats were not filled in", stats)
+    print("Solver stats problems:", problems)
+    return problems == 0
+
+def check_parallel_matches_serial(directory_path, workers=2):
+    """
+    Check that solve_board_parallel places exactly the blocks solve_board_guided does.
+    """
+    differences = 0
+    for file_name in sorted(os.listdir(directory_path)):
+        if not file_name.endswith('.bff'):
+            continue
+        template = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+        serial_game = template.new_game()
+        parallel_game = template.new_game()
+        serial_found = solve_board_guided(serial_game)
+        parallel_found = solve_board_parallel(parallel_game, workers)
+        serial_blocks = sorted((block.position, block.block_type) for block in serial_game.block_objects)
+        parallel_blocks = sorted((block.position, block.block_type) for block in parallel_game.block_objects)
+        if serial_found != parallel_found or serial_blocks != parallel_blocks:
+            differences += 1
+            print("Parallel solution differs for", file_name)
+    print("Parallel solver differences:", differences)
+    return differences == 0
+
+def check_solution_cache(directory_path):
+    """
+    Check the solution cache: a board rewritten without comments and blank lines
+    hits the entry of the original, wrong entries are rejected and the cache
+    never holds more than max_entries boards.
+    """
+    problems = 0
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = SolutionCache(os.path.join(cache_dir, "solutions.sqlite3"), max_entries=3)
+        for file_name in sorted(os.listdir(directory_path)):
+            if not file_name.endswith('.bff'):
+                continue
+            file_path = os.path.join(directory_path, file_name)
+            solve_board_guided(LazorGame(file_path), cache=cache)
+
+            # Same board, different text
+            with open(file_path) as f:
+                lines = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+            stripped_path = os.path.join(cache_dir, "stripped.bff")
+            with open(stripped_path, 'w') as f:
+                f.write("\n".join(reversed(lines[lines.index('GRID STOP') + 1:])) + "\n")
+                f.write("\n".join(lines[:lines.index('GRID STOP') + 1]) + "\n")
+            template = BoardTemplate.from_file(stripped_path)
+            placement = cache.get(template)
+            if placement is None or not SolutionCache.verify(template, placement):
+                problems += 1
+                print("Cache miss for the rewritten", file_name)
+
+            # A placement that does not solve the board is dropped
+            cache.put(template, [])
+            if template.blocks and cache.get(template) is not None:
+                problems += 1
+                print("Cache accepted a wrong placement for", file_name)
+        if len(cache) > 3:
+            problems += 1
+            print("Cache holds", len(cache), "boards, more than max_entries")
+        cache.close()
+    print("Solution cache problems:", problems)
+    return problems == 0
+
+def check_propagation_memo(directory_path, file_name='mad_4.bff', seed=0):
+    """
+    Check the PropagationMemo: the same blocks placed in a different order
+    share one entry, hits and misses are counted, and the least recently used
+    results are evicted once max_bytes is passed.
+    """
+    problems = 0
+    rng = random.Random(seed)
+    template = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+    positions = template.available_positions()
+    blocks = template.blocks_needed()
+    block_types = sorted(set(blocks))
+    placements = []
+    while len(placements) < 3:
+        placement = list(zip(rng.sample(positions, len(blocks)), blocks))
+        if all(set(placement) != set(other) for other in placements):
+            placements.append(placement)
+
+    def propagated(placement):
+        game = template.new_game(placement)
+        game.propagate_incremental()
+        return game
+
+    memo = PropagationMemo(positions, block_types)
+    first = placements[0]
+    key = memo.key(first)
+    if memo.key(list(reversed(first))) != key or memo.key(placements[1]) == key:
+        problems += 1
+        print("Memo keys depend on the order of the blocks")
+    stored = memo.put(key, propagated(first))
+    missed = memo.get(memo.key(placements[1]))
+    found = memo.get(memo.key(list(reversed(first))))
+    if missed is not None or found is not stored or memo.stats()['hits'] != 1 or memo.stats()['misses'] != 1:
+        problems += 1
+        print("Wrong memo lookups:", memo.stats())
+    if stored.segments != frozenset(propagated(first).beams.segments):
+        problems += 1
+        print("The memo stored the wrong segments")
+
+    # Room for the first and last entries only: the one not read again goes
+    games = [propagated(placement) for placement in placements]
+    keys = [memo.key(placement) for placement in placements]
+    sizes = []
+    for key, game in zip(keys, games):
+        sizing = PropagationMemo(positions, block_types)
+        sizing.put(key, game)
+        sizes.append(sizing.bytes)
+    memo = PropagationMemo(positions, block_types, max_bytes=sizes[0] + sizes[2])
+    memo.put(keys[0], games[0])
+    memo.put(keys[1], games[1])
+    memo.get(keys[0])
+    memo.put(keys[2], games[2])
+    if (list(memo.entries) != [keys[0], keys[2]] or memo.evictions != 1
+            or memo.bytes != sizes[0] + sizes[2] or memo.bytes > memo.max_bytes):
+        problems += 1
+        print("Wrong memo eviction:", memo.stats())
+    print("Propagation memo problems:", problems)
+    return problems == 0
+
+def check_vectorized_validate(directory_path, trials=300, seed=0):
+    """
+    Check that the NumPy engine scores random placements like propagate/validate,
+    and that solve_board_vectorized finds the same placement as solve_board.
+    """
+    rng = random.Random(seed)
+    differences = 0
+    for file_name in sorted(os.listdir(directory_path)):
+        if not file_name.endswith('.bff'):
+            continue
+        template = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+        positions = template.available_positions()
+        placements = []
+        for _ in range(trials):
+            blocks = template.blocks_needed()
+            rng.shuffle(blocks)
+            count = rng.randint(0, min(len(blocks), len(positions)))
+            placements.append(list(zip(rng.sample(positions, count), blocks[:count])))
+        propagator = BatchPropagator(template)
+        scores = propagator.validate(propagator.grids_for(placements))
+        for placement, score in zip(placements, scores):
+            test_game = template.new_game(placement)
+            test_game.propagate()
+            if bool(score) != test_game.validate():
+                differences += 1
+                print("NumPy engine differs for", file_name, "with blocks", placement)
+    for file_name in ['dark_1.bff', 'mad_1.bff', 'showstopper_4.bff', 'tiny_5.bff', 'numbered_6.bff']:
+        template = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+        brute_game = template.new_game()
+        vectorized_game = template.new_game()
+        with contextlib.redirect_stdout(io.StringIO()):
+            solve_board(brute_game)
+        solve_board_vectorized(vectorized_game)
+        if sorted(brute_game.placed_blocks()) != sorted(vectorized_game.placed_blocks()):
+            differences += 1
+            print("solve_board_vectorized differs from solve_board for", file_name)
+    print("NumPy engine differences:", differences)
+    return differences == 0
+
+def check_pruning_sound(directory_path, trials=200, seed=0):
+    """
+    Check that TargetIndex never cuts a placement that can still be completed.
+    Random partial placements it rejects are completed in every possible way
+    with the NumPy engine, and none may solve the board. Then the pruned guided
+    search must agree with the exhaustive solve_board_vectorized on every board
+    and on variants with an extra random target, and place the same blocks as
+    the search without pruning.
+    """
+    rng = random.Random(seed)
+    unsound = 0
+    rejected = 0
+    for file_name in sorted(os.listdir(directory_path)):
+        if not file_name.endswith('.bff'):
+            continue
+        board = BoardTemplate.from_file(os.path.join(directory_path, file_name))
+        positions = board.available_positions()
+        boards = [board]
+        if count_placements(len(positions), board.blocks) <= 200000:
+            for _ in range(2):
+                point = board.points[0]
+                while point in board.points:
+                    point = (rng.randint(0, 2 * len(board.grid[0])), rng.randint(0, 2 * len(board.grid)))
+                boards.append(BoardTemplate(board.grid, board.blocks, board.lazors,
+                                            board.points + (point,), board.filename))
+
+        for template in boards:
+            index = TargetIndex(template)
+            propagator = BatchPropagator(template)
+            for _ in range(trials):
+                blocks = template.blocks_needed()
+                rng.shuffle(blocks)
+                count = rng.randint(0, min(len(blocks), len(positions)))
+                placement = list(zip(rng.sample(positions, count), blocks[:count]))
+                test_game = template.new_game(placement)
+                test_game.propagate_incremental()
+                blocks_left = blocks[count:]
+                free = [pos for pos in positions if pos not in dict(placement)]
+                inventory = [(block_type, blocks_left.count(block_type)) for block_type in 'ABC']
+                if index.feasible(test_game, blocks_left) or count_placements(len(free), inventory) > 50000:
+                    continue
+                rejected += 1
+                completions = [tuple(placement) + rest for rest in iter_placements(free, inventory)]
+                if propagator.validate(propagator.grids_for(completions)).any():
+                    unsound += 1
+                    print("Target index rejects a solvable placement on", file_name, placement)
+
+            pruned_game = template.new_game()
+            unpruned_game = template.new_game()
+            exhaustive_game = template.new_game()
+            found = solve_board_guided(pruned_game)
+            solution = guided_search(template, prune=False)
+            if solution is not None:
+                for pos, block_type in solution.items():
+                    unpruned_game.add_block(block_type, pos)
+            expected = solve_board_vectorized(exhaustive_game)
+            if found != expected or sorted(pruned_game.placed_blocks()) != sorted(unpruned_game.placed_blocks()):
+                unsound += 1
+                print("Pruned search disagrees with exhaustive search on", file_name, "targets", template.points)
+    print("Pruning checked on", rejected, "rejected placements, unsound results:", unsound)
+    return unsound == 0
+
+def check_generator(count=30, seed=0):
+    """
+    Check generated boards: written and read back as .bff files they are the
+    same boards, the placement they were made from solves them, and the same
+    seed writes the same files.
+    """
+    problems = 0
+    inventory = [('A', 3), ('B', 1), ('C', 2)]
+    with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+        paths = generate_boards(first, count, 6, 5, inventory, 2, 8, seed)
+        generate_boards(second, count, 6, 5, inventory, 2, 8, seed)
+        for index, path in enumerate(paths):
+            template, placement = random_board(6, 5, inventory, 2, 8, random.Random(f"{seed}-{index}"))
+            read_back = BoardTemplate.from_file(path)
+            if read_back.content_hash() != template.content_hash():
+                problems += 1
+                print("Board changed when written:", path)
+            test_game = read_back.new_game(placement)
+            test_game.propagate()
+            if not read_back.points or not test_game.validate():
+                problems += 1
+                print("Board not solved by its placement:", path)
+            with open(path) as f, open(os.path.join(second, os.path.basename(path))) as g:
+                if f.read() != g.read():
+                    problems += 1
+                    print("Same seed gave another board:", path)
+    print("Generator problems:", problems)
+    return problems == 0
+
+def check_bff_parser(directory_path):
+    """
+    Check the .bff parser: a stream of boards loads as the same boards, and
+    broken files are rejected with the number of the offending line.
+    """
+    problems = 0
+    templates = load_boards([directory_path])
+    stream = "".join(template.to_bff([f"board {template.filename}"]) for template in templates)
+    if [template.content_hash() for template in iter_bff(stream, "stream")] != \
+            [template.content_hash() for template in templates]:
+        problems += 1
+        print("A stream of the bundled boards does not load as the same boards")
+
+    board = "GRID START\no o\nx o\nGRID STOP\nA 1\nL 0 1 1 1\nP 3 2\n"
+    broken = [
+        (board.replace("x o", "x o o"), 3, "rows above have 2"),
+        (board.replace("x o", "x z"), 3, "unknown grid cell"),
+        (board.replace("L 0 1 1 1", "L 0 9 1 1"), 6, "off the"),
+        (board.replace("L 0 1 1 1", "L 0 1 1 0"), 6, "not diagonal"),
+        (board.replace("P 3 2", "P 3"), 7, "needs 2 numbers"),
+        (board.replace("P 3 2", "P 3 two"), 7, "whole numbers"),
+        (board.replace("P 3 2", "P 5 2"), 7, "off the"),
+        (board + "A 2\n", 8, "given twice"),
+        (board + "Q 1\n", 8, "unknown line"),
+        (board.replace("GRID STOP\n", ""), 4, "GRID STOP is missing"),
+        ("# no stop\nGRID START\no o\n", 2, "without GRID STOP"),
+    ]
+    for text, line, message in broken:
+        try:
+            parse_bff(text, "broken.bff")
+            problems += 1
+            print("Broken board accepted:", message)
+        except BffError as error:
+            if error.line != line or message not in str(error):
+                problems += 1
+                print(f"Expected line {line} ({message}), got: {error}")
+
+    with tempfile.TemporaryDirectory() as board_dir:
+        for name, text in (("good.bff", board), ("bad.bff", broken[0][0])):
+            with open(os.path.join(board_dir, name), "w") as f:
+                f.write(text)
+        errors = []
+        loaded = load_boards([board_dir], errors)
+        if len(loaded) != 1 or [error.filename for error in errors] != [os.path.join(board_dir, "bad.bff")]:
+            problems += 1
+            print("Bulk loading did not skip exactly the broken file:", errors)
+    print("Parser problems:", problems)
+    return problems == 0
+
+def check_render(directory_path):
+    """
+    Check the headless drawings of a solved board: the PNG reads back with the
+    expected size and shows the lazor path, the SVG is valid XML and the text
+    marks every target as hit. Importing the solvers must not load matplotlib.
+    """
+    problems = 0
+    template = BoardTemplate.from_file(os.path.join(directory_path, "mad_7.bff"))
+    game = template.new_game()
+    solve_board_guided(game)
+    game.propagate()
+    with tempfile.TemporaryDirectory() as render_dir:
+        paths = render_batch([(template.filename, game.placed_blocks())], render_dir, 'png', workers=1)
+        image = plt.imread(paths[0])
+        rows, cols = len(template.grid), len(template.grid[0])
+        if image.shape[:2] != (rows * 40 + 21, cols * 40 + 21) or not (image[..., 0] > image[..., 1] + 0.5).any():
+            problems += 1
+            print("Unexpected PNG drawing", image.shape)
+    try:
+        ElementTree.fromstring(render_svg(game))
+    except ElementTree.ParseError as error:
+        problems += 1
+        print("Invalid SVG:", error)
+    text = render_text(game)
+    if text.count('@') != len(set(template.points)) or 'P' in text:
+        problems += 1
+        print("Targets not marked as hit:\n" + text)
+    loaded = subprocess.run([sys.executable, "-c", "import functions, batch, sys; print('matplotlib' in sys.modules)"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if loaded.stdout.strip() != "False":
+        problems += 1
+        print("Importing the solvers loads matplotlib:", loaded.stdout, loaded.stderr)
+    print("Render problems:", problems)
+    return problems == 0
+
+def check_batch(directory_path, seed=0):
+    """
+    Check batch.py: every sample board is solved with a placement that
+    verifies, a hard generated board runs out of its tiny budget, the CSV and
+    JSON results read back the same, and a search continued from checkpoints
+    run after run ends like one that was never stopped.
+    """
+    problems = 0
+    with tempfile.TemporaryDirectory() as batch_dir:
+        cache = SolutionCache(os.path.join(batch_dir, "solutions.sqlite3"))
+        results = run_batch([directory_path], workers=2, timeout=60, cache=cache)
+        for result in results:
+            placement = [((x, y), block_type) for x, y, block_type in result['placement']]
+            if result['status'] != 'solved' or not SolutionCache.verify(BoardTemplate.from_file(result['file']), placement):
+                problems += 1
+                print("Batch did not solve", result)
+        cache.close()
+
+        hard_path = os.path.join(batch_dir, "hard.bff")
+        with open(hard_path, 'w') as f:
+            f.write(random_board(8, 8, [('A', 8), ('B', 2), ('C', 3)], 3, 12, random.Random(seed))[0].to_bff())
+        hard = run_batch([hard_path], workers=1, timeout=0.2)
+        if hard[0]['status'] != 'timeout' or not hard[0]['time'] < 5:
+            problems += 1
+            print("The hard board did not time out:", hard[0])
+
+        results += hard
+        json_path, csv_path = os.path.join(batch_dir, "results.json"), os.path.join(batch_dir, "results.csv")
+        write_results(results, json_path)
+        write_results(results, csv_path)
+        with open(json_path) as f:
+            from_json = json.load(f)
+        with open(csv_path, newline='') as f:
+            from_csv = list(csv.DictReader(f))
+        expected_csv = [{field: json.dumps(result[field]) if field == 'placement' else str(result[field])
+                         for field in RESULT_FIELDS} for result in results]
+        if from_json != results or from_csv != expected_csv:
+            problems += 1
+            print("The results files do not read back the same")
+
+        # A search stopped again and again, each time continued from its checkpoint
+        file_path = os.path.join(directory_path, "mad_7.bff")
+        expected = solve_file(file_path, timeout=60)
+        checkpoint_dir = os.path.join(batch_dir, "checkpoints")
+        runs = []
+        while not runs or runs[-1]['status'] == 'timeout' and len(runs) < 200:
+            runs.append(solve_file(file_path, timeout=0.1, checkpoint_dir=checkpoint_dir, checkpoint_interval=0.02))
+        if (len(runs) < 2 or runs[-1]['status'] != 'solved' or runs[-1]['placement'] != expected['placement']
+                or sum(run['nodes'] for run in runs) != expected['nodes'] or os.listdir(checkpoint_dir)):
+            problems += 1
+            print("Resumed batch search differs:", len(runs), "runs,", sum(run['nodes'] for run in runs),
+                  "nodes instead of", expected['nodes'], runs[-1])
+    print("Batch problems:", problems)
+    return problems == 0
+
+def check_service(directory_path, seed=0):
+    """
+    Check the solve service on a Unix socket and on localhost: solutions and
+    parse errors come back, a full queue rejects jobs, a running job can be
+    cancelled and stops at its deadline, a board sent again is answered from
+    the memory of the worker, the jobs of a client that hangs up are
+    cancelled, and two clients using the same job id neither collide nor
+    cancel each other's jobs.
+    """
+    problems = 0
+    small = open(os.path.join(directory_path, "mad_1.bff")).read()
+    slow = random_board(8, 8, [('A', 8), ('B', 2), ('C', 3)], 3, 12, random.Random(seed))[0].to_bff()
+
+    async def send(writer, **request):
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+
+    async def wait_for(reader, job_id, events):
+        # Events of other jobs read on the way are kept for later calls
+        seen = received.setdefault(reader, [])
+        while True:
+            for event in seen:
+                if event.get('id') == job_id and event['event'] in events:
+                    seen.remove(event)
+                    return event
+            seen.append(json.loads(await asyncio.wait_for(reader.readline(), 30)))
+
+    received = {}
+
+    async def run():
+        nonlocal problems
+        service = SolveService(workers=1, queue_size=1, default_deadline=60, progress_interval=0.1)
+        await service.start()
+        try:
+            with tempfile.TemporaryDirectory() as socket_dir:
+                socket_path = os.path.join(socket_dir, "lazor.sock")
+                await service.serve_unix(socket_path)
+                reader, writer = await asyncio.open_unix_connection(socket_path)
+
+                await send(writer, op='solve', id='slow', bff=slow)
+                await wait_for(reader, 'slow', ('started',))
+                await send(writer, op='solve', id='small', bff=small)
+                await send(writer, op='solve', id='extra', bff=small)
+                progress = await wait_for(reader, 'slow', ('progress',))
+                queued = await wait_for(reader, 'small', ('queued', 'rejected'))
+                rejected = await wait_for(reader, 'extra', ('queued', 'rejected'))
+                if queued['event'] != 'queued' or rejected['event'] != 'rejected' or progress['nodes'] <= 0:
+                    problems += 1
+                    print("Backpressure or progress went wrong:", progress, queued, rejected)
+                await send(writer, op='cancel', id='slow')
+                if (await wait_for(reader, 'slow', FINAL_EVENTS))['event'] != 'cancelled':
+                    problems += 1
+                    print("A running job was not cancelled")
+
+                solved = await wait_for(reader, 'small', FINAL_EVENTS)
+                placement = [((x, y), block_type) for x, y, block_type in solved.get('placement', [])]
+                if solved['event'] != 'solved' or not SolutionCache.verify(parse_bff(small), placement):
+                    problems += 1
+                    print("Wrong answer from the service:", solved)
+                await send(writer, op='solve', id='again', bff=small)
+                again = await wait_for(reader, 'again', FINAL_EVENTS)
+                if again['event'] != 'solved' or again['stats']['cache_hits'] != 1:
+                    problems += 1
+                    print("The worker did not remember the solution:", again)
+
+                await send(writer, op='solve', id='late', bff=slow, deadline=0.5)
+                late = await wait_for(reader, 'late', FINAL_EVENTS)
+                await send(writer, op='solve', id='broken', bff=small.replace('GRID STOP', ''))
+                broken = await wait_for(reader, 'broken', FINAL_EVENTS)
+                if late['event'] != 'timeout' or not late['time'] < 5 or broken['event'] != 'error' or ':' not in broken['error']:
+                    problems += 1
+                    print("Deadline or parse error went wrong:", late, broken)
+                writer.close()
+
+                # Hanging up cancels the running job
+                reader, writer = await asyncio.open_unix_connection(socket_path)
+                await send(writer, op='solve', id='orphan', bff=slow)
+                await wait_for(reader, 'orphan', ('started',))
+                writer.close()
+                for _ in range(100):
+                    if not service.jobs:
+                        break
+                    await asyncio.sleep(0.05)
+                if service.jobs:
+                    problems += 1
+                    print("The job of a closed connection kept running")
+
+                # Job ids belong to the connection
+                first_reader, first = await asyncio.open_unix_connection(socket_path)
+                second_reader, second = await asyncio.open_unix_connection(socket_path)
+                await send(first, op='solve', id='same', bff=slow)
+                await wait_for(first_reader, 'same', ('started',))
+                await send(second, op='solve', id='same', bff=small)
+                other = await wait_for(second_reader, 'same', ('queued', 'rejected'))
+                await send(second, op='cancel', id='same')
+                own = await wait_for(second_reader, 'same', FINAL_EVENTS)
+                await send(second, op='cancel', id='same')
+                refused = await wait_for(second_reader, 'same', ('error',) + FINAL_EVENTS)
+                still_running = await wait_for(first_reader, 'same', ('progress',) + FINAL_EVENTS)
+                if (other['event'] != 'queued' or own['event'] != 'cancelled' or refused['event'] != 'error'
+                        or still_running['event'] != 'progress'):
+                    problems += 1
+                    print("Jobs of two clients with the same id got mixed up:", other, own, refused, still_running)
+                await send(first, op='cancel', id='same')
+                if (await wait_for(first_reader, 'same', FINAL_EVENTS))['event'] != 'cancelled':
+                    problems += 1
+                    print("A client could not cancel its own job")
+                first.close()
+                second.close()
+
+                server = await service.serve_tcp(0)
+                port = server.sockets[0].getsockname()[1]
+                events = [event async for event in solve_remote([('mad_1', small)], port=port)]
+                if [event['event'] for event in events][-1] != 'solved':
+                    problems += 1
+                    print("Solving over localhost failed:", events)
+        finally:
+            await service.close()
+
+    asyncio.run(run())
+    print("Service problems:", problems)
+    return problems == 0
+
+def check_benchmark_baseline():
+    """
+    Check the benchmark statistics and the baseline comparison on made up
+    results: nearest-rank percentiles, a saved baseline read back, slower,
+    bigger or timing out cases reported as regressions while noise (within the
+    spread of the old trials, or the memory of a solve stopped at its deadline)
+    is not, and too few trials refused.
+    """
+    problems = 0
+    if percentile([5, 1, 4, 2, 3], 0.5) != 3 or percentile(list(range(1, 101)), 0.95) != 95:
+        problems += 1
+        print("Wrong percentile")
+    old = {'a': summarize([1.0, 1.05, 1.1, 1.15, 1.2], [1000]), 'b': summarize([0.001] * 5, [1000]),
+           'c': summarize([0.5] * 5, [1000]), 'd': summarize([0.5] * 5, [1000]),
+           'e': summarize([0.010, 0.011, 0.012, 0.014, 0.030], [1000]),
+           'f': summarize([2.0] * 5, [1000], timeouts=5)}
+    new = {'a': summarize([1.5, 1.55, 1.6, 1.65, 1.7], [1000]), 'b': summarize([0.002] * 5, [1000]),
+           'c': summarize([0.5] * 5, [2000]), 'd': summarize([0.5] * 5, [1000], timeouts=1),
+           'e': summarize([0.020, 0.024, 0.025, 0.026, 0.030], [1000]),
+           'f': summarize([2.0] * 5, [3000], timeouts=5)}
+    with tempfile.TemporaryDirectory() as baseline_dir:
+        path = os.path.join(baseline_dir, "baseline.json")
+        save_baseline(old, path, {'trials': 5})
+        with open(path) as f:
+            baseline = json.load(f)
+    regressions = find_regressions(new, baseline)
+    if [regression.split(':')[0] for regression in regressions] != ['a', 'c', 'd']:
+        problems += 1
+        print("Unexpected regressions:", regressions)
+    if find_regressions(old, baseline):
+        problems += 1
+        print("Regressions found against itself")
+    try:
+        find_regressions({'a': summarize([1.0, 1.1, 1.2], [1000])}, baseline)
+        problems += 1
+        print("Compared results of 3 trials")
+    except ValueError:
+        pass
+    print("Benchmark baseline problems:", problems)
+    return problems == 0
+
 def solve_boards(directory_path):
     # Get all .bff files in the directory
     bff_files = [file for file in os.listdir(directory_path) if file.endswith('.bff')]
@@ -21,10 +1001,11 @@ def solve_boards(directory_path):
             
             # Create and attempt to solve the board
             board = LazorGame(file_path)
-            if solve_board_optimized(board):
+            if solve_board_guided(board):
                 elapsed_time = time.time() - start_time
                 solution_times[file_name] = elapsed_time
                 print("Solved in", elapsed_time, "seconds")
+                print(board.stats)
                 
                 board.propagate()
                 board.visualize(directory_path, file_name)
@@ -51,6 +1032,30 @@ def solve_boards(directory_path):
     return solution_times
 
 
-directory = r".\bff_files"
-solve_boards(directory)
-
+if __name__ == "__main__":
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bff_files")
+    results = [
+        check_incremental_propagation(directory),
+        check_propagate_order(directory),
+        check_bitboard_engine(directory),
+        check_guided_completeness(directory),
+        check_sat_solver(directory),
+        check_orderings(directory),
+        check_iter_solutions(directory),
+        check_checkpoint_resume(directory),
+        check_solver_stats(directory),
+        check_parallel_matches_serial(directory),
+        check_solution_cache(directory),
+        check_propagation_memo(directory),
+        check_vectorized_validate(directory),
+        check_pruning_sound(directory),
+        check_benchmark_baseline(),
+        check_generator(),
+        check_render(directory),
+        check_bff_parser(directory),
+        check_batch(directory),
+        check_service(directory),
+    ]
+    solution_times = solve_boards(directory)
+    results.append(all(solve_time > 0 for solve_time in solution_times.values()))
+    sys.exit(0 if all(results) else 1)
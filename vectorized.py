@@ -0,0 +1,165 @@
+"""
+NumPy engine that propagates many candidate boards at once.
+
+Instead of moving one lazor at a time, every board keeps a boolean frontier
+over all lazor states (half-step position x direction, the same states as
+BeamGraph). One step of the engine moves the frontier of every board together
+with lookups into precomputed successor tables, so scoring thousands of
+placements is a handful of array operations per half step.
+"""
+from classes import *
+import numpy as np
+
+
+class BatchPropagator:
+    def __init__(self, template: BoardTemplate):
+        """
+        Precompute the state tables of a board.
+
+        Args:
+            template : The parsed board
+        """
+        self.template = template
+        self.width = len(template.grid[0])
+        self.height = len(template.grid)
+        self.base_grid = np.array([[CELL_CODES[cell] for cell in row] for row in template.grid], dtype=np.int8)
+
+        # States of all half-step positions (x, y) of the board, numbered (y * (2W + 1) + x) * 4 + direction
+        stride = self.width * 2 + 1
+        num_states = stride * (self.height * 2 + 1) * 4
+        self.num_states = num_states
+        self.num_cells = self.width * self.height
+        sink = num_states  # successor of a lazor that leaves the board
+        # A target listed twice is one point to hit
+        points = {point: index for index, point in enumerate(dict.fromkeys(template.points))}
+        no_target = len(points)
+
+        def state_index(x, y, direction):
+            if 0 <= x <= self.width * 2 and 0 <= y <= self.height * 2:
+                return (y * stride + x) * 4 + direction
+            return sink
+
+        def next_state(x, y, direction):
+            # The state a lazor moves to, or the sink and the point it leaves the board at
+            vx, vy = DIRECTIONS[direction]
+            new_x, new_y = x + vx, y + vy
+            if 0 < new_x < self.width * 2 and 0 < new_y < self.height * 2:
+                return state_index(new_x, new_y, direction), no_target
+            return sink, points.get((new_x, new_y), no_target)
+
+        # Per state: checked cell (num_cells = none), next state going straight or
+        # reflected, the refracted child, and the target reached at the position
+        # itself or when leaving the board straight / reflected
+        self.cell = np.full(num_states, self.num_cells, dtype=np.int64)
+        self.straight = np.full(num_states, sink, dtype=np.int64)
+        self.reflected = np.full(num_states, sink, dtype=np.int64)
+        self.child = np.full(num_states, sink, dtype=np.int64)
+        self.straight_exit = np.full(num_states, no_target, dtype=np.int64)
+        self.reflected_exit = np.full(num_states, no_target, dtype=np.int64)
+        self.position_target = np.full(num_states, no_target, dtype=np.int64)
+
+        for y in range(self.height * 2 + 1):
+            for x in range(stride):
+                for direction, (vx, vy) in enumerate(DIRECTIONS):
+                    state = state_index(x, y, direction)
+                    self.position_target[state] = points.get((x, y), no_target)
+                    self.straight[state], self.straight_exit[state] = next_state(x, y, direction)
+                    # Same block check as LazorGame.propagate, negative indices wrap
+                    if x % 2 == 0:
+                        check_x, check_y = (x + vx) // 2, y // 2
+                        flipped = FLIP_X[direction]
+                    elif y % 2 == 0:
+                        check_x, check_y = x // 2, (y + vy) // 2
+                        flipped = FLIP_Y[direction]
+                    else:
+                        continue
+                    if check_x < self.width and check_y < self.height:
+                        self.cell[state] = (check_y % self.height) * self.width + check_x % self.width
+                    self.reflected[state], self.reflected_exit[state] = next_state(x, y, flipped)
+                    self.child[state] = state_index(x, y, flipped)
+
+        # For each target: states on it, and states leaving the board through it
+        # when going straight or after a reflection
+        self.target_states = [(np.flatnonzero(self.position_target == target),
+                               np.flatnonzero(self.straight_exit == target),
+                               np.flatnonzero(self.reflected_exit == target))
+                              for target in range(no_target)]
+
+        self.steps = 0
+        self.sources = np.array([state_index(x, y, DIRECTION_INDEX[direction])
+                                 for (x, y), direction in template.lazors], dtype=np.int64)
+
+    def grids_for(self, placements) -> np.ndarray:
+        """
+        Candidate grids for a list of placements.
+
+        Args:
+            placements : Sequence of placements, each a sequence of ((x, y), block_type) pairs
+
+        Returns:
+            np.ndarray: (N, H, W) int8 array of cell codes
+        """
+        grids = np.repeat(self.base_grid[np.newaxis], len(placements), axis=0)
+        rows, ys, xs, codes = [], [], [], []
+        for row, placement in enumerate(placements):
+            for (x, y), block_type in placement:
+                rows.append(row)
+                xs.append(x)
+                ys.append(y)
+                codes.append(CELL_CODES[block_type])
+        grids[rows, ys, xs] = codes
+        return grids
+
+    def validate(self, grids: np.ndarray) -> np.ndarray:
+        """
+        Propagate the lazors of every grid and check the targets, like
+        LazorGame.propagate followed by LazorGame.validate.
+
+        Args:
+            grids : (N, H, W) array of cell codes
+
+        Returns:
+            np.ndarray: (N,) bool, True where every target is hit
+        """
+        count = len(grids)
+        # Cell codes per board, plus one always empty cell for states that check nothing
+        cells = np.zeros((self.num_cells + 1, count), dtype=np.int8)
+        cells[:self.num_cells] = grids.reshape(count, -1).T
+
+        # Rows are states (+1 sink row), columns are boards
+        frontier = np.zeros((self.num_states + 1, count), dtype=bool)
+        frontier[self.sources] = True
+        visited = frontier.copy()
+
+        while True:
+            active = np.flatnonzero(frontier[:self.num_states].any(axis=1))
+            if len(active) == 0:
+                break
+            on = frontier[active]
+            block = cells[self.cell[active]]
+
+            # Masked spawning: every board moves the states its blocks allow.
+            # Each table maps distinct states to distinct states (apart from
+            # the sink), so plain fancy indexing does not lose updates.
+            frontier = np.zeros_like(frontier)
+            frontier[self.straight[active]] |= on & ((block == EMPTY) | (block == REFRACT))
+            frontier[self.reflected[active]] |= on & (block == REFLECT)
+            frontier[self.child[active]] |= on & (block == REFRACT)
+            frontier[self.num_states] = False
+
+            # A board stops on its own once all its states were seen before
+            frontier &= ~visited
+            visited |= frontier
+
+        self.steps = int(visited.sum())  # (state, board) pairs traced by the last call
+
+        # A target is hit by a state sitting on it, or by a lazor leaving the board through it
+        solved = np.ones(count, dtype=bool)
+        for at, straight_exits, reflected_exits in self.target_states:
+            hit = visited[at].any(axis=0)
+            block = cells[self.cell[straight_exits]]
+            hit |= (visited[straight_exits] & ((block == EMPTY) | (block == REFRACT))).any(axis=0)
+            block = cells[self.cell[reflected_exits]]
+            hit |= (visited[reflected_exits] & (block == REFLECT)).any(axis=0)
+            solved &= hit
+        return solved